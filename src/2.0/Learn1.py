@@ -1,6 +1,14 @@
+from functools import cache
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
 
+import os
+import sys
+
+# src/ holds the modules shared with the other agents (e.g. telemetry)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telemetry import instrument
 
 class AgentState(TypedDict):
     name: str
@@ -9,15 +17,26 @@ def greeting_user(state: AgentState) -> AgentState:
     state["name"] = f"Hello {state['name']}!"
     return state
 
-graph = StateGraph(AgentState)
 
-graph.add_node("greeting_user", greeting_user)
+@cache
+def get_app():
+    """Build and compile the graph on first use."""
+    graph = StateGraph(AgentState)
+
+    graph.add_node("greeting_user", greeting_user)
+
+    graph.add_edge(START, "greeting_user")
+    graph.add_edge("greeting_user", END)
+
+    return instrument(graph.compile(), "Learn1")
+
 
-graph.add_edge(START, "greeting_user")
-graph.add_edge("greeting_user", END)
+def main():
+    app = get_app()
 
+    result = app.invoke({"name":"Manzoor"})
+    print(result["name"])
 
-app = graph.compile()
 
-result = app.invoke({"name":"Manzoor"})
-print(result["name"])
\ No newline at end of file
+if __name__ == "__main__":
+    main()
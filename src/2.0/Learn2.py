@@ -1,6 +1,6 @@
 import json
+from functools import cache
 from typing import TypedDict, Annotated, Sequence
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 from langgraph.graph import StateGraph,START, END
 
@@ -8,7 +8,15 @@ from pydantic import BaseModel
 
 from dotenv import load_dotenv
 import os
-load_dotenv()
+if __name__ == "__main__":
+    load_dotenv()
+import sys
+
+# src/ holds the modules shared with the other agents (e.g. chat_model)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_model import make_chat_model
+from telemetry import instrument
 
 
 class Superhero(BaseModel):
@@ -26,11 +34,13 @@ class AgentState(TypedDict):
 
 
 
-llm = ChatGoogleGenerativeAI(
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    model=os.getenv("GOOGLE_MODEL"),
-    temperature=1,
-)
+@cache
+def get_llm():
+    return make_chat_model(
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        model=os.getenv("GOOGLE_MODEL"),
+        temperature=1,
+    )
 
 def process_node(state: AgentState) -> AgentState:
     
@@ -56,7 +66,7 @@ def process_node(state: AgentState) -> AgentState:
 
     messages = [system_prompt, user_prompt]
 
-    response = llm.invoke(messages)
+    response = get_llm().invoke(messages)
 
 
     if response.content.startswith("```json"):
@@ -83,24 +93,31 @@ def process_node(state: AgentState) -> AgentState:
         "description": description
     }
 
-graph =  StateGraph(AgentState)
+@cache
+def get_app():
+    """Build and compile the graph on first use."""
+    graph =  StateGraph(AgentState)
 
-graph = graph.add_node("process_node", process_node)
+    graph = graph.add_node("process_node", process_node)
 
-graph.add_edge(START, "process_node")
-graph.add_edge("process_node", END)
+    graph.add_edge(START, "process_node")
+    graph.add_edge("process_node", END)
 
-app = graph.compile()
+    return instrument(graph.compile(), "Learn2")
+
+def main():
+    user_input = {
+        "name": "John",
+        "role": "Engineer",
+        "goal": "Build a better world",
+        "state": "Starting"
+    }
 
-user_input = {
-    "name": "John",
-    "role": "Engineer",
-    "goal": "Build a better world",
-    "state": "Starting"
-}
+    result = get_app().invoke(user_input)
 
-result = app.invoke(user_input)
+    print(result["code_name"])
+    print("----------------------------------------------")
+    print(result["description"])
 
-print(result["code_name"])
-print("----------------------------------------------")
-print(result["description"])
+if __name__ == "__main__":
+    main()
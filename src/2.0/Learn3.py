@@ -1,13 +1,21 @@
+from functools import cache
 from typing import Annotated, Sequence, TypedDict
 from langgraph.graph import StateGraph, START, END
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, BaseMessage, SystemMessage, AIMessage
 from langgraph.graph.message import add_messages
 from langchain_core.tools import tool
 from langgraph.prebuilt import ToolNode
 from dotenv import load_dotenv
 import os
-load_dotenv()
+if __name__ == "__main__":
+    load_dotenv()
+import sys
+
+# src/ holds the modules shared with the other agents (e.g. chat_model)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_model import make_chat_model
+from telemetry import instrument
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -25,11 +33,13 @@ def stock_price(symbol: str):
 
 tools = [google_search, stock_price]
 
-llm = ChatGoogleGenerativeAI(
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    model=os.getenv("GOOGLE_MODEL"),
-    temperature=0.2,
-).bind_tools(tools=tools)
+@cache
+def get_llm():
+    return make_chat_model(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model=os.getenv("GOOGLE_MODEL"),
+        temperature=0.2,
+    ).bind_tools(tools=tools)
 
 
 def process_node(state: AgentState) -> AgentState:
@@ -41,7 +51,7 @@ def process_node(state: AgentState) -> AgentState:
                                   )
     human_prompt = HumanMessage(content=state["user_input"])
 
-    response = llm.invoke([system_prompt, human_prompt])
+    response = get_llm().invoke([system_prompt, human_prompt])
 
     return {
         "messages": state["messages"] + [human_prompt, response],
@@ -58,27 +68,34 @@ def should_continue(state: AgentState):
         return "continue"
     
 
-graph_builder = StateGraph(AgentState)
-graph_builder.add_node("process_node", process_node)
-graph_builder.add_node("tool", ToolNode(tools=tools))
+@cache
+def get_graph():
+    """Build and compile the graph on first use."""
+    graph_builder = StateGraph(AgentState)
+    graph_builder.add_node("process_node", process_node)
+    graph_builder.add_node("tool", ToolNode(tools=tools))
 
-graph_builder.add_conditional_edges(
-    "process_node",
-    should_continue,
-    {
-        "continue": "tool",
-        "end": END,
-    }
-)
+    graph_builder.add_conditional_edges(
+        "process_node",
+        should_continue,
+        {
+            "continue": "tool",
+            "end": END,
+        }
+    )
+
+    graph_builder.add_edge("tool", "process_node")
 
-graph_builder.add_edge("tool", "process_node")
+    graph_builder.add_edge(START, "process_node")
 
-graph_builder.add_edge(START, "process_node")
+    return instrument(graph_builder.compile(), "Learn3")
 
-graph = graph_builder.compile()
+def main():
+    user_input = input("You: ")
 
-user_input = input("You: ")
+    state = get_graph().invoke({"user_input": user_input})
 
-state = graph.invoke({"user_input": user_input})
+    print(state["messages"][-1].content)
 
-print(state["messages"][-1].content)
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
+from contextvars import ContextVar
+from functools import cache
 from typing import Annotated, Sequence, TypedDict
 
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage, ToolMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
 
 from langgraph.graph import StateGraph, END
@@ -11,20 +12,174 @@ from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
 import os
 
-load_dotenv()
-
-draft_content = ""
+if __name__ == "__main__":
+    load_dotenv()
+
+from doc_persist import COMPRESSION, DocumentFile, export
+from doc_store import DocumentStore, select_sections
+from chat_model import make_chat_model
+from telemetry import instrument
+
+# Drafts up to FULL_TEXT_CHARS go into the prompt whole; longer ones as an outline plus
+# the sections relevant to the latest instruction, up to CONTEXT_CHARS.
+FULL_TEXT_CHARS = int(os.getenv("DRAFTER_FULL_TEXT_CHARS", "4000"))
+CONTEXT_CHARS = int(os.getenv("DRAFTER_CONTEXT_CHARS", "3000"))
+# When set, every edit of the CLI draft is journalled to this file and the draft is recovered from it on start.
+AUTOSAVE_PATH = os.getenv("DRAFTER_AUTOSAVE")
+
+# The CLI edits one module-level document; the server sets current_document per session,
+# and the tools always go through get_document().
+document = DocumentStore()
+current_document: ContextVar[DocumentStore | None] = ContextVar("current_document", default=None)
+# The server also sets the directory its session may save into; the CLI saves relative to the working directory.
+current_save_dir: ContextVar[str | None] = ContextVar("current_save_dir", default=None)
+
+
+def get_document() -> DocumentStore:
+    session_document = current_document.get()
+    return document if session_document is None else session_document
+
+
+def save_path(filename: str) -> str:
+    """Where save_content writes filename: inside the session's save directory if there is one, else as given."""
+    save_dir = current_save_dir.get()
+    if save_dir is None:
+        return filename
+    if os.path.isabs(filename) or ".." in filename.replace("\\", "/").split("/"):
+        raise ValueError(f"{filename!r} must be a plain relative file name")
+    path = os.path.realpath(os.path.join(save_dir, filename))
+    if os.path.commonpath([path, os.path.realpath(save_dir)]) != os.path.realpath(save_dir):
+        raise ValueError(f"{filename!r} is outside the session's directory")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
 
 class AgentState(TypedDict):
     messages:  Annotated[Sequence[BaseMessage], add_messages]
 
 
+def edit_result(version: int, start: int, end: int) -> str:
+    """Confirm an edit with the changed span only, never the whole document."""
+    document = get_document()
+    return f"Document updated to version {version} ({len(document)} chars).\nAround the edit:\n{document.excerpt(start, end)}"
+
+
+def patch_result(version: int) -> str:
+    """edit_result for the latest patch; the new text need not form a section of its own."""
+    start, _, text = get_document().patches[-1]
+    return edit_result(version, start, start + len(text))
+
+
 @tool
 def update_tool(content: str) -> str:
-    """Updates the document with the provided content"""
-    global draft_content
-    draft_content = content
-    return f"Document content updated successfully.\n{draft_content}"
+    """Replaces the whole document with the provided content. Use only to create the first draft or for a full rewrite."""
+    document = get_document()
+    version = document.set_text(content)
+    return f"Document written as version {version} ({len(document)} chars, {len(document.sections())} sections)."
+
+
+@tool
+def edit_span(start: int, end: int, text: str) -> str:
+    """
+    Replace the characters start:end of the document with text.
+    Use start == end to insert and an empty text to delete.
+
+    Args:
+        start: Start offset (inclusive)
+        end: End offset (exclusive)
+        text: New text for the span
+    """
+    document = get_document()
+    try:
+        version = document.replace(start, end, text)
+    except ValueError as e:
+        return f"Failed to edit document: {e}"
+    return edit_result(version, start, start + len(text))
+
+
+@tool
+def replace_text(old: str, new: str) -> str:
+    """
+    Replace a passage that occurs exactly once in the document.
+
+    Args:
+        old: The exact text to replace
+        new: The replacement text
+    """
+    document = get_document()
+    start = document.text().find(old)
+    try:
+        version = document.replace_text(old, new)
+    except ValueError as e:
+        return f"Failed to edit document: {e}"
+    return edit_result(version, start, start + len(new))
+
+
+@tool
+def edit_section(section: int, text: str) -> str:
+    """
+    Replace a whole section (its heading included) with text; an empty text deletes it.
+
+    Args:
+        section: Section number from the outline
+        text: New text for the section
+    """
+    document = get_document()
+    try:
+        version = document.replace_section(section, text)
+    except ValueError as e:
+        return f"Failed to edit document: {e}"
+    if not text:
+        return f"Section {section} deleted, document is now version {version}."
+    return patch_result(version)
+
+
+@tool
+def insert_section(after: int, text: str) -> str:
+    """
+    Insert a new section after the given section number (0 inserts at the top).
+
+    Args:
+        after: Section number to insert after
+        text: Text of the new section, starting with its heading
+    """
+    document = get_document()
+    try:
+        version = document.insert_section(after, text)
+    except ValueError as e:
+        return f"Failed to edit document: {e}"
+    return patch_result(version)
+
+
+@tool
+def read_section(section: int) -> str:
+    """
+    Read the full text of one section of the document.
+
+    Args:
+        section: Section number from the outline
+    """
+    document = get_document()
+    try:
+        span = document.section(section)
+    except ValueError as e:
+        return f"Failed to read section: {e}"
+    return f"Section {section} [chars {span['start']}-{span['end']}]:\n{document.text()[span['start']:span['end']]}"
+
+
+@tool
+def revert_document(version: int) -> str:
+    """
+    Undo edits by making an earlier version of the document current again.
+
+    Args:
+        version: Version number to go back to
+    """
+    document = get_document()
+    try:
+        new_version = document.revert(version)
+    except ValueError as e:
+        return f"Failed to revert document: {e}"
+    return f"Reverted to version {version}, saved as version {new_version}.\n" + "\n".join(document.history()[-5:])
 
 
 @tool
@@ -35,27 +190,28 @@ def save_content(filename: str) -> str:
     Args:
         filename: Name for the text file
     """
-
-    global draft_content
+    document = get_document()
 
     if not filename.endswith(".txt"):
         filename = f"{filename}.txt"
     
     try:
-        with open(filename, "w") as f:
-            f.write(draft_content)
-        return f"Document saved successfully as {filename}"
+        path = export(document, save_path(filename), COMPRESSION)
+        save_dir = current_save_dir.get()
+        return f"Document saved successfully as {os.path.relpath(path, save_dir) if save_dir else path}"
     except Exception as e:
         return f"Failed to save document: {e}"
 
 
-tools = [update_tool, save_content]
+tools = [update_tool, read_section, edit_span, replace_text, edit_section, insert_section, revert_document, save_content]
 
-llm = ChatGoogleGenerativeAI(
-    api_key=os.environ["GOOGLE_API_KEY"],
-    model=os.environ["GOOGLE_MODEL"],
-    temperature=0.2
-).bind_tools(tools=tools)
+@cache
+def get_llm():
+    return make_chat_model(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model=os.getenv("GOOGLE_MODEL"),
+        temperature=0.2
+    ).bind_tools(tools=tools)
 
 
 # def llm_call(state: AgentState) -> AgentState:
@@ -91,8 +247,30 @@ llm = ChatGoogleGenerativeAI(
 
 #     return {"messages": list(state["messages"]) + [user_message, response]}
 
-def llm_call(state: AgentState) -> AgentState:
-    system_prompt = SystemMessage(content=f"""
+def outline() -> str:
+    """Numbered sections with their character spans, so edits can target a section or span."""
+    document = get_document()
+    return "\n".join(f"{s['number']}. {s['title']} [chars {s['start']}-{s['end']}]" for s in document.sections()) or "(empty)"
+
+
+def document_context(instruction: str) -> str:
+    """The whole draft when it is short, otherwise only the sections relevant to the instruction."""
+    document = get_document()
+    text = document.text()
+    if len(text) <= FULL_TEXT_CHARS:
+        return f"The current document content is: {text}"
+    pinned = (document.section_at(document.last_edit),) if document.last_edit is not None else ()
+    sections = select_sections(text, instruction, CONTEXT_CHARS, tuple(n for n in pinned if n))
+    shown = "\n\n".join(f"[Section {s['number']}]\n{text[s['start']:s['end']]}" for s in sections)
+    return ("Only the sections relevant to the request are shown; use read_section to read any other section "
+            f"before editing it.\n{shown or '(no section matched the request)'}")
+
+
+def build_system_prompt(messages: list[BaseMessage]) -> SystemMessage:
+    """System prompt with the outline and the parts of the draft relevant to the latest user message."""
+    document = get_document()
+    instruction = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    return SystemMessage(content=f"""
         You are a helpful AI assistant called Drafter AI.
         Your job is to help users write clear and well-structured content such as notes, emails, blog posts, or reports.
         Follow the user's instructions carefully and try to make the writing easy to understand.
@@ -101,9 +279,15 @@ def llm_call(state: AgentState) -> AgentState:
         If they ask for improvements, edit the content without changing the original meaning too much.
         Keep your answers short and focused unless the user asks for a long response.
         Save the document using the save_content tool when user asks to save the document.
-        The current document content is: {draft_content}
+        Edit the existing document with edit_section, insert_section, replace_text or edit_span so only
+        the changed part is sent; use update_tool only for the first draft or a complete rewrite.
+        The document is at version {document.version}. Outline:
+        {outline()}
+        {document_context(instruction)}
     """)
 
+
+def llm_call(state: AgentState) -> AgentState:
     messages = list(state["messages"])
 
     # Determine if we should ask the user for input
@@ -123,9 +307,11 @@ def llm_call(state: AgentState) -> AgentState:
         print(f"\n USER: {user_input}")
         messages.append(user_message)
 
+    system_prompt = build_system_prompt(messages)
+
     all_messages = [system_prompt] + messages
 
-    response = llm.invoke(all_messages)
+    response = get_llm().invoke(all_messages)
 
     print(f"\n AI: {response.content}")
     if hasattr(response, "tool_calls") and response.tool_calls:
@@ -161,22 +347,36 @@ def print_message(messages):
         elif isinstance(message, HumanMessage):
             print(f"\n USER: {message.content}")
 
-graph  = StateGraph(AgentState)
+@cache
+def get_app():
+    """Build and compile the CLI graph on first use."""
+    graph  = StateGraph(AgentState)
 
-graph.add_node("llm", llm_call)
-graph.add_node("tool", ToolNode(tools=tools))
+    graph.add_node("llm", llm_call)
+    graph.add_node("tool", ToolNode(tools=tools))
 
-graph.set_entry_point("llm")
+    graph.set_entry_point("llm")
 
-graph.add_edge("llm", "tool")
+    graph.add_edge("llm", "tool")
 
-graph.add_conditional_edges(
-    "tool",
-    should_continue,
-    {"continue": "llm", "end": END}
-)
+    graph.add_conditional_edges(
+        "tool",
+        should_continue,
+        {"continue": "llm", "end": END}
+    )
+
+    return instrument(graph.compile(), "Drafter")
+
+def open_autosave():
+    """Recover the CLI draft from AUTOSAVE_PATH and journal its edits from now on."""
+    global document
+    autosave_file = DocumentFile(AUTOSAVE_PATH)
+    if os.path.exists(autosave_file.path):
+        document = autosave_file.load()
+        if autosave_file.dropped_entries:
+            print(f"Recovered the draft without its last {autosave_file.dropped_entries} edits, which could not be replayed.")
+    document.on_change = autosave_file.autosave
 
-app = graph.compile()
 def run_document_agent():
     print("===========================")
     print("Welcome to Drafter AI")
@@ -184,9 +384,12 @@ def run_document_agent():
     
     print("Hi! Drafter AI can help you write or update documents like notes, blogs, and more.\n")
 
+    if AUTOSAVE_PATH:
+        open_autosave()
+
     state = {"messages":[]}
     
-    for step in app.stream(state, stream_mode="values"):
+    for step in get_app().stream(state, stream_mode="values"):
         if "messages" in step:
             print_message(step["messages"])
 
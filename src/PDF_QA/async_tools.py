@@ -0,0 +1,42 @@
+import asyncio
+import os
+import weakref
+
+from langchain_core.tools import StructuredTool
+
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+
+_semaphores = weakref.WeakKeyDictionary()  # event loop -> {limit: asyncio.Semaphore}
+
+
+def _semaphore(limit: int) -> asyncio.Semaphore:
+    """One semaphore per event loop, so tools can be shared by several loops."""
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if limit not in per_loop:
+        per_loop[limit] = asyncio.Semaphore(limit)
+    return per_loop[limit]
+
+
+def to_async_tool(sync_tool: StructuredTool, limit: int = TOOL_CONCURRENCY) -> StructuredTool:
+    """
+    Give a blocking tool an async implementation.
+
+    The returned tool still works with invoke(); with ainvoke() the blocking
+    body runs in a worker thread, and at most `limit` calls of tools sharing
+    that limit run at once on each event loop. That lets the tool node run several
+    tool calls from one AIMessage concurrently without flooding the IMAP pool.
+    """
+    func = sync_tool.func
+
+    async def coroutine(**kwargs):
+        async with _semaphore(limit):
+            return await asyncio.to_thread(func, **kwargs)
+
+    return StructuredTool(
+        name=sync_tool.name,
+        description=sync_tool.description,
+        args_schema=sync_tool.args_schema,
+        func=func,
+        coroutine=coroutine,
+        return_direct=sync_tool.return_direct,
+    )
@@ -0,0 +1,99 @@
+import json
+import os
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "4000"))
+SUMMARY_CHARS_PER_MESSAGE = 200
+# The summary may use what the kept messages leave of the budget, but never less than this.
+SUMMARY_MIN_TOKENS = 200
+COMPACT_MIN_TOKENS = 100
+CHARS_PER_TOKEN = 4
+SUMMARY_NAME = "conversation_summary"
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Rough token count (about CHARS_PER_TOKEN characters per token), including tool call arguments."""
+    size = len(message.content) if isinstance(message.content, str) else len(json.dumps(message.content))
+    for call in getattr(message, "tool_calls", None) or []:
+        size += len(call["name"]) + len(json.dumps(call["args"]))
+    return size // CHARS_PER_TOKEN + 1
+
+
+def compact_tool_message(message: ToolMessage, calls: dict[str, dict]) -> ToolMessage:
+    """Replace a tool output with a short reference the model can re-fetch by calling the tool again."""
+    call = calls.get(message.tool_call_id, {})
+    args = ", ".join(f"{k}={v!r}" for k, v in call.get("args", {}).items())
+    content = (f"[Output of {call.get('name', message.name)}({args}) omitted to save space "
+               f"({len(message.content)} chars). Call the tool again if you need it; results are cached.]")
+    return ToolMessage(content=content, tool_call_id=message.tool_call_id, name=message.name, id=message.id)
+
+
+def default_summarizer(messages: list[BaseMessage]) -> str:
+    """Cheap extractive summary: the start of every user question and answer."""
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"User: {message.content.strip()[:SUMMARY_CHARS_PER_MESSAGE]}")
+        elif isinstance(message, AIMessage) and message.content and not message.tool_calls:
+            lines.append(f"Assistant: {str(message.content).strip()[:SUMMARY_CHARS_PER_MESSAGE]}")
+    return "\n".join(lines)
+
+
+def _split_turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage, so tool calls stay with their results."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def fit_to_budget(messages: list[BaseMessage], budget: int = MEMORY_TOKEN_BUDGET, summarize=default_summarizer) -> list[BaseMessage]:
+    """
+    Shrink a conversation to fit a token budget.
+
+    The leading system prompt and the latest turn are always kept. Tool outputs
+    from earlier turns are replaced by compact references first; if that is
+    not enough, the oldest turns are dropped and folded into a running summary,
+    cut to the tokens the kept messages leave over (at least SUMMARY_MIN_TOKENS).
+
+    Args:
+        messages (list[BaseMessage]): The full conversation.
+        budget (int): Approximate token budget, defaults to MEMORY_TOKEN_BUDGET.
+        summarize (callable): Turns a list of dropped messages into summary text.
+
+    Returns:
+        list[BaseMessage]: The messages to send to the model.
+    """
+    messages = list(messages)
+    head = []
+    while messages and isinstance(messages[0], SystemMessage):
+        head.append(messages.pop(0))
+    summary = next((m for m in head if m.name == SUMMARY_NAME), None)
+    head = [m for m in head if m.name != SUMMARY_NAME]
+
+    turns = _split_turns(messages)
+    calls = {c["id"]: c for m in messages if isinstance(m, AIMessage) for c in m.tool_calls}
+    turns = [
+        [compact_tool_message(m, calls) if isinstance(m, ToolMessage) and estimate_tokens(m) > COMPACT_MIN_TOKENS else m
+         for m in turn]
+        for turn in turns[:-1]
+    ] + turns[-1:]
+
+    def total() -> int:
+        kept = head + ([summary] if summary else []) + [m for turn in turns for m in turn]
+        return sum(estimate_tokens(m) for m in kept)
+
+    dropped = []
+    while len(turns) > 1 and total() > budget:
+        dropped.extend(turns.pop(0))
+    if dropped:
+        previous = summary.content.removeprefix(SUMMARY_HEADER) if summary else ""
+        summary = None
+        room = max(budget - total(), SUMMARY_MIN_TOKENS)
+        text = f"{previous}\n{summarize(dropped)}".strip()[-room * CHARS_PER_TOKEN:]
+        summary = SystemMessage(content=f"{SUMMARY_HEADER}{text}", name=SUMMARY_NAME)
+    return head + ([summary] if summary else []) + [m for turn in turns for m in turn]
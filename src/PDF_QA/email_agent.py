@@ -1,19 +1,46 @@
+from functools import cache
 from typing import Annotated, Sequence, TypedDict
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import tool
+from pydantic import BaseModel
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import tools_condition
 
-from imaplib import IMAP4_SSL
-import smtplib
+from datetime import datetime
 from email.mime.text import MIMEText
 
 from dotenv import load_dotenv
-load_dotenv()
+if __name__ == "__main__":
+    load_dotenv()
+import json
 import os
+import sys
+import time
+
+# src/ holds the modules shared with the other agents (e.g. parallel_tools)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_tools import to_async_tool
+from imap_pool import get_pool
+from imap_fetch import fetch_part, fetch_preview, fetch_structure, fetch_text
+from chat_model import make_chat_model
+from mail_store import get_message, get_store, latest_message, list_messages, needs_sync, search_messages, store_text, sync_mailbox
+from mime_parse import feed, parse_message, part_bytes, walk_parts
+from parallel_tools import ParallelToolExecutor
+from smtp_outbox import get_outbox
+from telemetry import instrument
+from tool_planner import PLANNING_PROMPT, arun_plan, run_plan
+
+# How long a send tool waits for the outbox, for all the emails of one call together. The executor
+# gives the send tools SEND_TIMEOUT_GRACE seconds more, so the tool's own answer (sent, withdrawn
+# or still queued) is what the model sees, never a bare timeout that would invite a resend.
+SEND_TIMEOUT = 60
+SEND_TIMEOUT_GRACE = 10
+# Attachments are only ever written below this directory, whatever folder the model asks for.
+ATTACHMENTS_DIR = os.path.abspath(os.getenv("EMAIL_ATTACHMENTS_DIR", "attachments"))
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -23,166 +50,308 @@ class AgentState(TypedDict):
 @tool
 def authenticate_email(username: str, password: str) -> str:
     """Authenticate to email."""
-    username = os.getenv("EMAIL_USERNAME")
-    password = os.getenv("EMAIL_PASSWORD")
-    imap = IMAP4_SSL('imap.gmail.com')
-    response = imap.login(username, password)
-    if response[0] != 'OK':
-        raise Exception(f"Failed to authenticate: {response[1]}")
-    print(f"authenticated: {response[1]}")
-    return f"Authenticated as {username}"
+    pool = get_pool()
+    with pool.connection():
+        pass
+    print(f"authenticated: {pool.username}")
+    return f"Authenticated as {pool.username}"
+
+def sync_inbox():
+    """Pull only new mail and flag changes into the local store, then return the store."""
+    store = get_store()
+    if needs_sync(store, 'INBOX'):
+        with get_pool().connection('INBOX') as imap:
+            new = sync_mailbox(imap, store, 'INBOX')
+        print(f"synced inbox: {new} new emails")
+    return store
+
+def format_email(subject: str, parsed: dict) -> str:
+    content = f"Subject: {subject or ''}\nBody: {parsed['body']}"
+    if parsed["attachments"]:
+        listed = "\n".join(f"- {a['filename']} ({a['content_type']}, ~{a['size']} bytes, section {a['section']})"
+                            for a in parsed["attachments"])
+        content += f"\nAttachments (not downloaded, use save_email_attachment):\n{listed}"
+    return content
+
+def load_email(row) -> dict:
+    """Return the text body and attachment list of a stored row, fetching them (never the attachments) on first use."""
+    if row["raw"] is not None:
+        return parse_message(row["raw"])
+    if row["attachments"] is not None:
+        return {"body": row["body_text"] or "", "attachments": json.loads(row["attachments"])}
+    with get_pool().connection('INBOX') as imap:
+        parsed = fetch_text(imap, row["uid"])
+    store_text(get_store(), row["uid"], parsed["body"], parsed["attachments"])
+    return parsed
+
+def format_headers(row) -> str:
+    date = datetime.fromtimestamp(row["date"]).strftime("%Y-%m-%d %H:%M") if row["date"] else "unknown date"
+    return f"From: {row['sender']}\nSubject: {row['subject']}\nDate: {date}"
 
 @tool
 def get_email_list() -> str:
     """Get list of emails."""
-    username = os.getenv("EMAIL_USERNAME")
-    password = os.getenv("EMAIL_PASSWORD")
-    imap = IMAP4_SSL('imap.gmail.com')
-    imap.login(username, password)
-    status, messages = imap.select('INBOX')
-    print(f"select status: {status}, messages: {messages}")
-    if status != 'OK':
-        raise Exception(f"Failed to select inbox: {messages}")
-    status, messages = imap.search(None, 'ALL')
-    if status != 'OK':
-        raise Exception(f"Failed to search: {messages}")
-    print(f"not send to llm emails: {messages[0].decode('utf-8')}")
-    return f"Found {len(messages[0].split())} emails. Email IDs: {messages[0].decode('utf-8')}"
+    uids = [str(row["uid"]) for row in reversed(list_messages(sync_inbox()))]
+    print(f"not send to llm emails: {' '.join(uids)}")
+    return f"Found {len(uids)} emails. Email IDs: {' '.join(uids)}"
+
+@tool
+def list_emails(count: int = 10) -> str:
+    """List the sender, subject and date of the most recent emails (newest first), with their IDs."""
+    rows = list_messages(sync_inbox(), limit=count)
+    if not rows:
+        return "No emails found."
+    return "\n\n".join(f"ID: {row['uid']}\n{format_headers(row)}" for row in rows)
+
+@tool
+def search_emails(query: str = "", since: str | None = None, sender: str | None = None, limit: int = 10) -> str:
+    """
+    Search the inbox by words in the sender, subject or body, optionally only
+    mail received since a date and/or from a sender. Runs on the local index,
+    which holds the start of each body (all of it once the email was opened).
+
+    Args:
+        query: Words to look for, e.g. "invoice".
+        since: Only emails on or after this date, formatted YYYY-MM-DD.
+        sender: Part of the sender's name or address.
+        limit: Maximum number of results.
+    """
+    try:
+        since_ts = datetime.strptime(since, "%Y-%m-%d").timestamp() if since else None
+    except ValueError:
+        return f"Invalid date {since!r}, use YYYY-MM-DD."
+    rows = search_messages(sync_inbox(), query, since_ts, sender, limit=limit)
+    if not rows:
+        return "No matching emails found."
+    return "\n\n".join(f"ID: {row['uid']}\n{format_headers(row)}" for row in rows)
+
+@tool
+def get_email_content(email_id: str, mode: str = "full") -> str:
+    """
+    Fetch an email by its ID.
+
+    Args:
+        email_id: The email ID.
+        mode: "headers" for sender/subject/date only, "preview" for the headers
+            and the start of the body, "full" for the subject and whole body.
+    """
+    store = sync_inbox()
+    row = get_message(store, int(email_id))
+    if row is None:
+        return f"No email found with ID {email_id}."
+    if mode == "headers":
+        return format_headers(row)
+    if mode == "preview" and row["raw"] is None and row["attachments"] is None:
+        with get_pool().connection('INBOX') as imap:
+            preview = fetch_preview(imap, row["uid"])
+        return f"{format_headers(row)}\nPreview: {preview}"
+    content = format_email(row["subject"], load_email(row))
+    print(f"not send to llm: {content}")
+    return content
+
+def attachment_path(folder: str, filename: str, section: str) -> str:
+    """Where to save an attachment: a safe file name inside ATTACHMENTS_DIR/folder, or ValueError if folder leaves it."""
+    directory = os.path.realpath(os.path.join(ATTACHMENTS_DIR, folder))
+    if os.path.commonpath([directory, os.path.realpath(ATTACHMENTS_DIR)]) != os.path.realpath(ATTACHMENTS_DIR):
+        raise ValueError(f"Folder {folder!r} is outside the attachments directory")
+    name = os.path.basename(filename.replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        name = f"part-{section}"
+    return os.path.join(directory, name)
+
+def write_new_file(path: str, data: bytes) -> str:
+    """Write data to path, or to "name (n).ext" if a file of that name exists; never overwrites."""
+    root, ext = os.path.splitext(path)
+    for n in range(1000):
+        candidate = path if n == 0 else f"{root} ({n}){ext}"
+        try:
+            with open(candidate, "xb") as f:
+                f.write(data)
+            return candidate
+        except FileExistsError:
+            continue
+    raise Exception(f"Too many files named like {path}")
 
 @tool
-def get_email_content(email_id: str) -> str:
-    """Fetch the subject and body of an email by its ID."""
-    username = os.getenv("EMAIL_USERNAME")
-    password = os.getenv("EMAIL_PASSWORD")
-    imap = IMAP4_SSL('imap.gmail.com')
-    imap.login(username, password)
-    status, _ = imap.select('INBOX')
-    print(f"select status: {status}")
-    if status != 'OK':
-        raise Exception(f"Failed to select inbox for content fetch.")
-    typ, msg_data = imap.fetch(email_id, '(RFC822)')
-    if typ != 'OK':
-        raise Exception(f"Failed to fetch email: {msg_data}")
-    import email
-    msg = email.message_from_bytes(msg_data[0][1])
-    subject = msg['subject']
-    if msg.is_multipart():
-        body = msg.get_payload(0).get_payload(decode=True).decode()
+def save_email_attachment(email_id: str, section: str, folder: str = "") -> str:
+    """
+    Download one attachment of an email (by the section number listed with the email)
+    and save it in the attachments directory, optionally in a subfolder of it.
+    Existing files are never overwritten.
+    """
+    row = get_message(sync_inbox(), int(email_id))
+    if row is None:
+        return f"No email found with ID {email_id}."
+    if row["raw"] is not None:
+        part = next((p for s, p in walk_parts(feed(row["raw"])) if s == section), None)
+        if part is None:
+            return f"Email {email_id} has no attachment at section {section}."
+        filename, data = part.get_filename() or "", part_bytes(part)
     else:
-        body = msg.get_payload(decode=True).decode()
-    print(f"not send to llm: {subject}\nBody: {body}")
-    return f"Subject: {subject}\nBody: {body}"
+        with get_pool().connection('INBOX') as imap:
+            data = fetch_part(imap, row["uid"], section)
+            filename = next((p["filename"] for p in fetch_structure(imap, row["uid"]) if p["section"] == section), None)
+    try:
+        path = attachment_path(folder, filename or "", section)
+    except ValueError as e:
+        return str(e)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    path = write_new_file(path, data)
+    return f"Saved {len(data)} bytes to {path}"
 
 @tool
 def get_last_email() -> str:
     """Fetch the subject and body of the most recent email in the inbox."""
-    username = os.getenv("EMAIL_USERNAME")
-    password = os.getenv("EMAIL_PASSWORD")
-    imap = IMAP4_SSL('imap.gmail.com')
-    imap.login(username, password)
-    status, _ = imap.select('INBOX')
-    if status != 'OK':
-        raise Exception("Failed to select inbox.")
-    status, messages = imap.search(None, 'ALL')
-    if status != 'OK':
-        raise Exception(f"Failed to search: {messages}")
-    email_ids = messages[0].split()
-    if not email_ids:
+    row = latest_message(sync_inbox())
+    if row is None:
         return "No emails found."
-    last_id = email_ids[-1]
-    typ, msg_data = imap.fetch(last_id, '(RFC822)')
-    if typ != 'OK':
-        raise Exception(f"Failed to fetch email: {msg_data}")
-    import email
-    msg = email.message_from_bytes(msg_data[0][1])
-    subject = msg['subject']
-    if msg.is_multipart():
-        body = msg.get_payload(0).get_payload(decode=True).decode()
-    else:
-        body = msg.get_payload(decode=True).decode()
-    return f"Subject: {subject}\nBody: {body}"
-
-@tool
-def send_email(recipient: str, subject: str, body: str) -> str:
-    """Send an email to the specified recipient with the given subject and body."""
-    username = os.getenv("EMAIL_USERNAME")
-    password = os.getenv("EMAIL_PASSWORD")
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
+    return format_email(row["subject"], load_email(row))
 
+def build_email(recipient: str, subject: str, body: str) -> MIMEText:
     msg = MIMEText(body)
     msg["Subject"] = subject
-    msg["From"] = username
+    msg["From"] = os.getenv("EMAIL_USERNAME")
     msg["To"] = recipient
+    return msg
+
+class OutgoingEmail(BaseModel):
+    recipient: str
+    subject: str
+    body: str
 
+def send_result(recipient: str, future, deadline: float) -> str:
+    """Wait for a queued email until deadline; one not sent by then is withdrawn, or reported as still queued once sending began."""
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(username, password)
-        server.sendmail(username, [recipient], msg.as_string())
-        server.quit()
+        future.result(timeout=max(0.0, deadline - time.monotonic()))
         return f"Email sent to {recipient}."
+    except TimeoutError:
+        if get_outbox().withdraw(future):
+            return f"Email to {recipient} was not sent: the outbox is busy, try again later."
+        return f"Email to {recipient} is queued and still being sent; it was not confirmed within {SEND_TIMEOUT}s."
+    except Exception as e:
+        return f"Failed to send email to {recipient}: {e}"
+
+@tool
+def send_email(recipient: str, subject: str, body: str) -> str:
+    """Send an email to the specified recipient with the given subject and body."""
+    try:
+        future = get_outbox().submit(build_email(recipient, subject, body))
     except Exception as e:
         return f"Failed to send email: {e}"
+    return send_result(recipient, future, time.monotonic() + SEND_TIMEOUT)
 
-tools = [authenticate_email, get_email_list, get_email_content, get_last_email, send_email]
+@tool
+def send_emails(emails: list[OutgoingEmail]) -> str:
+    """Send several emails in one call, each with its own recipient, subject and body."""
+    deadline = time.monotonic() + SEND_TIMEOUT
+    futures = get_outbox().send_many([build_email(e.recipient, e.subject, e.body) for e in emails])
+    return "\n".join(send_result(email_.recipient, future, deadline) for email_, future in zip(emails, futures))
 
-llm = ChatGoogleGenerativeAI(
-    api_key= os.getenv("GOOGLE_API_KEY"),
-    model= os.getenv("GOOGLE_MODEL"),
-    temperature=0.2
-).bind_tools(tools)
+# Each tool also gets an async version (blocking body in a worker thread, bounded by a semaphore),
+# so app.ainvoke runs the tool calls of one model turn concurrently.
+tools = [to_async_tool(t) for t in [authenticate_email, get_email_list, list_emails, search_emails, get_email_content, save_email_attachment, get_last_email, send_email, send_emails]]
 
-def process_node(state: AgentState) -> AgentState:
-    # Limit the number of tool calls to prevent infinite loops
-    tool_calls_made = state.get("tool_calls_made", 0)
-    if tool_calls_made >= 3:  # Max 3 tool calls per request
-        return {
-            "messages": state["messages"] + [AIMessage(content="Task completed. Maximum tool calls reached.")],
-            "user_input": state["user_input"],
-            "tool_calls_made": tool_calls_made
-        }
-    
-    system_prompt = SystemMessage(content="""
-        You are an intelligent email assistant.
+@cache
+def get_chat():
+    return make_chat_model(
+        api_key= os.getenv("GOOGLE_API_KEY"),
+        model= os.getenv("GOOGLE_MODEL"),
+        temperature=0.2
+    )
+
+@cache
+def get_llm():
+    """The chat model with the email tools bound."""
+    return get_chat().bind_tools(tools)
+
+# One executor for both modes, so tool timeouts apply when a plan runs too. Sends need no limit here:
+# the outbox already sends one message at a time, and queueing behind a limit would eat into the send
+# tools' time limit.
+tool_executor = ParallelToolExecutor(tools, timeouts={"send_email": SEND_TIMEOUT + SEND_TIMEOUT_GRACE,
+                                                      "send_emails": SEND_TIMEOUT + SEND_TIMEOUT_GRACE})
+
+# "react": the model is called again after every tool step, so it can act on what it just read.
+# "plan" (opt-in): one model call plans every tool call, the plan runs (independent steps in
+# parallel) and one more call summarises. Cheaper, but only for requests whose steps are known
+# up front; "read the last mail and reply to it" needs react.
+AGENT_MODE = os.getenv("EMAIL_AGENT_MODE", "react")
+MAX_TOOL_ROUNDS = int(os.getenv("EMAIL_MAX_TOOL_ROUNDS", "5"))
+
+SYSTEM_PROMPT = """
+        You are an intelligent email assistant. Today's date is {today}.
 
         You have access to the following tools:
 
-        - authenticate_email(): Authenticate to the user's email account using secure, pre-configured environment credentials. Do not ask the user for their email address or password.
+        - authenticate_email(): Check the connection to the user's email account. Other tools connect on their own, so this is only needed when the user asks to log in.
         - get_email_list(): Retrieve a list of email IDs from the inbox.
-        - get_email_content(email_id): Fetch the subject and body of a specific email by ID.
+        - list_emails(count): List sender, subject and date of the most recent emails in one call.
+        - search_emails(query, since, sender): Find emails by words, date (YYYY-MM-DD) and sender. Prefer this over listing every email.
+        - get_email_content(email_id, mode): Fetch a specific email by ID. Use mode="headers" or mode="preview" when the full body is not needed.
         - get_last_email(): Retrieve the subject and body of the most recent email.
+        - save_email_attachment(email_id, section, folder): Save an attachment listed in an email to the attachments directory (folder is an optional subfolder).
         - send_email(recipient, subject, body): Send an email to a specified recipient. The body should be in HTML format.
+        - send_emails(emails): Send several emails at once; each item has recipient, subject and body.
 
         Instructions:
 
-        1. Always begin by calling `authenticate_email()` before performing any email-related actions.
-        2. Do **not** ask the user for login credentials — they are already stored securely.
-        3. When the user gives you instructions like "email John confirming the meeting," you should:
+        1. Do **not** ask the user for login credentials — they are already stored securely.
+        2. When the user gives you instructions like "email John confirming the meeting," you should:
         - Automatically write a clear subject line and an appropriate email body.
         - Send the email via `send_email()`.
         - Don't send mail in html format.
-        4. If the task involves reading or responding to previous emails, use `get_last_email()` or `get_email_content(email_id)` first.
-        5. Use tools **autonomously and only once per request**, unless the user explicitly asks to repeat something.
-        6. After executing a tool, return a concise summary of the action taken and ask the user if they'd like to do anything else.
+        3. If the task involves reading or responding to previous emails, use `get_last_email()`, `search_emails()` or `get_email_content(email_id)` first.
+        4. Use each tool only as often as the request needs, unless the user explicitly asks to repeat something.
+        5. After executing a tool, return a concise summary of the action taken and ask the user if they'd like to do anything else.
 
         IMPORTANT: Once you have successfully completed the user's request (like sending an email), do not make any more tool calls. Simply provide a summary of what was done.
-    """)
+"""
 
-    # Only add system prompt if it's not already there
-    messages = state["messages"]
+SUMMARY_PROMPT = """
+        You are an intelligent email assistant. The tools for the user's request have already run.
+        Using only the tool results below, answer the user concisely: say what was done or found,
+        mention any errors, and ask if they'd like to do anything else.
+"""
+
+def build_messages(state: AgentState, extra: str = "") -> list[BaseMessage]:
+    """System prompt (added once per conversation), the history and the new user request."""
+    messages = list(state["messages"])
     if not messages or not isinstance(messages[0], SystemMessage):
-        messages = [system_prompt] + messages
-    
-    user_prompt = HumanMessage(content=state["user_input"])
-    messages = messages + [user_prompt]
+        messages = [SystemMessage(content=SYSTEM_PROMPT.format(today=f"{datetime.now():%Y-%m-%d}") + extra)] + messages
+    return messages + [HumanMessage(content=state["user_input"])]
 
-    response = llm.invoke(messages)
+def prepare_request(state: AgentState) -> tuple[list[BaseMessage], AgentState | None]:
+    """Build the messages for the model, or return the final state once the tool budget is spent."""
+    # Limit the number of tool rounds to prevent infinite loops
+    tool_calls_made = state.get("tool_calls_made", 0)
+    if tool_calls_made >= MAX_TOOL_ROUNDS:
+        return [], {
+            "messages": state["messages"] + [AIMessage(content="Task completed. Maximum tool calls reached.")],
+            "user_input": state["user_input"],
+            "tool_calls_made": tool_calls_made
+        }
+    return build_messages(state), None
 
+def process_node(state: AgentState) -> AgentState:
+    messages, done = prepare_request(state)
+    if done:
+        return done
+    response = get_llm().invoke(messages)
     return {
         "messages": messages + [response],
         "user_input": state["user_input"],
-        "tool_calls_made": tool_calls_made
+        "tool_calls_made": state.get("tool_calls_made", 0)
+    }
+
+async def aprocess_node(state: AgentState) -> AgentState:
+    """Async twin of process_node, used when the graph is run with ainvoke."""
+    messages, done = prepare_request(state)
+    if done:
+        return done
+    response = await get_llm().ainvoke(messages)
+    return {
+        "messages": messages + [response],
+        "user_input": state["user_input"],
+        "tool_calls_made": state.get("tool_calls_made", 0)
     }
 
 def increment_tool_calls(state: AgentState) -> AgentState:
@@ -195,52 +364,91 @@ def increment_tool_calls(state: AgentState) -> AgentState:
 
 def should_continue(state: AgentState):
     """Determine if we should continue with tools or end"""
-    messages = state["messages"]
-    last_message = messages[-1]
-    
-    # Check if we've made too many tool calls
-    tool_calls_made = state.get("tool_calls_made", 0)
-    if tool_calls_made >= 3:
+    last_message = state["messages"][-1]
+    if state.get("tool_calls_made", 0) >= MAX_TOOL_ROUNDS:
         return "end"
-    
-    # Check if the last message has tool calls
     if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
         return "end"
-    
-    # For specific requests, limit tool calls
-    user_input = state.get("user_input", "").lower()
-    if "retrieve" in user_input or "get" in user_input:
-        # For retrieval requests, allow auth + get_email_list
-        if tool_calls_made >= 2:
-            return "end"
-    
     return "continue"
 
-graph = StateGraph(AgentState)
+def plan_node(state: AgentState) -> AgentState:
+    """Ask the model once for every tool call the request needs."""
+    messages = build_messages(state, PLANNING_PROMPT)
+    return {"messages": messages + [get_llm().invoke(messages)], "user_input": state["user_input"], "tool_calls_made": 0}
 
-graph.add_node("process_node", process_node)
-graph.add_node("tool_node", ToolNode(tools=tools))
-graph.add_node("increment_counter", increment_tool_calls)
+async def aplan_node(state: AgentState) -> AgentState:
+    messages = build_messages(state, PLANNING_PROMPT)
+    return {"messages": messages + [await get_llm().ainvoke(messages)], "user_input": state["user_input"], "tool_calls_made": 0}
 
-graph.add_edge(START, "process_node")
-graph.add_conditional_edges(
-    "process_node",
-    should_continue,
-    {
-        "continue": "tool_node",
-        "end": END
-    }
-)
-graph.add_edge("tool_node", "increment_counter")
-graph.add_edge("increment_counter", "process_node")
+def execute_node(state: AgentState) -> AgentState:
+    """Run the planned tool calls, independent ones in parallel."""
+    results = run_plan(state["messages"][-1].tool_calls, tool_executor)
+    return {"messages": results, "user_input": state["user_input"], "tool_calls_made": len(results)}
+
+async def aexecute_node(state: AgentState) -> AgentState:
+    results = await arun_plan(state["messages"][-1].tool_calls, tool_executor)
+    return {"messages": results, "user_input": state["user_input"], "tool_calls_made": len(results)}
+
+def summary_request(state: AgentState) -> list[BaseMessage]:
+    """The user's request and the plan's tool results as plain text, for a tool-free model call."""
+    results = []
+    for message in reversed(state["messages"]):
+        if not isinstance(message, ToolMessage):
+            break
+        results.append(f"[{message.name}]\n{message.content}")
+    report = "\n\n".join(reversed(results))
+    return [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=f"Request: {state['user_input']}\n\nTool results:\n{report}")]
+
+def summarize_node(state: AgentState) -> AgentState:
+    return {"messages": [get_chat().invoke(summary_request(state))], "user_input": state["user_input"],
+            "tool_calls_made": state.get("tool_calls_made", 0)}
+
+async def asummarize_node(state: AgentState) -> AgentState:
+    return {"messages": [await get_chat().ainvoke(summary_request(state))], "user_input": state["user_input"],
+            "tool_calls_made": state.get("tool_calls_made", 0)}
+
+@cache
+def get_app():
+    """Build and compile the graph for AGENT_MODE on first use."""
+    graph = StateGraph(AgentState)
+
+    if AGENT_MODE == "plan":
+        graph.add_node("plan_node", RunnableLambda(plan_node, afunc=aplan_node))
+        graph.add_node("execute_node", RunnableLambda(execute_node, afunc=aexecute_node))
+        graph.add_node("summarize_node", RunnableLambda(summarize_node, afunc=asummarize_node))
+
+        graph.add_edge(START, "plan_node")
+        graph.add_conditional_edges("plan_node", tools_condition, {"tools": "execute_node", END: END})
+        graph.add_edge("execute_node", "summarize_node")
+        graph.add_edge("summarize_node", END)
+    else:
+        graph.add_node("process_node", RunnableLambda(process_node, afunc=aprocess_node))
+        graph.add_node("tool_node", tool_executor.node())
+        graph.add_node("increment_counter", increment_tool_calls)
+
+        graph.add_edge(START, "process_node")
+        graph.add_conditional_edges(
+            "process_node",
+            should_continue,
+            {
+                "continue": "tool_node",
+                "end": END
+            }
+        )
+        graph.add_edge("tool_node", "increment_counter")
+        graph.add_edge("increment_counter", "process_node")
+
+    return instrument(graph.compile(), "email_agent")
 
-app = graph.compile()
+def main():
+    # Test the agent
+    result = get_app().invoke({
+        "user_input": "read the last mail",
+        "tool_calls_made": 0
+    })
 
-# Test the agent
-result = app.invoke({
-    "user_input": "read the last mail",
-    "tool_calls_made": 0
-})
+    # Print all messages in the conversation for debugging
+    print(result["messages"][-1].content)
 
-# Print all messages in the conversation for debugging
-print(result["messages"][-1].content)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
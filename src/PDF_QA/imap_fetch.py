@@ -0,0 +1,246 @@
+import base64
+import quopri
+import re
+from itertools import takewhile
+
+from mime_parse import MAX_BODY_CHARS, html_to_text
+
+HEADER_FIELDS = ("FROM", "SUBJECT", "DATE")
+PREVIEW_BYTES = 2048
+
+UID_RE = re.compile(rb"UID (\d+)")
+FLAGS_RE = re.compile(rb"FLAGS \(([^)]*)\)")
+FETCH_START_RE = re.compile(rb"\d+ \(")
+ATOM_RE = re.compile(rb'\s*(\(|\)|"(?:[^"\\]|\\.)*"|\{\d+\}|[^\s()"]+)')
+
+
+def parse_fetch(data: list, with_line: bool = False) -> list[tuple]:
+    """Turn an imaplib UID FETCH response into (uid, flags, literal[, line]) tuples."""
+    records = []  # [line, literal]; items after a literal (e.g. b' FLAGS (...))') belong to it
+    for item in data:
+        if isinstance(item, tuple):
+            records.append([item[0], item[1]])
+        elif item and (not records or FETCH_START_RE.match(item)):
+            records.append([item, None])
+        elif item and records:
+            records[-1][0] += item
+
+    parsed = []
+    for line, literal in records:
+        uid = UID_RE.search(line)
+        if uid:
+            flags = FLAGS_RE.search(line)
+            item = (int(uid.group(1)), flags.group(1).decode() if flags else "", literal)
+            parsed.append(item + (line,) if with_line else item)
+    return parsed
+
+
+def _check(status: str, data, action: str):
+    if status != "OK":
+        raise Exception(f"Failed to {action}: {data}")
+
+
+def fetch_headers(imap, uids: list[int], fields: tuple[str, ...] = HEADER_FIELDS) -> dict[int, dict]:
+    """
+    Fetch only a few header fields, flags, size and body structure for many
+    messages in one round trip.
+
+    Returns:
+        dict[int, dict]: uid -> {"flags", "size", "headers" (raw header bytes),
+        "parts" (see iter_parts; empty if the structure could not be parsed)}.
+    """
+    if not uids:
+        return {}
+    status, data = imap.uid(
+        "FETCH", ",".join(str(uid) for uid in uids),
+        f"(UID FLAGS RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({' '.join(fields)})])",
+    )
+    _check(status, data, "fetch headers")
+    result = {}
+    for uid, flags, literal, line in parse_fetch(data, with_line=True):
+        size = re.search(rb"RFC822\.SIZE (\d+)", line)
+        try:
+            parts = list(iter_parts(parse_bodystructure(line)))
+        except (ValueError, IndexError):
+            parts = []  # e.g. a structure with literals in it; the body is then indexed when it is opened
+        result[uid] = {"flags": flags, "size": int(size.group(1)) if size else None, "headers": literal or b"", "parts": parts}
+    return result
+
+
+def _parse_list(tokens: list[bytes], pos: int = 0):
+    items = []
+    while pos < len(tokens):
+        token = tokens[pos]
+        if token == b"(":
+            item, pos = _parse_list(tokens, pos + 1)
+            items.append(item)
+        elif token == b")":
+            return items, pos + 1
+        elif token.upper() == b"NIL":
+            items.append(None)
+            pos += 1
+        else:
+            items.append(token[1:-1].decode(errors="replace") if token.startswith(b'"') else token.decode(errors="replace"))
+            pos += 1
+    return items, pos
+
+
+def parse_bodystructure(line: bytes) -> list:
+    """Parse the BODYSTRUCTURE item of a FETCH response line into nested lists."""
+    start = line.upper().index(b"BODYSTRUCTURE") + len(b"BODYSTRUCTURE")
+    tokens = ATOM_RE.findall(line[start:])
+    structure, _ = _parse_list(tokens, 1)  # skip the opening "("
+    return structure
+
+
+def iter_parts(structure: list, section: str = ""):
+    """
+    Walk a parsed BODYSTRUCTURE and yield one dict per leaf part with its
+    section number ("1", "2.1", ...), MIME type, charset, encoding, size and
+    filename, so parts can be chosen and fetched on their own.
+    """
+    if structure and isinstance(structure[0], list):
+        for i, child in enumerate(takewhile(lambda c: isinstance(c, list), structure)):
+            yield from iter_parts(child, f"{section}.{i + 1}" if section else str(i + 1))
+        return
+    params = structure[2] if len(structure) > 2 and isinstance(structure[2], list) else []
+    params = {str(k).lower(): v for k, v in zip(params[::2], params[1::2])}
+    # Extension data starts with MD5 then the disposition; text parts carry a line count before it,
+    # message/rfc822 parts their envelope, body structure and line count (RFC 3501 section 7.4.2).
+    kind = (str(structure[0]).lower(), str(structure[1]).lower()) if len(structure) > 1 else ("", "")
+    index = 9 if kind[0] == "text" else 11 if kind == ("message", "rfc822") else 8
+    disposition = structure[index] if len(structure) > index else None
+    if not (isinstance(disposition, list) and disposition and isinstance(disposition[0], str)):
+        disposition = None
+    disposition_params = disposition[1] if disposition and len(disposition) > 1 and isinstance(disposition[1], list) else []
+    disposition_params = {str(k).lower(): v for k, v in zip(disposition_params[::2], disposition_params[1::2])}
+    yield {
+        "section": section or "1",
+        "type": f"{structure[0]}/{structure[1]}".lower(),
+        "charset": params.get("charset", "utf-8"),
+        "encoding": (structure[5] or "7bit").lower() if len(structure) > 5 else "7bit",
+        "size": int(structure[6]) if len(structure) > 6 and str(structure[6]).isdigit() else None,
+        "filename": disposition_params.get("filename") or params.get("name"),
+        "disposition": disposition[0].lower() if disposition else None,
+    }
+
+
+def fetch_structure(imap, uid: int) -> list[dict]:
+    """Fetch BODYSTRUCTURE for a message and return its leaf parts (see iter_parts)."""
+    status, data = imap.uid("FETCH", str(uid), "(UID BODYSTRUCTURE)")
+    _check(status, data, "fetch body structure")
+    line = b"".join(item[0] + item[1] if isinstance(item, tuple) else item for item in data if item)
+    return list(iter_parts(parse_bodystructure(line)))
+
+
+def decode_part(data: bytes, encoding: str, charset: str) -> str:
+    """Decode a (possibly truncated) part body using its transfer encoding and charset."""
+    if encoding == "base64":
+        data = re.sub(rb"\s", b"", data)
+        data = base64.b64decode(data[:len(data) - len(data) % 4])
+    elif encoding == "quoted-printable":
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+
+def text_part(parts: list[dict]) -> tuple[dict, str] | None:
+    """The text/plain (or else text/html) part of a message and the section to fetch it with."""
+    text_parts = [p for p in parts if p["type"].startswith("text/") and p["disposition"] != "attachment"]
+    if not text_parts:
+        return None
+    part = next((p for p in text_parts if p["type"] == "text/plain"), text_parts[0])
+    return part, part["section"]  # BODY[1] is also the body of a single-part message
+
+
+def fetch_preview(imap, uid: int, max_bytes: int = PREVIEW_BYTES) -> str:
+    """
+    Fetch the first max_bytes of the message's text body.
+
+    BODYSTRUCTURE is used to pick the text/plain (or text/html) part so only
+    that part's leading bytes are downloaded with BODY.PEEK[section]<0.N>;
+    attachments are never transferred.
+    """
+    chosen = text_part(fetch_structure(imap, uid))
+    if chosen is None:
+        return ""
+    part, section = chosen
+    status, data = imap.uid("FETCH", str(uid), f"(UID BODY.PEEK[{section}]<0.{max_bytes}>)")
+    _check(status, data, "fetch preview")
+    parsed = parse_fetch(data)
+    return decode_part(parsed[0][2] or b"", part["encoding"], part["charset"]) if parsed else ""
+
+
+def fetch_body_texts(imap, parts_by_uid: dict[int, list[dict]], max_bytes: int = PREVIEW_BYTES) -> dict[int, str]:
+    """
+    Fetch the start of the text body of many messages, for the search index.
+
+    Messages whose text part has the same section are fetched together with
+    one BODY.PEEK[section]<0.N>, so a batch usually costs one or two round
+    trips. HTML is reduced to plain text.
+    """
+    groups = {}
+    for uid, parts in parts_by_uid.items():
+        chosen = text_part(parts)
+        if chosen:
+            groups.setdefault(chosen[1], []).append((uid, chosen[0]))
+    texts = {}
+    for section, members in groups.items():
+        status, data = imap.uid("FETCH", ",".join(str(uid) for uid, _ in members), f"(UID BODY.PEEK[{section}]<0.{max_bytes}>)")
+        _check(status, data, "fetch body text")
+        bodies = {uid: literal for uid, _, literal in parse_fetch(data)}
+        for uid, part in members:
+            text = decode_part(bodies.get(uid) or b"", part["encoding"], part["charset"])
+            texts[uid] = html_to_text(text) if part["type"] == "text/html" else text
+    return texts
+
+
+def fetch_text(imap, uid: int, max_body_chars: int = MAX_BODY_CHARS) -> dict:
+    """
+    Fetch a message's text body without its attachments.
+
+    Only the text/plain (or else text/html, reduced to plain text) part is
+    downloaded; the other parts are listed from BODYSTRUCTURE, in the shape
+    parse_message uses, so they can be fetched on demand with fetch_part.
+
+    Returns:
+        dict: {"body", "attachments"}.
+    """
+    parts = fetch_structure(imap, uid)
+    chosen = text_part(parts)
+    body = ""
+    if chosen is not None:
+        part, section = chosen
+        status, data = imap.uid("FETCH", str(uid), f"(UID BODY.PEEK[{section}])")
+        _check(status, data, "fetch email")
+        parsed = parse_fetch(data)
+        body = decode_part((parsed[0][2] or b"") if parsed else b"", part["encoding"], part["charset"])
+        if part["type"] == "text/html":
+            body = html_to_text(body)
+    if len(body) > max_body_chars:
+        body = body[:max_body_chars] + f"\n[... truncated, {len(body) - max_body_chars} more characters]"
+    attachments = [{
+        "section": p["section"],
+        "filename": p["filename"] or (f"part-{p['section']}.eml" if p["type"] == "message/rfc822" else f"part-{p['section']}"),
+        "content_type": p["type"],
+        "size": (p["size"] or 0) * 3 // 4 if p["encoding"] == "base64" else p["size"] or 0,
+    } for p in parts if p["disposition"] == "attachment" or not p["type"].startswith("text/")]
+    return {"body": body, "attachments": attachments}
+
+
+def fetch_part(imap, uid: int, section: str) -> bytes:
+    """Download and decode a single MIME part (e.g. an attachment) by its section number."""
+    part = next((p for p in fetch_structure(imap, uid) if p["section"] == section), None)
+    if part is None:
+        raise Exception(f"Email {uid} has no part {section}")
+    status, data = imap.uid("FETCH", str(uid), f"(UID BODY.PEEK[{section}])")
+    _check(status, data, "fetch attachment")
+    parsed = parse_fetch(data)
+    encoded = parsed[0][2] if parsed else b""
+    if part["encoding"] == "base64":
+        return base64.b64decode(re.sub(rb"\s", b"", encoded or b""))
+    if part["encoding"] == "quoted-printable":
+        return quopri.decodestring(encoded or b"")
+    return encoded or b""
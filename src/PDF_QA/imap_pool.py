@@ -0,0 +1,151 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from imaplib import IMAP4, IMAP4_SSL
+
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_POOL_SIZE = int(os.getenv("IMAP_POOL_SIZE", "2"))
+IMAP_IDLE_TIMEOUT = float(os.getenv("IMAP_IDLE_TIMEOUT", "300"))
+IMAP_KEEPALIVE = float(os.getenv("IMAP_KEEPALIVE", "60"))
+
+
+class ImapPool:
+    """
+    A small pool of logged-in IMAP connections shared by the email tools.
+
+    Connections are authenticated once and reused, remember which mailbox
+    they have selected, are checked with NOOP before reuse when they have
+    been idle for a while, and are logged out after IMAP_IDLE_TIMEOUT. A
+    background thread keeps idle connections alive and evicts stale ones.
+
+    Pass factory=imaplib.IMAP4 and a local host/port to run against a
+    plain-text stand-in server in tests.
+    """
+
+    def __init__(self, username: str, password: str, host: str = IMAP_HOST, port: int = IMAP_PORT,
+                 size: int = IMAP_POOL_SIZE, idle_timeout: float = IMAP_IDLE_TIMEOUT,
+                 keepalive: float = IMAP_KEEPALIVE, factory=IMAP4_SSL):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # [(connection, last_used)]
+        self._selected = {}  # id(connection) -> mailbox
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reaper = None
+
+    def _connect(self) -> IMAP4:
+        imap = self.factory(self.host, self.port)
+        status, response = imap.login(self.username, self.password)
+        if status != "OK":
+            raise Exception(f"Failed to authenticate: {response}")
+        return imap
+
+    def _discard(self, imap: IMAP4):
+        self._selected.pop(id(imap), None)
+        try:
+            imap.logout()
+        except Exception:
+            pass
+
+    def _healthy(self, imap: IMAP4) -> bool:
+        try:
+            return imap.noop()[0] == "OK"
+        except Exception:
+            return False
+
+    def _take_idle(self) -> IMAP4 | None:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                imap, last_used = self._idle.pop()
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.idle_timeout or (idle_for > self.keepalive and not self._healthy(imap)):
+                self._discard(imap)
+                continue
+            return imap
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, name="imap-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        """Background loop: NOOP idle connections and evict the stale ones."""
+        while not self._closed.wait(max(self.keepalive, 1.0)):
+            with self._lock:
+                idle, self._idle = self._idle, []
+            keep = []
+            for imap, last_used in idle:
+                if time.monotonic() - last_used > self.idle_timeout or not self._healthy(imap):
+                    self._discard(imap)
+                else:
+                    keep.append((imap, last_used))
+            with self._lock:
+                self._idle.extend(keep)
+
+    @contextmanager
+    def connection(self, mailbox: str | None = None):
+        """
+        Borrow a logged-in connection, optionally with mailbox selected.
+
+        Connections that fail with a socket or protocol abort are dropped
+        instead of being returned to the pool.
+        """
+        if self._closed.is_set():
+            raise RuntimeError("IMAP pool is closed")
+        self._slots.acquire()
+        imap = None
+        try:
+            imap = self._take_idle() or self._connect()
+            self._start_reaper()
+            if mailbox and self._selected.get(id(imap)) != mailbox:
+                status, response = imap.select(mailbox)
+                if status != "OK":
+                    raise Exception(f"Failed to select {mailbox}: {response}")
+                self._selected[id(imap)] = mailbox
+            yield imap
+        except (IMAP4.abort, OSError):
+            if imap is not None:
+                self._discard(imap)
+                imap = None
+            raise
+        finally:
+            if imap is not None:
+                if self._closed.is_set():
+                    self._discard(imap)
+                else:
+                    with self._lock:
+                        self._idle.append((imap, time.monotonic()))
+            self._slots.release()
+
+    def close(self):
+        """Stop the keepalive thread and log out every idle connection."""
+        self._closed.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for imap, _ in idle:
+            self._discard(imap)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ImapPool:
+    """Return the process-wide pool, created on first use from EMAIL_USERNAME/EMAIL_PASSWORD."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ImapPool(os.getenv("EMAIL_USERNAME"), os.getenv("EMAIL_PASSWORD"))
+            atexit.register(_pool.close)
+        return _pool
@@ -1,25 +1,43 @@
+from functools import cache
 from typing import Annotated, Sequence, TypedDict
 
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.tools import tool
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
 
 from dotenv import load_dotenv
+if __name__ == "__main__":
+    load_dotenv()
 
+import logging
 import os
-import fitz
+import sys
+
+# src/ holds the modules shared with the other agents (e.g. parallel_tools)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_memory import fit_to_budget
+from chat_model import make_chat_model
+from parallel_tools import parallel_tool_node
+from pdf_cache import iter_pages, load_pages
+from pdf_corpus import ingest_corpus
+from pdf_retrieval import format_passages, load_index, search
+from vector_index import load_vector_index, search_vectors
+from telemetry import instrument
 
-load_dotenv()
+MAX_PAGES_PER_CALL = int(os.getenv("PDF_MAX_PAGES_PER_CALL", "20"))
+
+logger = logging.getLogger("agents.pdf_qa")
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     file: str | None
     user_input: str | None
+    passages: str | None
+    corpus: str | None  # Folder of PDFs; when set, questions are answered across all of them
 
 @tool
 def extract_text_from_pdf(file_path: str) -> str:
@@ -32,35 +50,118 @@ def extract_text_from_pdf(file_path: str) -> str:
     Returns:
         str: The full extracted text from the PDF.
     """
-    text = ""
     try:
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                text += page.get_text()
+        text = "".join(load_pages(file_path))
         return text if text.strip() else "No text found in the PDF file."
     except FileNotFoundError:
         return f"Error: File not found at {file_path}"
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
 
-tools = [extract_text_from_pdf]
 
-llm = ChatGoogleGenerativeAI(
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    model=os.getenv("GOOGLE_MODEL", "gemini-1.5-flash"),  # Default fallback
-    temperature=0.2
-).bind_tools(tools)
+@tool
+def extract_pdf_pages(file_path: str, start_page: int = 1, end_page: int | None = None) -> str:
+    """
+    Extracts text from a range of pages of a PDF file.
+    Only a limited number of pages is returned per call; ask again for the next range.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        start_page (int): First page to read (1-based).
+        end_page (int | None): Last page to read (inclusive).
+
+    Returns:
+        str: The text of each page, prefixed with its page number.
+    """
+    last = start_page + MAX_PAGES_PER_CALL - 1
+    end_page = last if end_page is None else min(end_page, last)
+    try:
+        parts = [f"--- Page {number} ---\n{text}" for number, text in iter_pages(file_path, start_page, end_page)]
+    except FileNotFoundError:
+        return f"Error: File not found at {file_path}"
+    except Exception as e:
+        return f"Error reading PDF: {e}"
+    return "\n".join(parts) if parts else f"No pages found in range {start_page}-{end_page}."
+
+
+@tool
+def semantic_search_pdf(file_path: str, query: str, k: int = 5) -> str:
+    """
+    Finds the passages of a PDF file closest in meaning to a query, even when
+    the wording differs from the document.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        query (str): What to look for.
+        k (int): Number of passages to return.
+
+    Returns:
+        str: The matching passages with their page numbers.
+    """
+    try:
+        passages = search_vectors(load_vector_index(file_path), [query], k)[0]
+    except FileNotFoundError:
+        return f"Error: File not found at {file_path}"
+    except Exception as e:
+        return f"Error searching PDF: {e}"
+    return format_passages(passages) if passages else "No matching passages found."
+
+tools = [extract_text_from_pdf, extract_pdf_pages, semantic_search_pdf]
+
+@cache
+def get_llm():
+    return make_chat_model(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model=os.getenv("GOOGLE_MODEL", "gemini-1.5-flash"),  # Default fallback
+        temperature=0.2
+    ).bind_tools(tools)
+
+def retrieve_node(state: AgentState) -> AgentState:
+    """Pick the top-k passages for the question from the document's (or corpus's) BM25 index."""
+    try:
+        index = ingest_corpus(state["corpus"]) if state.get("corpus") else load_index(state["file"])
+        passages = format_passages(search(index, state["user_input"]))
+    except Exception as e:
+        logger.warning("Retrieval failed, falling back to tools: %s", e)
+        passages = None
+    return {"passages": passages or None}
 
 def process_node(state: AgentState) -> AgentState:
     """Process the user's question and determine if tools are needed."""
     system_prompt = SystemMessage(content="""
 You are a helpful assistant that answers questions about PDFs. 
 When given a file path and a question, use the extract_text_from_pdf tool to extract text from the PDF first.
+For long documents, use extract_pdf_pages to read the document a few pages at a time instead.
+If the passages you have do not answer the question, use semantic_search_pdf to look for related wording.
 Then answer the user's question based on the extracted text.
 Be specific and cite relevant parts of the text when possible.
 """)
     
-    user_prompt = HumanMessage(content=f"""
+    if state.get("corpus") and state.get("passages"):
+        user_prompt = HumanMessage(content=f"""
+Please help me answer this question about a folder of PDF files:
+Question: {state["user_input"]}
+Folder: {state["corpus"]}
+
+Relevant passages, each tagged with its source document and page:
+{state["passages"]}
+
+Answer from these passages and cite the document name and page number for every fact you use.
+Only use the tools (with the folder path joined to the document name) if the passages are not enough.
+""")
+    elif state.get("passages"):
+        user_prompt = HumanMessage(content=f"""
+Please help me answer this question about a PDF file:
+Question: {state["user_input"]}
+File path: {state["file"]}
+
+Relevant passages from the PDF:
+{state["passages"]}
+
+Answer from these passages and cite their page numbers. Only use the tools if the passages are not enough.
+""")
+    else:
+        user_prompt = HumanMessage(content=f"""
 Please help me answer this question about a PDF file:
 Question: {state["user_input"]}
 File path: {state["file"]}
@@ -69,22 +170,25 @@ First, extract the text from the PDF, then answer the question based on the cont
 """)
 
     # Get existing messages or start fresh
-    messages = state.get("messages", [])
+    messages = list(state.get("messages", []))
     
     # Only add system and user messages if this is the first call
     if not messages or not any(isinstance(msg, SystemMessage) for msg in messages):
-        messages_to_send = [system_prompt, user_prompt]
-    else:
-        # If we already have messages, just send the last few for context
-        messages_to_send = messages[-5:]  # Keep last 5 messages for context
+        messages = [system_prompt, user_prompt]
+    elif isinstance(messages[-1], AIMessage) and not messages[-1].tool_calls:
+        # A new question on top of an earlier conversation
+        messages = messages + [user_prompt]
     
-    response = llm.invoke(messages_to_send)
+    # Keep the prompt within the token budget: old tool outputs become references, old turns a summary
+    response = get_llm().invoke(fit_to_budget(messages))
     
     # Return updated state
     return {
-        "messages": messages + [response] if messages else [system_prompt, user_prompt, response],
+        "messages": messages + [response],
         "file": state["file"],
         "user_input": state["user_input"],
+        "passages": state.get("passages"),
+        "corpus": state.get("corpus"),
     }
 
 def should_continue(state: AgentState):
@@ -101,35 +205,37 @@ def should_continue(state: AgentState):
     else:
         return "end"
 
-def tool_node(state: AgentState) -> AgentState:
-    """Execute tools and return results."""
-    tool_executor = ToolNode(tools)
-    result = tool_executor.invoke(state)
-    return result
+@cache
+def get_app():
+    """Build and compile the graph on first use."""
+    # Execute the tool calls of one model turn concurrently
+    tool_node = parallel_tool_node(tools)
 
-# Create the graph
-graph = StateGraph(AgentState)
+    # Create the graph
+    graph = StateGraph(AgentState)
 
-# Add nodes
-graph.add_node("process_node", process_node)
-graph.add_node("toolcall", tool_node)
+    # Add nodes
+    graph.add_node("retrieve", retrieve_node)
+    graph.add_node("process_node", process_node)
+    graph.add_node("toolcall", tool_node)
 
-# Add conditional edges
-graph.add_conditional_edges(
-    "process_node",
-    should_continue,
-    {
-        "continue": "toolcall",
-        "end": END,
-    } 
-)
+    # Add conditional edges
+    graph.add_conditional_edges(
+        "process_node",
+        should_continue,
+        {
+            "continue": "toolcall",
+            "end": END,
+        } 
+    )
 
-# Add edges
-graph.add_edge(START, "process_node")
-graph.add_edge("toolcall", "process_node")
+    # Add edges
+    graph.add_edge(START, "retrieve")
+    graph.add_edge("retrieve", "process_node")
+    graph.add_edge("toolcall", "process_node")
 
-# Compile the graph
-app = graph.compile()
+    # Compile the graph
+    return instrument(graph.compile(), "improved_pdf_qa")
 
 def main():
     """Main function to run the PDF Q&A agent."""
@@ -138,10 +244,11 @@ def main():
     
     try:
         # Invoke the agent
-        state = app.invoke({
+        state = get_app().invoke({
             "messages": [], 
             "file": file_path, 
-            "user_input": user_input
+            "user_input": user_input,
+            "corpus": os.getenv("PDF_CORPUS"),  # Set to a folder to ask across many PDFs
         })
         
         # Print the final response
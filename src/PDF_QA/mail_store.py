@@ -0,0 +1,340 @@
+import email
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from email.header import decode_header, make_header
+from email.utils import parsedate_to_datetime
+
+from imap_fetch import fetch_body_texts, fetch_headers, parse_fetch
+
+MAIL_STORE_PATH = os.getenv("MAIL_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "ai_agents", "mail.sqlite3"))
+MAIL_SYNC_INTERVAL = float(os.getenv("MAIL_SYNC_INTERVAL", "15"))
+# Without CONDSTORE, each sync refreshes the flags of the newest MAIL_FLAG_WINDOW messages
+# only, and all flags once every MAIL_FULL_FLAG_SYNC_INTERVAL seconds.
+MAIL_FLAG_WINDOW = int(os.getenv("MAIL_FLAG_WINDOW", "200"))
+MAIL_FULL_FLAG_SYNC_INTERVAL = float(os.getenv("MAIL_FULL_FLAG_SYNC_INTERVAL", "3600"))
+HEADER_BATCH_SIZE = 500
+# Bytes of each new message's text body downloaded by sync for the search index (0 to index bodies only once opened).
+MAIL_INDEX_BODY_BYTES = int(os.getenv("MAIL_INDEX_BODY_BYTES", "2048"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    name TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL NOT NULL DEFAULT 0,
+    modseq INTEGER,
+    flags_synced_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    mailbox TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    flags TEXT NOT NULL DEFAULT '',
+    sender TEXT,
+    subject TEXT,
+    date REAL,
+    size INTEGER,
+    raw BLOB,
+    body_text TEXT,
+    attachments TEXT,
+    PRIMARY KEY (mailbox, uid)
+);
+"""
+
+# Full-text index over sender, subject and body (the start of it from sync, all of it once
+# the message is opened), kept in step with the messages table by triggers.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    sender, subject, body_text, content='messages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, sender, subject, body_text) VALUES (new.rowid, new.sender, new.subject, new.body_text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, sender, subject, body_text) VALUES ('delete', old.rowid, old.sender, old.subject, old.body_text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF sender, subject, body_text ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, sender, subject, body_text) VALUES ('delete', old.rowid, old.sender, old.subject, old.body_text);
+    INSERT INTO messages_fts (rowid, sender, subject, body_text) VALUES (new.rowid, new.sender, new.subject, new.body_text);
+END;
+"""
+
+STATUS_RE = re.compile(rb"(UIDVALIDITY|UIDNEXT|MESSAGES|HIGHESTMODSEQ) (\d+)")
+
+_lock = threading.RLock()  # guards the connection; held only around SQLite calls
+_sync_lock = threading.Lock()  # one sync at a time, without blocking readers
+_store = None
+
+
+def open_store(path: str = MAIL_STORE_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the local message store."""
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(messages)")}
+    if "size" not in columns:
+        conn.execute("ALTER TABLE messages ADD COLUMN size INTEGER")
+    if "body_text" not in columns:
+        conn.execute("ALTER TABLE messages ADD COLUMN body_text TEXT")
+    if "attachments" not in columns:
+        conn.execute("ALTER TABLE messages ADD COLUMN attachments TEXT")
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(mailboxes)")}
+    if "modseq" not in columns:
+        conn.execute("ALTER TABLE mailboxes ADD COLUMN modseq INTEGER")
+        conn.execute("ALTER TABLE mailboxes ADD COLUMN flags_synced_at REAL NOT NULL DEFAULT 0")
+    encoded = conn.execute("SELECT rowid, sender, subject FROM messages WHERE sender LIKE '%=?%' OR subject LIKE '%=?%'").fetchall()
+    if encoded:  # stored by versions that kept the encoded-words
+        conn.executemany("UPDATE messages SET sender = ?, subject = ? WHERE rowid = ?",
+                         [(decode_value(r["sender"]), decode_value(r["subject"]), r["rowid"]) for r in encoded])
+        conn.commit()
+    if not has_fts(conn):
+        try:
+            conn.executescript(FTS_SCHEMA)
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            print(f"SQLite FTS5 not available, email search falls back to LIKE: {e}")
+    return conn
+
+
+def has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone() is not None
+
+
+def get_store() -> sqlite3.Connection:
+    """Return the process-wide store at MAIL_STORE_PATH."""
+    global _store
+    with _lock:
+        if _store is None:
+            _store = open_store()
+        return _store
+
+
+def decode_value(value: str | None) -> str | None:
+    """Decode RFC 2047 encoded-words (=?UTF-8?Q?...?=) so stored headers read and search as plain text."""
+    if value is None or "=?" not in value:
+        return value
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, UnicodeDecodeError, ValueError):
+        return value
+
+
+def _headers(raw: bytes) -> tuple[str | None, str | None, float | None]:
+    msg = email.message_from_bytes(raw)
+    try:
+        date = parsedate_to_datetime(msg["date"]).timestamp() if msg["date"] else None
+    except (TypeError, ValueError):
+        date = None
+    return decode_value(msg["from"]), decode_value(msg["subject"]), date
+
+
+def needs_sync(conn: sqlite3.Connection, mailbox: str = "INBOX") -> bool:
+    """True when the mailbox was never synced or not within MAIL_SYNC_INTERVAL seconds."""
+    with _lock:
+        row = conn.execute("SELECT synced_at FROM mailboxes WHERE name = ?", (mailbox,)).fetchone()
+    return row is None or time.time() - row["synced_at"] >= MAIL_SYNC_INTERVAL
+
+
+def _fetch_flags(imap, uids: str, changed_since: int | None = None) -> dict[int, str] | None:
+    modifier = f" (CHANGEDSINCE {changed_since})" if changed_since is not None else ""
+    status, data = imap.uid("FETCH", uids, f"(UID FLAGS){modifier}")
+    if status != "OK":
+        return None
+    return {uid: flags for uid, flags, _ in parse_fetch(data)}
+
+
+def _update_flags(conn: sqlite3.Connection, mailbox: str, current: dict[int, str], first: int | None = None, last: int = 0):
+    """Store fetched flags; with a UID range, known messages in it that the server no longer has are removed."""
+    with _lock:
+        if first is not None:
+            known = [r["uid"] for r in conn.execute("SELECT uid FROM messages WHERE mailbox = ? AND uid BETWEEN ? AND ?",
+                                                    (mailbox, first, last))]
+            conn.executemany("DELETE FROM messages WHERE mailbox = ? AND uid = ?",
+                             [(mailbox, uid) for uid in known if uid not in current])
+        conn.executemany("UPDATE messages SET flags = ? WHERE mailbox = ? AND uid = ?",
+                         [(flags, mailbox, uid) for uid, flags in current.items()])
+
+
+def _sync_flags(imap, conn: sqlite3.Connection, mailbox: str, row, last_uid: int, modseq: int | None) -> float:
+    """Pick up flag changes of already stored messages; returns when all flags were last refreshed."""
+    flags_synced_at = row["flags_synced_at"]
+    if modseq is not None and row["modseq"] is not None:
+        if modseq != row["modseq"]:
+            current = _fetch_flags(imap, f"1:{last_uid}", changed_since=row["modseq"])
+            if current:
+                _update_flags(conn, mailbox, current)
+        return flags_synced_at
+    if modseq is not None or time.time() - flags_synced_at >= MAIL_FULL_FLAG_SYNC_INTERVAL:
+        current = _fetch_flags(imap, f"1:{last_uid}")
+        if current is not None:
+            _update_flags(conn, mailbox, current, 1, last_uid)
+            flags_synced_at = time.time()
+        return flags_synced_at
+    with _lock:
+        window = conn.execute("SELECT uid FROM messages WHERE mailbox = ? AND uid <= ? ORDER BY uid DESC LIMIT 1 OFFSET ?",
+                              (mailbox, last_uid, MAIL_FLAG_WINDOW - 1)).fetchone()
+    first = window["uid"] if window else 1
+    current = _fetch_flags(imap, f"{first}:{last_uid}")
+    if current is not None:
+        _update_flags(conn, mailbox, current, first, last_uid)
+    return flags_synced_at
+
+
+def _sync_expunges(imap, conn: sqlite3.Connection, mailbox: str, last_uid: int, messages: int | None):
+    """Drop messages deleted on the server; the UID list is only fetched when the counts say something was removed."""
+    with _lock:
+        local = conn.execute("SELECT COUNT(*) FROM messages WHERE mailbox = ?", (mailbox,)).fetchone()[0]
+    if messages is None or local <= messages:
+        return
+    status, data = imap.uid("SEARCH", None, f"UID 1:{last_uid}")
+    if status == "OK":
+        present = {int(uid) for uid in data[0].split()}
+        with _lock:
+            known = [r["uid"] for r in conn.execute("SELECT uid FROM messages WHERE mailbox = ? AND uid <= ?", (mailbox, last_uid))]
+            conn.executemany("DELETE FROM messages WHERE mailbox = ? AND uid = ?",
+                             [(mailbox, uid) for uid in known if uid not in present])
+
+
+def sync_mailbox(imap, conn: sqlite3.Connection, mailbox: str = "INBOX") -> int:
+    """
+    Bring the local copy of a mailbox up to date and return the number of new messages.
+
+    Uses STATUS to skip the search when nothing arrived, UID SEARCH UID n:*
+    to find new messages and a FLAGS-only fetch to pick up flag changes.
+    With CONDSTORE only messages changed since the last sync's HIGHESTMODSEQ
+    are fetched; otherwise the newest MAIL_FLAG_WINDOW messages are, with a
+    full pass every MAIL_FULL_FLAG_SYNC_INTERVAL seconds. Expunges are found
+    by comparing the STATUS message count with the local one. Of new
+    messages only the From/Subject/Date headers, size and the first
+    MAIL_INDEX_BODY_BYTES of the text body (for search) are downloaded; full
+    bodies are fetched on demand (see store_text). A UIDVALIDITY change
+    discards the local copy. imap must already have mailbox selected.
+
+    Syncs run one at a time; the store itself is only locked while SQLite
+    is read or written, so reads are never held up by the IMAP round trips.
+    """
+    with _sync_lock:
+        with _lock:
+            row = conn.execute("SELECT uidvalidity, last_uid, modseq, flags_synced_at FROM mailboxes WHERE name = ?",
+                               (mailbox,)).fetchone()
+        condstore = "CONDSTORE" in getattr(imap, "capabilities", ())
+        items = "(UIDVALIDITY UIDNEXT MESSAGES HIGHESTMODSEQ)" if condstore else "(UIDVALIDITY UIDNEXT MESSAGES)"
+        status, data = imap.status(mailbox, items)
+        if status != "OK":
+            raise Exception(f"Failed to get status of {mailbox}: {data}")
+        values = {k.decode(): int(v) for k, v in STATUS_RE.findall(data[0])}
+        uidvalidity, uidnext = values["UIDVALIDITY"], values["UIDNEXT"]
+        modseq = values.get("HIGHESTMODSEQ")
+
+        if row and row["uidvalidity"] != uidvalidity:
+            with _lock:
+                conn.execute("DELETE FROM messages WHERE mailbox = ?", (mailbox,))
+                conn.commit()
+            row = None
+        last_uid = row["last_uid"] if row else 0
+
+        new_uids = []
+        if uidnext - 1 > last_uid:
+            status, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+            if status != "OK":
+                raise Exception(f"Failed to search: {data}")
+            new_uids = [int(uid) for uid in data[0].split() if int(uid) > last_uid]
+
+        for i in range(0, len(new_uids), HEADER_BATCH_SIZE):
+            items = fetch_headers(imap, new_uids[i:i + HEADER_BATCH_SIZE])
+            texts = fetch_body_texts(imap, {uid: item["parts"] for uid, item in items.items()},
+                                     MAIL_INDEX_BODY_BYTES) if MAIL_INDEX_BODY_BYTES > 0 else {}
+            with _lock:
+                conn.executemany(
+                    "INSERT INTO messages (mailbox, uid, flags, sender, subject, date, size, body_text) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (mailbox, uid) DO UPDATE SET flags = excluded.flags, sender = excluded.sender, "
+                    "subject = excluded.subject, date = excluded.date, size = excluded.size, "
+                    "body_text = COALESCE(messages.body_text, excluded.body_text)",
+                    [(mailbox, uid, item["flags"], *_headers(item["headers"]), item["size"], texts.get(uid))
+                     for uid, item in items.items()],
+                )
+                conn.commit()
+
+        flags_synced_at = time.time()
+        if last_uid:
+            flags_synced_at = _sync_flags(imap, conn, mailbox, row, last_uid, modseq)
+            _sync_expunges(imap, conn, mailbox, last_uid, values.get("MESSAGES"))
+
+        with _lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO mailboxes (name, uidvalidity, last_uid, synced_at, modseq, flags_synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (mailbox, uidvalidity, max([last_uid] + new_uids), time.time(), modseq, flags_synced_at),
+            )
+            conn.commit()
+        return len(new_uids)
+
+
+def list_messages(conn: sqlite3.Connection, mailbox: str = "INBOX", limit: int | None = None) -> list[sqlite3.Row]:
+    """Return stored messages, newest UID first, without their bodies."""
+    with _lock:
+        return conn.execute(
+            "SELECT uid, flags, sender, subject, date, size FROM messages WHERE mailbox = ? ORDER BY uid DESC LIMIT ?",
+            (mailbox, -1 if limit is None else limit),
+        ).fetchall()
+
+
+def get_message(conn: sqlite3.Connection, uid: int, mailbox: str = "INBOX") -> sqlite3.Row | None:
+    """Return one stored message; attachments is None until its text body has been fetched (raw is only set by older versions)."""
+    with _lock:
+        return conn.execute("SELECT * FROM messages WHERE mailbox = ? AND uid = ?", (mailbox, uid)).fetchone()
+
+
+def latest_message(conn: sqlite3.Connection, mailbox: str = "INBOX") -> sqlite3.Row | None:
+    """Return the stored message with the highest UID."""
+    with _lock:
+        return conn.execute("SELECT * FROM messages WHERE mailbox = ? ORDER BY uid DESC LIMIT 1", (mailbox,)).fetchone()
+
+
+def store_text(conn: sqlite3.Connection, uid: int, body_text: str, attachments: list[dict], mailbox: str = "INBOX"):
+    """Keep a fetched text body and attachment list, so later reads are served locally and the whole body is searchable."""
+    with _lock:
+        conn.execute("UPDATE messages SET body_text = ?, attachments = ? WHERE mailbox = ? AND uid = ?",
+                     (body_text, json.dumps(attachments), mailbox, uid))
+        conn.commit()
+
+
+def search_messages(conn: sqlite3.Connection, query: str = "", since: float | None = None, sender: str | None = None,
+                    mailbox: str = "INBOX", limit: int = 20) -> list[sqlite3.Row]:
+    """
+    Search stored messages by words in sender/subject/body, date and sender.
+
+    Every query word must match (as a prefix). Results are ranked by BM25
+    when there is a query, newest first otherwise.
+    """
+    words = re.findall(r"\w+", query or "")
+    filters, params = ["m.mailbox = ?"], [mailbox]
+    if since is not None:
+        filters.append("m.date >= ?")
+        params.append(since)
+    if sender:
+        filters.append("m.sender LIKE ?")
+        params.append(f"%{sender}%")
+
+    with _lock:
+        if words and has_fts(conn):
+            match = " ".join(f'"{w}"*' for w in words)
+            sql = (f"SELECT m.uid, m.flags, m.sender, m.subject, m.date, m.size FROM messages_fts "
+                   f"JOIN messages m ON m.rowid = messages_fts.rowid "
+                   f"WHERE messages_fts MATCH ? AND {' AND '.join(filters)} "
+                   f"ORDER BY bm25(messages_fts), m.date DESC LIMIT ?")
+            return conn.execute(sql, [match] + params + [limit]).fetchall()
+        for w in words:
+            filters.append("(m.subject LIKE ? OR m.sender LIKE ? OR m.body_text LIKE ?)")
+            params.extend([f"%{w}%"] * 3)
+        sql = (f"SELECT m.uid, m.flags, m.sender, m.subject, m.date, m.size FROM messages m "
+               f"WHERE {' AND '.join(filters)} ORDER BY m.date DESC, m.uid DESC LIMIT ?")
+        return conn.execute(sql, params + [limit]).fetchall()
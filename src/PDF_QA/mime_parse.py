@@ -0,0 +1,108 @@
+import html
+import os
+import re
+from email import policy
+from email.parser import BytesFeedParser
+
+FEED_CHUNK_SIZE = 64 * 1024
+MAX_BODY_CHARS = int(os.getenv("EMAIL_MAX_BODY_CHARS", "20000"))
+
+TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.S | re.I)
+BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+
+def feed(raw: bytes, chunk_size: int = FEED_CHUNK_SIZE):
+    """Parse a message by feeding it to BytesFeedParser in chunks."""
+    parser = BytesFeedParser(policy=policy.default)
+    view = memoryview(raw)
+    for i in range(0, len(view), chunk_size):
+        parser.feed(bytes(view[i:i + chunk_size]))
+    return parser.close()
+
+
+def walk_parts(part, section: str = ""):
+    """
+    Yield (imap_section, part) for every leaf part, numbered like IMAP BODY[section].
+
+    An attached message (message/rfc822) is one leaf, as in BODYSTRUCTURE:
+    its section fetches the whole enclosed message.
+    """
+    if part.is_multipart() and part.get_content_type() != "message/rfc822":
+        for i, child in enumerate(part.get_payload(), start=1):
+            yield from walk_parts(child, f"{section}.{i}" if section else str(i))
+    else:
+        yield section or "1", part
+
+
+def part_bytes(part) -> bytes:
+    """The decoded content of a leaf part; an attached message comes back as the message itself."""
+    if part.get_content_type() == "message/rfc822":
+        return part.get_payload(0).as_bytes()
+    return part.get_payload(decode=True) or b""
+
+
+def decode_text(part) -> str:
+    """Decode a text part with its declared charset, falling back to UTF-8."""
+    data = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return data.decode(charset, errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+
+def html_to_text(text: str) -> str:
+    return BLANK_LINES_RE.sub("\n\n", html.unescape(TAG_RE.sub("", text))).strip()
+
+
+def parse_message(raw: bytes, max_body_chars: int = MAX_BODY_CHARS) -> dict:
+    """
+    Parse an RFC822 message into headers, the best text body and attachment metadata.
+
+    text/plain is preferred over text/html (which is reduced to plain text).
+    Attachments are listed with their IMAP section, type, filename and an
+    estimated size, but never decoded, so they can be fetched on demand.
+
+    Returns:
+        dict: {"subject", "from", "to", "date", "body", "attachments"}.
+    """
+    msg = feed(raw)
+    plain, rich, attachments = None, None, []
+    for section, part in walk_parts(msg):
+        content_type = part.get_content_type()
+        is_attachment = part.get_content_disposition() == "attachment" or (
+            part.get_filename() and not content_type.startswith("text/"))
+        if is_attachment or not content_type.startswith("text/"):
+            encoded = part.get_payload()
+            size = len(encoded) if isinstance(encoded, str) else len(part_bytes(part))
+            if part.get("Content-Transfer-Encoding", "").lower() == "base64":
+                size = size * 3 // 4
+            default_name = f"part-{section}.eml" if content_type == "message/rfc822" else f"part-{section}"
+            attachments.append({
+                "section": section,
+                "filename": part.get_filename() or default_name,
+                "content_type": content_type,
+                "size": size,
+            })
+        elif content_type == "text/plain" and plain is None:
+            plain = part
+        elif content_type == "text/html" and rich is None:
+            rich = part
+
+    if plain is not None:
+        body = decode_text(plain)
+    elif rich is not None:
+        body = html_to_text(decode_text(rich))
+    else:
+        body = ""
+    if len(body) > max_body_chars:
+        body = body[:max_body_chars] + f"\n[... truncated, {len(body) - max_body_chars} more characters]"
+
+    return {
+        "subject": str(msg["subject"] or ""),
+        "from": str(msg["from"] or ""),
+        "to": str(msg["to"] or ""),
+        "date": str(msg["date"] or ""),
+        "body": body,
+        "attachments": attachments,
+    }
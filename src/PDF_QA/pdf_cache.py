@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+# fitz (PyMuPDF) is imported where a PDF is opened, so importing this module stays cheap.
+
+from pdf_extract import extract_pages_parallel
+
+CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ai_agents", "pdf"))
+
+OBJECT_REF_RE = re.compile(r"\b(\d+) \d+ R\b")
+
+
+def cache_dir_for(file_path: str, cache_dir: str | None = None) -> str:
+    """Return the cache folder used for one PDF (keyed by its absolute path)."""
+    key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir or CACHE_DIR, key)
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash the raw bytes of a file in 1MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _object_digest(doc, xref: int, memo: dict) -> bytes:
+    """Hash a PDF object, its stream and every object it references; memo holds digests already computed."""
+    if xref in memo:
+        return memo[xref]
+    memo[xref] = b""  # guards against reference cycles
+    source = doc.xref_object(xref, compressed=True)
+    digest = hashlib.sha1(source.encode("utf-8"))
+    if doc.xref_is_stream(xref):
+        digest.update(doc.xref_stream_raw(xref))
+    for ref in OBJECT_REF_RE.findall(source):
+        digest.update(_object_digest(doc, int(ref), memo))
+    memo[xref] = digest.digest()
+    return memo[xref]
+
+
+def _resources(doc, xref: int) -> str:
+    """The page's /Resources entry, following /Parent when it is inherited from the page tree."""
+    while xref:
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind != "null":
+            return value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        xref = int(parent.split()[0]) if kind == "xref" else 0
+    return ""
+
+
+def page_fingerprint(page, memo: dict | None = None) -> str:
+    """
+    Fingerprint a page without extracting text: its content stream, size and
+    resources (fonts, form XObjects, images), followed recursively, so a page
+    that only draws "/Fm0 Do" changes when the form does. Pass one memo per
+    document so resources shared between pages are hashed once.
+    """
+    memo = {} if memo is None else memo
+    doc = page.parent
+    digest = hashlib.sha1(page.read_contents())
+    digest.update(repr(tuple(page.rect)).encode("utf-8"))
+    resources = _resources(doc, page.xref)
+    digest.update(resources.encode("utf-8"))
+    for ref in OBJECT_REF_RE.findall(resources):
+        digest.update(_object_digest(doc, int(ref), memo))
+    return digest.hexdigest()
+
+
+def write_atomic(path: str, data: str):
+    # A unique temp file per writer, so concurrent writers of the same path never clobber each other's half-written file.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_manifest(folder: str) -> dict | None:
+    try:
+        with open(os.path.join(folder, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _read_pages(folder: str, fingerprints: list[str]) -> list[str] | None:
+    pages = []
+    for fingerprint in fingerprints:
+        try:
+            with open(os.path.join(folder, "pages", f"{fingerprint}.txt"), encoding="utf-8") as f:
+                pages.append(f.read())
+        except FileNotFoundError:
+            return None
+    return pages
+
+
+def _is_fresh(file_path: str, folder: str, manifest: dict | None, stat: os.stat_result) -> bool:
+    """Check the manifest against size/mtime, falling back to the content hash."""
+    if not manifest or manifest["size"] != stat.st_size:
+        return False
+    if manifest["mtime"] != stat.st_mtime and manifest["sha256"] == file_sha256(file_path):
+        manifest["mtime"] = stat.st_mtime
+        write_atomic(os.path.join(folder, "manifest.json"), json.dumps(manifest))
+    return manifest["mtime"] == stat.st_mtime
+
+
+def fresh_manifest(file_path: str, cache_dir: str | None = None) -> dict | None:
+    """The cache manifest of a PDF if it still matches the file, without reading any page text; None otherwise."""
+    folder = cache_dir_for(file_path, cache_dir)
+    manifest = load_manifest(folder)
+    return manifest if _is_fresh(file_path, folder, manifest, os.stat(file_path)) else None
+
+
+def load_pages(file_path: str, cache_dir: str | None = None, workers: int | None = None) -> list[str]:
+    """
+    Return the text of every page of a PDF, using the on-disk cache when possible.
+
+    The cache is keyed by path, size, mtime and content hash. When only the
+    mtime changed the text is served from disk without opening the PDF. When the
+    content changed, pages whose fingerprint is already cached are reused and
+    only new or modified pages are extracted.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        cache_dir (str | None): Root cache folder, defaults to PDF_CACHE_DIR.
+        workers (int | None): Extraction processes, defaults to PDF_EXTRACT_WORKERS.
+
+    Returns:
+        list[str]: The text of each page, in page order.
+    """
+    stat = os.stat(file_path)
+    folder = cache_dir_for(file_path, cache_dir)
+    manifest = load_manifest(folder)
+
+    if _is_fresh(file_path, folder, manifest, stat):
+        pages = _read_pages(folder, manifest["pages"])
+        if pages is not None:
+            return pages
+
+    os.makedirs(os.path.join(folder, "pages"), exist_ok=True)
+    import fitz
+    with fitz.open(file_path) as doc:
+        memo = {}
+        fingerprints = [page_fingerprint(page, memo) for page in doc]
+        cached = set(manifest["pages"]) if manifest else set()
+        missing = [n for n, fp in enumerate(fingerprints)
+                   if fp not in cached or not os.path.exists(os.path.join(folder, "pages", f"{fp}.txt"))]
+
+    extracted = extract_pages_parallel(file_path, missing, workers=workers) if missing else {}
+    for number, text in extracted.items():
+        write_atomic(os.path.join(folder, "pages", f"{fingerprints[number]}.txt"), text)
+
+    pages = []
+    for n, fp in enumerate(fingerprints):
+        read = None if n in extracted else _read_pages(folder, [fp])
+        pages.append(extracted[n] if n in extracted else read[0] if read else None)
+    # A page file removed since the check above (e.g. pruned by another process) is a cache miss.
+    lost = [n for n, text in enumerate(pages) if text is None]
+    for number, text in (extract_pages_parallel(file_path, lost, workers=workers) if lost else {}).items():
+        write_atomic(os.path.join(folder, "pages", f"{fingerprints[number]}.txt"), text)
+        pages[number] = text
+    manifest = {
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": file_sha256(file_path),
+        "pages": fingerprints,
+    }
+    write_atomic(os.path.join(folder, "manifest.json"), json.dumps(manifest))
+    _remove_unused_pages(folder, fingerprints)
+    return pages
+
+
+def _remove_unused_pages(folder: str, fingerprints: list[str]):
+    """Delete cached page files the manifest no longer lists (pages that changed or were removed)."""
+    used = {f"{fp}.txt" for fp in fingerprints}
+    for name in os.listdir(os.path.join(folder, "pages")):
+        if name not in used and not name.endswith(".tmp"):  # .tmp: another writer's file in flight
+            try:
+                os.remove(os.path.join(folder, "pages", name))
+            except FileNotFoundError:
+                pass
+
+
+def iter_pages(file_path: str, start: int = 1, end: int | None = None, cache_dir: str | None = None):
+    """
+    Lazily yield (page_number, text) for a range of pages, one page at a time.
+
+    Pages come from the cache when it is fresh, otherwise straight from the PDF.
+    Nothing outside the requested range is read.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        start (int): First page to yield (1-based, inclusive).
+        end (int | None): Last page to yield (inclusive), defaults to the last page.
+        cache_dir (str | None): Root cache folder, defaults to PDF_CACHE_DIR.
+
+    Yields:
+        tuple[int, str]: The 1-based page number and its text.
+    """
+    folder = cache_dir_for(file_path, cache_dir)
+    manifest = load_manifest(folder)
+    start = max(start, 1)
+
+    if _is_fresh(file_path, folder, manifest, os.stat(file_path)):
+        fingerprints = manifest["pages"][start - 1:end]
+        for number, fingerprint in enumerate(fingerprints, start=start):
+            text = _read_pages(folder, [fingerprint])
+            if text is None:
+                break
+            yield number, text[0]
+        else:
+            return
+        start = number
+
+    import fitz
+    with fitz.open(file_path) as doc:
+        last = doc.page_count if end is None else min(end, doc.page_count)
+        for number in range(start, last + 1):
+            yield number, doc[number - 1].get_text()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pdf_cache import CACHE_DIR, load_pages, write_atomic
+from pdf_retrieval import load_index
+
+CORPUS_WORKERS = int(os.getenv("PDF_CORPUS_WORKERS", min(os.cpu_count() or 1, 4)))
+
+_corpora: dict[str, dict] = {}  # corpus cache folder -> {"scanned", "files", "failed", "indexes", "merged"} of the last ingest
+
+logger = logging.getLogger("agents.pdf_qa")
+
+
+def corpus_dir_for(folder: str, cache_dir: str | None = None) -> str:
+    """Return the cache folder holding the shared index of one document folder."""
+    key = hashlib.sha1(os.path.abspath(folder).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir or CACHE_DIR, "corpus", key)
+
+
+def find_pdfs(folder: str) -> list[str]:
+    """List every PDF under folder, relative to it, in a stable order."""
+    found = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                found.append(os.path.relpath(os.path.join(root, name), folder))
+    return sorted(found)
+
+
+def _ingest_file(file_path: str, cache_dir: str | None) -> str:
+    """Worker: extract one PDF serially and build its per-document index."""
+    load_pages(file_path, cache_dir, workers=1)
+    load_index(file_path, cache_dir)
+    return file_path
+
+
+def merge_indexes(indexes: dict[str, dict]) -> dict:
+    """Merge per-document BM25 indexes into one, tagging chunks with their source."""
+    merged = {"chunks": [], "lengths": [], "postings": {}}
+    for source, index in indexes.items():
+        offset = len(merged["chunks"])
+        merged["chunks"].extend(dict(chunk, source=source) for chunk in index["chunks"])
+        merged["lengths"].extend(index["lengths"])
+        for term, postings in index["postings"].items():
+            merged["postings"].setdefault(term, []).extend([chunk_id + offset, tf] for chunk_id, tf in postings)
+    lengths = merged["lengths"]
+    merged["avgdl"] = (sum(lengths) / len(lengths)) if lengths else 0.0
+    return merged
+
+
+def ingest_corpus(folder: str, cache_dir: str | None = None, workers: int | None = None) -> dict:
+    """
+    Ingest every PDF in a folder and return one shared BM25 index over all of them.
+
+    Files whose size and mtime match the last run are skipped, and so are
+    files that failed to ingest (kept in memory) until they change. Only new or
+    changed files are extracted and indexed, in a bounded process pool; the
+    other per-document indexes stay in memory between calls, so a question
+    on an unchanged folder costs one directory scan. The merged index is
+    rebuilt in memory only when a file changed. Each chunk carries a
+    "source" so answers can cite the document it came from.
+
+    Args:
+        folder (str): Directory containing the PDFs.
+        cache_dir (str | None): Root cache folder, defaults to PDF_CACHE_DIR.
+        workers (int | None): Ingestion processes, defaults to PDF_CORPUS_WORKERS.
+
+    Returns:
+        dict: The merged index, searchable with pdf_retrieval.search.
+    """
+    corpus_dir = corpus_dir_for(folder, cache_dir)
+    scanned = {}
+    for name in find_pdfs(folder):
+        stat = os.stat(os.path.join(folder, name))
+        scanned[name] = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    cached = _corpora.get(corpus_dir)
+    if cached and cached["scanned"] == scanned:
+        return cached["merged"]
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    manifest_path = os.path.join(corpus_dir, "corpus.json")
+    if cached:
+        previous = cached["files"]
+    else:
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                previous = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            previous = {}
+    # Files that failed to ingest are not retried until their size or mtime changes.
+    failed = {name: entry for name, entry in (cached["failed"] if cached else {}).items() if scanned.get(name) == entry}
+    changed = [name for name, entry in scanned.items() if previous.get(name) != entry and failed.get(name) != entry]
+
+    if changed:
+        logger.info("Ingesting %d of %d PDFs from %s", len(changed), len(scanned), folder)
+        with ProcessPoolExecutor(max_workers=max(min(workers or CORPUS_WORKERS, len(changed)), 1)) as pool:
+            futures = {pool.submit(_ingest_file, os.path.join(folder, name), cache_dir): name for name in changed}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.warning("Skipping %s until it changes: %s", futures[future], e)
+                    failed[futures[future]] = scanned[futures[future]]
+
+    current = {name: entry for name, entry in scanned.items() if name not in failed}
+    known = cached["indexes"] if cached else {}
+    indexes = {name: known[name] if name in known and name not in changed else load_index(os.path.join(folder, name), cache_dir)
+               for name in current}
+    merged = merge_indexes(indexes)
+    if current != previous:
+        write_atomic(manifest_path, json.dumps(current))
+    if os.path.exists(os.path.join(corpus_dir, "index.json")):
+        os.remove(os.path.join(corpus_dir, "index.json"))  # merged index written by earlier versions
+    _corpora[corpus_dir] = {"scanned": scanned, "files": current, "failed": failed, "indexes": indexes, "merged": merged}
+    return merged
@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# fitz (PyMuPDF) is imported where a PDF is opened, so importing this module stays cheap.
+
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+EXTRACT_CHUNK_SIZE = int(os.getenv("PDF_EXTRACT_CHUNK_SIZE", "64"))
+
+
+def _extract_chunk(file_path: str, numbers: list[int]) -> list[str]:
+    """Worker: open the PDF in this process and extract the given pages."""
+    import fitz
+    with fitz.open(file_path) as doc:
+        return [doc[number].get_text() for number in numbers]
+
+
+def extract_pages_parallel(
+    file_path: str,
+    numbers: list[int] | None = None,
+    workers: int | None = None,
+    chunk_size: int | None = None,
+) -> dict[int, str]:
+    """
+    Extract page text by splitting the pages across a process pool.
+
+    Each worker opens its own fitz document. Small jobs (a single chunk or a
+    single worker) run in-process to avoid the pool start-up cost.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        numbers (list[int] | None): Page numbers to extract, defaults to all pages.
+        workers (int | None): Pool size, defaults to PDF_EXTRACT_WORKERS.
+        chunk_size (int | None): Pages per task, defaults to PDF_EXTRACT_CHUNK_SIZE.
+
+    Returns:
+        dict[int, str]: Page number to text, in page order.
+    """
+    workers = workers or EXTRACT_WORKERS
+    chunk_size = chunk_size or EXTRACT_CHUNK_SIZE
+    if numbers is None:
+        import fitz
+        with fitz.open(file_path) as doc:
+            numbers = list(range(doc.page_count))
+    numbers = sorted(numbers)
+    chunks = [numbers[i:i + chunk_size] for i in range(0, len(numbers), chunk_size)]
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = [_extract_chunk(file_path, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(_extract_chunk, [file_path] * len(chunks), chunks))
+
+    return {number: text for chunk, texts in zip(chunks, results) for number, text in zip(chunk, texts)}
+
+
+def extract_text(file_path: str, workers: int | None = None, chunk_size: int | None = None) -> str:
+    """Extract the whole document and join the pages once, in page order."""
+    return "".join(extract_pages_parallel(file_path, workers=workers, chunk_size=chunk_size).values())
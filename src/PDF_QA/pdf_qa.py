@@ -1,20 +1,30 @@
+from functools import cache
 from typing import Annotated, Sequence, TypedDict
 
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.tools import tool
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
 
 from dotenv import load_dotenv
+if __name__ == "__main__":
+    load_dotenv()
 
 import os
-import fitz
+import sys
 
-load_dotenv()
+# src/ holds the modules shared with the other agents (e.g. parallel_tools)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_memory import fit_to_budget
+from chat_model import make_chat_model
+from parallel_tools import parallel_tool_node
+from pdf_cache import iter_pages, load_pages
+from telemetry import instrument
+
+MAX_PAGES_PER_CALL = int(os.getenv("PDF_MAX_PAGES_PER_CALL", "20"))
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -32,16 +42,38 @@ def extract_text_from_pdf(file_path: str) -> str:
     Returns:
         str: The full extracted text from the PDF.
     """
-    text = ""
     try:
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                text += page.get_text()
+        text = "".join(load_pages(file_path))
     except Exception as e:
         return f"Error reading PDF: {e}"  
     return text
 
 
+@tool
+def extract_pdf_pages(file_path: str, start_page: int = 1, end_page: int | None = None) -> str:
+    """
+    Extracts text from a range of pages of a PDF file.
+    Only a limited number of pages is returned per call; ask again for the next range.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        start_page (int): First page to read (1-based).
+        end_page (int | None): Last page to read (inclusive).
+
+    Returns:
+        str: The text of each page, prefixed with its page number.
+    """
+    last = start_page + MAX_PAGES_PER_CALL - 1
+    end_page = last if end_page is None else min(end_page, last)
+    try:
+        parts = [f"--- Page {number} ---\n{text}" for number, text in iter_pages(file_path, start_page, end_page)]
+    except FileNotFoundError:
+        return f"Error: File not found at {file_path}"
+    except Exception as e:
+        return f"Error reading PDF: {e}"
+    return "\n".join(parts) if parts else f"No pages found in range {start_page}-{end_page}."
+
+
 @tool
 def word_count(text: str) -> int:
     """
@@ -56,13 +88,15 @@ def word_count(text: str) -> int:
     words = text.split()
     return len(words)
 
-tools = [extract_text_from_pdf, word_count]
+tools = [extract_text_from_pdf, extract_pdf_pages, word_count]
 
-llm = ChatGoogleGenerativeAI(
-    api_key= os.getenv("GOOGLE_API_KEY"),
-    model= os.getenv("GOOGLE_MODEL"),
-    temperature=0.2
-).bind_tools(tools)
+@cache
+def get_llm():
+    return make_chat_model(
+        api_key= os.getenv("GOOGLE_API_KEY"),
+        model= os.getenv("GOOGLE_MODEL"),
+        temperature=0.2
+    ).bind_tools(tools)
 
 
 def process_node(state: AgentState) -> AgentState:
@@ -70,23 +104,24 @@ def process_node(state: AgentState) -> AgentState:
                   You are a helpful assistant that answers questions about PDFs.
                     You have access to these tools:
                     - `extract_text_from_pdf(file_path: str) -> str`: Extracts text from a PDF file.
+                    - `extract_pdf_pages(file_path: str, start_page: int, end_page: int) -> str`: Extracts text from a range of pages.
                     - `word_count(text: str) -> int`: Returns the number of words in a given text.
 
                     Use them together when necessary to answer the user's question.
                     """)
     
     # Only add system/user prompts at the 
-    messages = state["messages"]
-    if len(messages) == 0:
-        messages = [
-            system_prompt,
-            HumanMessage(content=f"""
+    messages = list(state["messages"])
+    user_prompt = HumanMessage(content=f"""
             Please answer this question: {state["user_input"]}
             Use the extract_text_from_pdf tool with this file path: {state["file"]}
             """)
-        ]
+    if len(messages) == 0:
+        messages = [system_prompt, user_prompt]
+    elif isinstance(messages[-1], AIMessage) and not messages[-1].tool_calls:
+        messages = messages + [user_prompt]
 
-    response = llm.invoke(messages)
+    response = get_llm().invoke(fit_to_budget(messages))
     print("🔍 Tool Calls:", getattr(response, "tool_calls", None))
     return {
         "messages": messages + [response],
@@ -101,24 +136,27 @@ def should_continue(state: AgentState):
     else:
         return "end"
      
-graph = StateGraph(AgentState)
+@cache
+def get_app():
+    """Build and compile the graph on first use."""
+    graph = StateGraph(AgentState)
 
-graph.add_node("process_node", process_node)
-graph.add_node("toolcall", ToolNode(tools))
+    graph.add_node("process_node", process_node)
+    graph.add_node("toolcall", parallel_tool_node(tools))
 
-graph.add_conditional_edges(
-    "process_node",
-    should_continue,
-    {
-        "continue": "toolcall",
-        "end": END,
-    } 
-)
+    graph.add_conditional_edges(
+        "process_node",
+        should_continue,
+        {
+            "continue": "toolcall",
+            "end": END,
+        } 
+    )
 
-graph.add_edge(START, "process_node")
-graph.add_edge("toolcall", "process_node")
+    graph.add_edge(START, "process_node")
+    graph.add_edge("toolcall", "process_node")
 
-app = graph.compile()
+    return instrument(graph.compile(), "pdf_qa")
 
 # user_input = input("Enter your question: ")
 # file_path = "PDF_QA\\Project Phoenix.pdf"
@@ -127,28 +165,33 @@ app = graph.compile()
 # print(state["messages"][-1].content)
 
 
-# Initial state
-file_path = "PDF_QA\\Project Phoenix.pdf"
-messages = []
-file = file_path
+def main():
+    # Initial state
+    file_path = "PDF_QA\\Project Phoenix.pdf"
+    messages = []
+    file = file_path
 
-while True:
-    user_input = input("\nAsk a question about the PDF (or type 'exit'): ")
-    if user_input.lower() == "exit":
-        break
+    while True:
+        user_input = input("\nAsk a question about the PDF (or type 'exit'): ")
+        if user_input.lower() == "exit":
+            break
 
-    state = app.invoke(
-        {
-            "messages": messages,
-            "file": file,
-            "user_input": user_input
-        },
-    )
+        state = get_app().invoke(
+            {
+                "messages": messages,
+                "file": file,
+                "user_input": user_input
+            },
+        )
+
+        # print(state)
+        # Get last LLM response
+        last_response = state["messages"][-1]
+        print(f"\n🤖 {last_response.content}")
+
+        # Preserve the updated state, trimmed to the memory token budget
+        messages = fit_to_budget(state["messages"])
 
-    # print(state)
-    # Get last LLM response
-    last_response = state["messages"][-1]
-    print(f"\n🤖 {last_response.content}")
 
-    # Preserve the updated state
-    messages = state["messages"]
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from pdf_cache import cache_dir_for, fresh_manifest, load_manifest, load_pages, write_atomic
+
+CHUNK_WORDS = int(os.getenv("PDF_CHUNK_WORDS", "200"))
+CHUNK_OVERLAP = int(os.getenv("PDF_CHUNK_OVERLAP", "40"))
+TOP_K = int(os.getenv("PDF_TOP_K", "5"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "when", "which",
+    "who", "will", "with", "about", "does", "do", "how", "why",
+}
+
+TOKEN_RE = re.compile(r"\w+")
+
+_loaded: dict[str, tuple[str, dict]] = {}  # cache folder -> (index file, index) last loaded in this process
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens without stopwords."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_pages(pages: list[str], chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> list[dict]:
+    """
+    Split each page into overlapping word windows.
+
+    Args:
+        pages (list[str]): Page texts in page order.
+        chunk_words (int): Words per chunk.
+        overlap (int): Words shared between consecutive chunks of a page.
+
+    Returns:
+        list[dict]: Chunks as {"page": 1-based page number, "text": str}.
+    """
+    step = max(chunk_words - overlap, 1)
+    chunks = []
+    for number, page in enumerate(pages, start=1):
+        words = page.split()
+        for i in range(0, max(len(words) - overlap, 1), step):
+            text = " ".join(words[i:i + chunk_words])
+            if text:
+                chunks.append({"page": number, "text": text})
+    return chunks
+
+
+def build_index(chunks: list[dict]) -> dict:
+    """Build a BM25 inverted index (term -> [[chunk_id, term_frequency], ...])."""
+    postings = {}
+    lengths = []
+    for chunk_id, chunk in enumerate(chunks):
+        tokens = tokenize(chunk["text"])
+        lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term, []).append([chunk_id, tf])
+    return {
+        "chunks": chunks,
+        "lengths": lengths,
+        "avgdl": (sum(lengths) / len(lengths)) if lengths else 0.0,
+        "postings": postings,
+    }
+
+
+def search(index: dict, query: str, k: int = TOP_K) -> list[dict]:
+    """
+    Score chunks against the query with BM25 and return the top k.
+
+    Returns:
+        list[dict]: Chunks with an added "score", best first.
+    """
+    n = len(index["chunks"])
+    avgdl = index["avgdl"] or 1.0
+    scores = Counter()
+    for term in set(tokenize(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        for chunk_id, tf in postings:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index["lengths"][chunk_id] / avgdl)
+            scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return [dict(index["chunks"][chunk_id], score=score) for chunk_id, score in scores.most_common(k)]
+
+
+def index_file(folder: str, prefix: str, key: dict) -> str:
+    """Path of an index file named after a hash of its key, so a stale index is never opened."""
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(folder, f"{prefix}-{digest}.json")
+
+
+def remove_stale(folder: str, prefix: str, keep: str):
+    """Delete the files of earlier keys (and the unkeyed <prefix>.* files of older versions), keeping those of keep."""
+    keep_stem = os.path.splitext(os.path.basename(keep))[0]
+    for name in os.listdir(folder):
+        if (name.startswith(f"{prefix}-") or name.startswith(f"{prefix}.")) and not name.startswith(keep_stem):
+            try:
+                os.remove(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+
+
+def load_index(file_path: str, cache_dir: str | None = None) -> dict:
+    """
+    Return the BM25 index for a PDF, building it once and storing it next to
+    the extraction cache. It is rebuilt only when the cached pages change.
+
+    The cache manifest alone decides whether the stored index is current (its
+    file name carries the key), and the loaded index is kept in memory, so
+    repeated questions on an unchanged PDF read nothing from disk.
+    """
+    folder = cache_dir_for(file_path, cache_dir)
+    manifest = fresh_manifest(file_path, cache_dir)
+    if manifest is None:
+        load_pages(file_path, cache_dir)
+        manifest = load_manifest(folder)
+    key = {"pages": manifest["pages"], "chunk_words": CHUNK_WORDS, "overlap": CHUNK_OVERLAP}
+    index_path = index_file(folder, "bm25", key)
+    loaded = _loaded.get(folder)
+    if loaded and loaded[0] == index_path:
+        return loaded[1]
+
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        index = build_index(chunk_pages(load_pages(file_path, cache_dir)))
+        index["key"] = key
+        write_atomic(index_path, json.dumps(index))
+        remove_stale(folder, "bm25", index_path)
+    _loaded[folder] = (index_path, index)
+    return index
+
+
+def format_passages(passages: list[dict]) -> str:
+    """Render retrieved chunks for the prompt, with their source document and page numbers."""
+    return "\n\n".join(
+        f"[{p['source']}, page {p['page']}] {p['text']}" if "source" in p else f"[Page {p['page']}] {p['text']}"
+        for p in passages
+    )
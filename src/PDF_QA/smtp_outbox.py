@@ -0,0 +1,194 @@
+import atexit
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from email.message import Message
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+# Seconds a connect or a single SMTP command may block before it fails (and is retried).
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", "3"))
+SMTP_RETRY_BACKOFF = float(os.getenv("SMTP_RETRY_BACKOFF", "1.0"))
+
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+def is_transient(error: Exception) -> bool:
+    """Network errors and 4xx replies are worth retrying; 5xx replies are not."""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, OSError)
+
+
+class SmtpSession:
+    """
+    One authenticated SMTP connection that is kept open between messages.
+
+    The connection is opened (with STARTTLS and login) on first use, checked
+    with NOOP after it has been idle, and reopened when the server has
+    dropped it. Every command is bounded by timeout seconds. Pass
+    starttls=False and no credentials for a local stand-in.
+    """
+
+    def __init__(self, username: str | None, password: str | None, host: str = SMTP_HOST, port: int = SMTP_PORT,
+                 starttls: bool = SMTP_STARTTLS, idle_timeout: float = SMTP_IDLE_TIMEOUT,
+                 timeout: float = SMTP_TIMEOUT, factory=smtplib.SMTP):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.factory = factory
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        smtp = self.factory(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+
+    def _drop(self):
+        """Forget a connection the server has dropped, closing its socket without a QUIT."""
+        if self._smtp is not None:
+            self._smtp.close()
+            self._smtp = None
+
+    def _ensure(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self._drop()
+        if self._smtp is None:
+            self._connect()
+
+    def send(self, msg: Message):
+        """Send one message, reconnecting once if the server dropped the session."""
+        self._ensure()
+        try:
+            self._smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._drop()
+            self._connect()
+            self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+class Outbox:
+    """
+    Background send queue in front of an SmtpSession.
+
+    submit() returns a Future straight away. A worker thread takes up to
+    batch_size queued messages at a time and sends them back to back over
+    the one session: the connection, TLS handshake and login are shared,
+    but each message is still its own SMTP transaction (MAIL FROM, RCPT TO,
+    DATA). Transient failures are retried with exponential backoff,
+    permanent ones fail the Future. A message whose Future was cancelled
+    before the worker reached it (see withdraw) is not sent.
+    """
+
+    def __init__(self, session: SmtpSession, batch_size: int = SMTP_BATCH_SIZE,
+                 max_retries: int = SMTP_MAX_RETRIES, backoff: float = SMTP_RETRY_BACKOFF):
+        self.session = session
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="smtp-outbox", daemon=True)
+        self._worker.start()
+
+    def submit(self, msg: Message) -> Future:
+        if self._closed:
+            raise RuntimeError("Outbox is closed")
+        future = Future()
+        self._queue.put((msg, future))
+        return future
+
+    def send_many(self, messages: list[Message]) -> list[Future]:
+        return [self.submit(msg) for msg in messages]
+
+    @staticmethod
+    def withdraw(future: Future) -> bool:
+        """Take a message back out of the queue; False when it is already being sent (or was sent)."""
+        return future.cancel()
+
+    def _send_with_retry(self, msg: Message, future: Future):
+        if not future.set_running_or_notify_cancel():
+            return  # withdrawn while queued
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.session.send(msg)
+                future.set_result(msg["To"])
+                return
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    future.set_exception(e)
+                    return
+                self.session.close()
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._queue.put(None)
+                    break
+                batch.append(job)
+            for msg, future in batch:
+                self._send_with_retry(msg, future)
+        self.session.close()
+
+    def close(self, timeout: float | None = 30):
+        """Send whatever is queued, then quit the SMTP session."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join(timeout)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Return the process-wide outbox, created on first use from EMAIL_USERNAME/EMAIL_PASSWORD."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox(SmtpSession(os.getenv("EMAIL_USERNAME"), os.getenv("EMAIL_PASSWORD")))
+            atexit.register(_outbox.close)
+        return _outbox
@@ -0,0 +1,102 @@
+import re
+
+from langchain_core.messages import ToolMessage
+
+# An argument containing "{{ref:2}}" gets the output of the plan's second tool call in its place,
+# "{{ref:2.id}}" the first "ID: <n>" found in that output. Ordinary text (prices like "$20") is left alone.
+REF_RE = re.compile(r"\{\{ref:(\d+)(\.id)?\}\}")
+ID_RE = re.compile(r"\bID: (\S+)")
+
+PLANNING_PROMPT = """
+Plan the whole request up front: answer with every tool call it needs in this one reply.
+Tool calls that do not depend on each other run in parallel.
+When an argument needs the result of an earlier call in this reply, write "{{ref:N}}" for that call's
+whole output or "{{ref:N.id}}" for the first email ID it lists (N counts your tool calls from 1),
+e.g. search_emails(query="invoice") then get_email_content(email_id="{{ref:1.id}}").
+If no tool is needed, answer directly without tool calls.
+"""
+
+
+def _refs(value) -> set[int]:
+    if isinstance(value, str):
+        return {int(n) for n, _ in REF_RE.findall(value)}
+    if isinstance(value, dict):
+        return set().union(*map(_refs, value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*map(_refs, value)) if value else set()
+    return set()
+
+
+def _resolve(value, outputs: dict[int, str]):
+    """Fill in references from earlier outputs; raise ValueError for one that cannot be resolved."""
+    if isinstance(value, str):
+        def replace(match):
+            n = int(match.group(1))
+            if n not in outputs:
+                raise ValueError(f"{match.group(0)} refers to a call that failed or has not run")
+            if match.group(2):
+                found = ID_RE.search(outputs[n])
+                if found is None:
+                    raise ValueError(f"{match.group(0)}: call {n} returned no email ID")
+                return found.group(1)
+            return outputs[n]
+        return REF_RE.sub(replace, value)
+    if isinstance(value, dict):
+        return {k: _resolve(v, outputs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v, outputs) for v in value]
+    return value
+
+
+def plan_levels(tool_calls: list[dict]) -> list[list[int]]:
+    """
+    Group the plan's tool calls (numbered from 1) into levels that can run in parallel.
+
+    A call goes in the first level after every call it references. References
+    to unknown or later calls do not order anything; the call is rejected
+    when it runs.
+    """
+    level_of = {}
+    for n, call in enumerate(tool_calls, start=1):
+        deps = [d for d in _refs(call["args"]) if d < n]
+        level_of[n] = 1 + max((level_of[d] for d in deps), default=-1)
+    levels = [[] for _ in range(max(level_of.values(), default=-1) + 1)]
+    for n, level in level_of.items():
+        levels[level].append(n)
+    return levels
+
+
+def _prepare(tool_calls: list[dict], level: list[int], results: dict[int, ToolMessage]) -> tuple[dict, dict]:
+    """Resolve the references of one level's calls; a call whose references cannot be resolved becomes an error."""
+    outputs = {n: str(m.content) for n, m in results.items() if m.status != "error"}
+    calls, rejected = {}, {}
+    for n in level:
+        call = tool_calls[n - 1]
+        try:
+            calls[n] = {**call, "args": _resolve(call["args"], outputs)}
+        except ValueError as e:
+            rejected[n] = ToolMessage(content=f"Error: {e}", name=call["name"], tool_call_id=call["id"], status="error")
+    return calls, rejected
+
+
+def run_plan(tool_calls: list[dict], executor) -> list[ToolMessage]:
+    """
+    Execute a plan level by level on a ParallelToolExecutor, so its per-tool
+    limits and timeouts apply. Results keep plan order.
+    """
+    results = {}
+    for level in plan_levels(tool_calls):
+        calls, rejected = _prepare(tool_calls, level, results)
+        results.update(rejected)
+        results.update(zip(calls, executor.run_calls(list(calls.values()))))
+    return [results[n] for n in range(1, len(tool_calls) + 1)]
+
+
+async def arun_plan(tool_calls: list[dict], executor) -> list[ToolMessage]:
+    """Async run_plan: each level's calls run together on the executor's event-loop path."""
+    results = {}
+    for level in plan_levels(tool_calls):
+        calls, rejected = _prepare(tool_calls, level, results)
+        results.update(rejected)
+        results.update(zip(calls, await executor.arun_calls(list(calls.values()))))
+    return [results[n] for n in range(1, len(tool_calls) + 1)]
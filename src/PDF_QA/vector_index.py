@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from pdf_cache import cache_dir_for, fresh_manifest, load_manifest, load_pages, write_atomic
+from pdf_retrieval import CHUNK_OVERLAP, CHUNK_WORDS, TOP_K, chunk_pages, index_file, remove_stale
+
+EMBED_DIM = int(os.getenv("PDF_EMBED_DIM", "256"))
+IVF_MIN_VECTORS = int(os.getenv("PDF_IVF_MIN_VECTORS", "4096"))
+IVF_NPROBE = int(os.getenv("PDF_IVF_NPROBE", "4"))
+IVF_ITERATIONS = 10
+
+WORD_RE = re.compile(r"\w+")
+
+_loaded: dict[str, tuple[str, dict]] = {}  # cache folder -> (metadata file, index) last loaded in this process
+
+
+_embedder_ids: dict = {}
+
+
+def embedder_id(embed) -> str:
+    """
+    Name an embedder by its function, model (a "model" attribute, if any) and
+    vector size, so an index is rebuilt, never reused, when any of them change.
+    The size is found by embedding one probe text, once per embedder.
+    """
+    try:
+        return _embedder_ids[embed]
+    except (KeyError, TypeError):
+        pass
+    func = getattr(embed, "func", embed)  # functools.partial
+    name = f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}".lstrip(".")
+    model = getattr(embed, "model", None) or getattr(embed, "model_name", None)
+    dim = np.asarray(embed(["dimension probe"])).shape[-1]
+    identity = f"{name}[{model}]:{dim}" if model else f"{name}:{dim}"
+    try:
+        _embedder_ids[embed] = identity
+    except TypeError:
+        pass
+    return identity
+
+
+def save_array(path: str, array: np.ndarray):
+    """np.save through a temp file and rename, so a crash never leaves a truncated array."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _bucket(feature: str, dim: int) -> tuple[int, float]:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, 1.0 if (value >> 63) else -1.0
+
+
+def hashing_embedder(texts: list[str], dim: int = EMBED_DIM) -> np.ndarray:
+    """
+    Deterministic offline embedder: signed feature hashing of words, word
+    bigrams and character trigrams, L2-normalised. Works without a network
+    and gives the same vectors on every machine.
+
+    Args:
+        texts (list[str]): Texts to embed.
+        dim (int): Vector size.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), dim).
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = WORD_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        features += [f"#{w[i:i + 3]}" for w in words for i in range(max(len(w) - 2, 1))]
+        for feature in features:
+            column, sign = _bucket(feature, dim)
+            vectors[row, column] += sign
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, iterations: int = IVF_ITERATIONS) -> tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means used to partition vectors for IVF search."""
+    rng = np.random.default_rng(0)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(clusters):
+            members = vectors[assignments == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def build_vector_index(folder: str, chunks: list[dict], embed=hashing_embedder, ivf: bool | None = None,
+                       prefix: str = "vectors") -> dict:
+    """
+    Embed chunks and write them to folder as memory-mappable float32 arrays
+    (<prefix>.npy, plus <prefix>.centroids.npy for IVF).
+
+    With IVF enabled (by default once there are IVF_MIN_VECTORS chunks) the
+    vectors are stored grouped by k-means cluster so a query only scans the
+    nprobe closest partitions. The metadata records the embedder and vector
+    size so searches with a different embedder are refused.
+    """
+    vectors = np.asarray(embed([c["text"] for c in chunks]), dtype=np.float32)
+    if ivf is None:
+        ivf = len(chunks) >= IVF_MIN_VECTORS
+    meta = {"chunks": chunks, "ivf": bool(ivf and len(chunks) > 1), "embedder": embedder_id(embed),
+            "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0}
+
+    if meta["ivf"]:
+        centroids, assignments = _kmeans(vectors, max(int(np.sqrt(len(vectors))), 1))
+        order = np.argsort(assignments, kind="stable")
+        vectors = vectors[order]
+        meta["chunks"] = [chunks[i] for i in order]
+        meta["offsets"] = np.searchsorted(assignments[order], np.arange(len(centroids) + 1)).tolist()
+        save_array(os.path.join(folder, f"{prefix}.centroids.npy"), centroids)
+
+    save_array(os.path.join(folder, f"{prefix}.npy"), vectors)
+    return meta
+
+
+def load_vector_index(file_path: str, embed=hashing_embedder, ivf: bool | None = None,
+                      cache_dir: str | None = None) -> dict:
+    """
+    Return the vector index for a PDF, stored next to its extraction cache.
+    Vectors are opened with mmap so large collections are paged in on demand.
+    Like load_index, freshness is decided from the cache manifest and the
+    loaded index is kept in memory.
+    """
+    folder = cache_dir_for(file_path, cache_dir)
+    manifest = fresh_manifest(file_path, cache_dir)
+    if manifest is None:
+        load_pages(file_path, cache_dir)
+        manifest = load_manifest(folder)
+    key = {
+        "pages": manifest["pages"],
+        "chunk_words": CHUNK_WORDS,
+        "overlap": CHUNK_OVERLAP,
+        "embedder": embedder_id(embed),
+        "ivf": ivf,
+    }
+    meta_path = index_file(folder, "vectors", key)
+    loaded = _loaded.get(folder)
+    if loaded and loaded[0] == meta_path:
+        return loaded[1]
+
+    prefix = os.path.basename(meta_path)[:-len(".json")]
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        meta = build_vector_index(folder, chunk_pages(load_pages(file_path, cache_dir)), embed, ivf, prefix)
+        meta["key"] = key
+        write_atomic(meta_path, json.dumps(meta))
+        remove_stale(folder, "vectors", meta_path)
+        remove_stale(folder, "centroids", meta_path)  # centroids.npy of older versions
+
+    meta["vectors"] = np.load(os.path.join(folder, f"{prefix}.npy"), mmap_mode="r")
+    if meta["ivf"]:
+        meta["centroids"] = np.load(os.path.join(folder, f"{prefix}.centroids.npy"))
+    _loaded[folder] = (meta_path, meta)
+    return meta
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[-1])
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1), axis=-1)
+
+
+def search_vectors(index: dict, queries: list[str], k: int = TOP_K, embed=hashing_embedder,
+                   nprobe: int = IVF_NPROBE) -> list[list[dict]]:
+    """
+    Find the k nearest chunks for a batch of queries by cosine similarity.
+
+    Exact mode scores every chunk with one matrix product; IVF mode only
+    scores the chunks in the nprobe closest partitions of each query.
+    embed must be the embedder the index was built with.
+
+    Returns:
+        list[list[dict]]: For each query, chunks with an added "score", best first.
+    """
+    if index.get("embedder", embedder_id(embed)) != embedder_id(embed):
+        raise ValueError(f"Index was built with {index['embedder']}, not {embedder_id(embed)}")
+    vectors = index["vectors"]
+    if not len(vectors):
+        return [[] for _ in queries]
+    query_vectors = np.asarray(embed(queries), dtype=np.float32)
+    if query_vectors.shape[-1] != vectors.shape[-1]:
+        raise ValueError(f"Query vectors have {query_vectors.shape[-1]} dimensions, the index {vectors.shape[-1]}")
+
+    if not index["ivf"]:
+        scores = query_vectors @ vectors.T
+        rows = _top_k(scores, k)
+        return [[dict(index["chunks"][i], score=float(scores[q, i])) for i in rows[q]] for q in range(len(queries))]
+
+    offsets = index["offsets"]
+    probes = _top_k(query_vectors @ index["centroids"].T, nprobe)
+    results = []
+    for q, clusters in enumerate(probes):
+        ids = np.concatenate([np.arange(offsets[c], offsets[c + 1]) for c in clusters])
+        scores = np.asarray(vectors[ids]) @ query_vectors[q]
+        best = _top_k(scores, k) if len(ids) else []
+        results.append([dict(index["chunks"][ids[i]], score=float(scores[i])) for i in best])
+    return results
@@ -1,3 +1,4 @@
+from functools import cache
 from typing import Annotated, Sequence, TypedDict
 
 from langchain_core.messages import BaseMessage
@@ -7,13 +8,15 @@ from langchain_core.tools import tool
 
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, START , END
-from langgraph.prebuilt import ToolNode
-
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from dotenv import load_dotenv
 import os
-load_dotenv()
+if __name__ == "__main__":
+    load_dotenv()
+
+from parallel_tools import parallel_tool_node
+from chat_model import make_chat_model
+from telemetry import instrument
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -25,16 +28,18 @@ def add(a:int, b:int):
 
 tools = [add]
 
-model = ChatGoogleGenerativeAI(
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    model="gemini-1.5-flash",
-    temperature=0.2
-).bind_tools(tools)
+@cache
+def get_model():
+    return make_chat_model(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model="gemini-1.5-flash",
+        temperature=0.2
+    ).bind_tools(tools)
 
 
 def model_call(state: AgentState):
     system_propmt = SystemMessage(content="You are my AI assistant, please answer my query to the best of your ability.")
-    respone = model.invoke([system_propmt] + state["messages"])
+    respone = get_model().invoke([system_propmt] + state["messages"])
     return {"messages":[respone]}
 
 
@@ -45,37 +50,41 @@ def should_continue(state: AgentState):
         return "end"
     else:
         return "continue"
-    
-
-graph = StateGraph(AgentState)
-
-graph.add_node("our_model", model_call)
 
 
-tool_node = ToolNode(tools=tools)
-graph.add_node("tool_node", tool_node)
+@cache
+def get_app():
+    """Build and compile the graph on first use."""
+    graph = StateGraph(AgentState)
 
-graph.set_entry_point("our_model")
-graph.add_conditional_edges(
-    "our_model",
-    should_continue,
-    {
-        "continue": "tool_node",
-        "end": END
-    }
-)
+    graph.add_node("our_model", model_call)
 
-graph.add_edge("tool_node", "our_model")
+    # The three additions in the sample prompt arrive as one AIMessage and run concurrently.
+    tool_node = parallel_tool_node(tools)
+    graph.add_node("tool_node", tool_node)
 
-app = graph.compile()
+    graph.set_entry_point("our_model")
+    graph.add_conditional_edges(
+        "our_model",
+        should_continue,
+        {
+            "continue": "tool_node",
+            "end": END
+        }
+    )
 
-inputs = {"messages":[("user", "whats is 1 + 1, 78 + 87, 96 + 55")]}
+    graph.add_edge("tool_node", "our_model")
 
-result = app.invoke(inputs)
+    return instrument(graph.compile(), "ReAct")
 
-print(result["messages"][-1].content)
 
+def main():
+    inputs = {"messages":[("user", "whats is 1 + 1, 78 + 87, 96 + 55")]}
 
+    result = get_app().invoke(inputs)
 
+    print(result["messages"][-1].content)
 
 
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,20 @@
+from functools import cache
 from typing import TypedDict, Annotated, Sequence
 
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
 
 from dotenv import load_dotenv
+if __name__ == "__main__":
+    load_dotenv()
 import os
 
-load_dotenv()
+from parallel_tools import parallel_tool_node
+from chat_model import make_chat_model
+from telemetry import instrument
 
 class AgentState(TypedDict):
     messages:Annotated[Sequence[BaseMessage], add_messages]
@@ -32,15 +35,17 @@ def divide(a: int, b: int):
 
 tools = [add, subtract, multiply, divide]
 
-llm = ChatGoogleGenerativeAI(
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    model=os.getenv("GOOGLE_MODEL"),
-    temperature=0.2,
-).bind_tools(tools)
+@cache
+def get_llm():
+    return make_chat_model(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model=os.getenv("GOOGLE_MODEL"),
+        temperature=0.2,
+    ).bind_tools(tools)
 
 def llm_call(state: AgentState):
     system_prompt = SystemMessage(content="You are a helpful assistant.")
-    response = llm.invoke([system_prompt] + state["messages"])
+    response = get_llm().invoke([system_prompt] + state["messages"])
     return {"messages": [response]}
 
 
@@ -52,32 +57,39 @@ def should_continue(state: AgentState):
     else:
         return "continue"
 
-graph = StateGraph(AgentState)
+@cache
+def get_app():
+    """Build and compile the graph on first use."""
+    graph = StateGraph(AgentState)
 
-graph.add_node("llm_call", llm_call)
+    graph.add_node("llm_call", llm_call)
 
-tool_node = ToolNode(tools=tools)
+    tool_node = parallel_tool_node(tools)
 
-graph.add_node("tool_node", tool_node)
+    graph.add_node("tool_node", tool_node)
 
-graph.set_entry_point("llm_call")
+    graph.set_entry_point("llm_call")
 
-graph.add_conditional_edges(
-    "llm_call",
-    should_continue,
-    {
-        "continue": "tool_node",
-        "end": END,
-    }
-)
+    graph.add_conditional_edges(
+        "llm_call",
+        should_continue,
+        {
+            "continue": "tool_node",
+            "end": END,
+        }
+    )
 
-graph.add_edge("tool_node", "llm_call")
+    graph.add_edge("tool_node", "llm_call")
 
-app = graph.compile()
+    return instrument(graph.compile(), "ReAct_Ex")
 
-# User input
-user_input = {"messages": [("user","devide 10 by 2. Then multiply by 3. Then add 5. And after evaluate tell me joke")]}
+def main():
+    # User input
+    user_input = {"messages": [("user","devide 10 by 2. Then multiply by 3. Then add 5. And after evaluate tell me joke")]}
 
-# You can still get the final result with invoke() if you need it at the end
-result = app.invoke(user_input)
-print(result["messages"][-1].content)
+    # You can still get the final result with invoke() if you need it at the end
+    result = get_app().invoke(user_input)
+    print(result["messages"][-1].content)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+Reproducible benchmarks for the agents in src/, run offline against the fake
+chat model (fake_llm) and local stand-ins.
+
+    cd src && python -m benchmarks --out results.json
+    python -m benchmarks --only graph,messages --quick
+"""
@@ -0,0 +1,46 @@
+import argparse
+import importlib
+import json
+import sys
+import tempfile
+
+from benchmarks.common import configure_environment, metadata
+
+BENCHMARKS = {
+    "graph": "benchmarks.bench_graph",
+    "messages": "benchmarks.bench_messages",
+    "pdf": "benchmarks.bench_pdf",
+    "email": "benchmarks.bench_email",
+}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run the offline agent benchmarks.")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--out", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and fewer samples, for a smoke run")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as work_dir:
+        configure_environment(work_dir)
+        results = []
+        for name in names:
+            print(f"running {name}...", file=sys.stderr)
+            results.extend(importlib.import_module(BENCHMARKS[name]).run(quick=args.quick))
+
+    report = json.dumps({"meta": {**metadata(), "quick": args.quick}, "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print(f"wrote {len(results)} results to {args.out}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import imaplib
+import importlib
+import itertools
+import os
+import tempfile
+from email.message import EmailMessage
+
+from benchmarks.common import measure, quiet, result
+from benchmarks.imap_standin import Mailbox, serve
+
+SENDERS = ["alice@example.com", "bob@example.org", "carol@example.net", "billing@shop.example"]
+SUBJECTS = ["Invoice {n}", "Lunch on Friday?", "Project update #{n}", "Your receipt {n}", "Meeting notes"]
+
+
+def make_message(n: int) -> bytes:
+    msg = EmailMessage()
+    msg["From"] = SENDERS[n % len(SENDERS)]
+    msg["To"] = "me@example.com"
+    msg["Subject"] = SUBJECTS[n % len(SUBJECTS)].format(n=n)
+    msg["Date"] = f"Mon, {1 + n % 28} Sep 2025 10:{n % 60:02d}:00 +0000"
+    msg.set_content(f"Hello,\n\nThis is message {n}.\n" + "Some longer body text to fetch. " * 40)
+    return msg.as_bytes().replace(b"\n", b"\r\n")
+
+
+def imaplib_pool(imap_pool, server):
+    return imap_pool.ImapPool("bench", "bench", host="127.0.0.1", port=server.server_address[1], factory=imaplib.IMAP4)
+
+
+def run(quick: bool = False, messages: int | None = None) -> list[dict]:
+    """
+    Latency of the email tools against a local IMAP stand-in (no TLS, no
+    network latency), so the numbers show the client-side cost: sync, the
+    local store and MIME parsing. Sending is not covered.
+    """
+    import imap_pool
+    import mail_store
+
+    count = messages or (50 if quick else 500)
+    mailbox = Mailbox()
+    for n in range(count):
+        mailbox.add(make_message(n), "\\Seen" if n % 3 else "")
+    condstore_box = Mailbox(condstore=True)
+    condstore_box.messages, condstore_box.modseq = [dict(m) for m in mailbox.messages], mailbox.modseq
+    server = serve(mailbox)
+    condstore_server = serve(condstore_box)
+    pool = imaplib_pool(imap_pool, server)
+    imap_pool._pool = pool
+    repeat = 3 if quick else 10
+    params = {"messages": count}
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            paths = (os.path.join(folder, f"sync_{i}.sqlite3") for i in itertools.count())
+
+            def cold_sync():
+                store = mail_store.open_store(next(paths))
+                with pool.connection("INBOX") as imap:
+                    mail_store.sync_mailbox(imap, store, "INBOX")
+                store.close()
+
+            results.append(result("email", "sync (empty store)", params, measure(cold_sync, repeat=repeat, warmup=0)))
+            store = mail_store.open_store(os.path.join(folder, "warm.sqlite3"))
+            with pool.connection("INBOX") as imap:
+                mail_store.sync_mailbox(imap, store, "INBOX")
+
+            def warm_sync():
+                with pool.connection("INBOX") as imap:
+                    mail_store.sync_mailbox(imap, store, "INBOX")
+
+            results.append(result("email", "sync (up to date)", params, measure(warm_sync, repeat=repeat, number=5)))
+            store.close()
+
+            condstore_pool = imaplib_pool(imap_pool, condstore_server)
+            store = mail_store.open_store(os.path.join(folder, "condstore.sqlite3"))
+            with condstore_pool.connection("INBOX") as imap:
+                mail_store.sync_mailbox(imap, store, "INBOX")
+            uids = itertools.cycle(condstore_box.uids)
+
+            def condstore_sync():
+                condstore_box.set_flags(next(uids), "\\Seen \\Flagged")  # one flag change per sync
+                with condstore_pool.connection("INBOX") as imap:
+                    mail_store.sync_mailbox(imap, store, "INBOX")
+
+            results.append(result("email", "sync (one flag changed, CONDSTORE)", params,
+                                  measure(condstore_sync, repeat=repeat, number=5)))
+            condstore_pool.close()
+            store.close()
+
+        # The tools use the process-wide store, synced once above MAIL_SYNC_INTERVAL.
+        email_agent = importlib.import_module("email_agent")
+        quiet(email_agent.sync_inbox)
+        uids = itertools.cycle(range(count, 0, -1))
+        scenarios = {
+            "list_emails": (email_agent.list_emails, lambda: {"count": 10}),
+            "search_emails": (email_agent.search_emails, lambda: {"query": "invoice", "limit": 10}),
+            "get_email_content headers": (email_agent.get_email_content, lambda: {"email_id": str(next(uids)), "mode": "headers"}),
+            "get_email_content preview": (email_agent.get_email_content, lambda: {"email_id": str(next(uids)), "mode": "preview"}),
+            # Each call picks the next message, so the body has to be downloaded once per message.
+            "get_email_content full (uncached)": (email_agent.get_email_content, lambda: {"email_id": str(next(uids)), "mode": "full"}),
+            "get_email_content full (cached)": (email_agent.get_email_content, lambda: {"email_id": str(count), "mode": "full"}),
+            "get_last_email": (email_agent.get_last_email, lambda: {}),
+        }
+        for scenario, (tool, args) in scenarios.items():
+            number = 1 if "uncached" in scenario else 5
+            metrics = measure(lambda: quiet(tool.invoke, args()), repeat=repeat, number=number,
+                              warmup=0 if "uncached" in scenario else 1)
+            results.append(result("email", scenario, params, metrics))
+        results[-1]["metrics"]["imap_commands"] = mailbox.commands
+        results[-1]["metrics"]["imap_logins"] = mailbox.logins
+    finally:
+        pool.close()
+        server.shutdown()
+        condstore_server.shutdown()
+    return results
+
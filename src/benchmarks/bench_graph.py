@@ -0,0 +1,78 @@
+import asyncio
+import importlib
+import os
+import sys
+from typing import TypedDict
+
+from langgraph.graph import StateGraph, START, END
+
+from benchmarks.common import SRC_DIR, measure, result
+
+REACT_SCRIPT = [
+    {"tool_calls": [{"name": "add", "args": {"a": 1, "b": 1}},
+                    {"name": "add", "args": {"a": 78, "b": 87}},
+                    {"name": "add", "args": {"a": 96, "b": 55}}]},
+    "1 + 1 = 2, 78 + 87 = 165 and 96 + 55 = 151.",
+]
+
+
+class CounterState(TypedDict):
+    count: int
+
+
+def chain_graph(length: int):
+    """A linear graph of `length` trivial nodes, to isolate LangGraph's own per-step cost."""
+    graph = StateGraph(CounterState)
+    names = [f"step_{i}" for i in range(length)]
+    for name in names:
+        graph.add_node(name, lambda state: {"count": state["count"] + 1})
+    graph.add_edge(START, names[0])
+    for a, b in zip(names, names[1:]):
+        graph.add_edge(a, b)
+    graph.add_edge(names[-1], END)
+    return graph.compile()
+
+
+def count_steps(app, inputs: dict) -> int:
+    return sum(1 for _ in app.stream(inputs, stream_mode="updates"))
+
+
+def per_step(metrics: dict, steps: int) -> dict:
+    return {**metrics, "steps": steps, "median_ms_per_step": round(metrics["median_ms"] / steps, 4)}
+
+
+def run(quick: bool = False) -> list[dict]:
+    from fake_llm import FakeChatModel
+    from telemetry import PrometheusSink, Telemetry, instrument
+
+    repeat = 5 if quick else 20
+    results = []
+
+    for length in (1, 10, 50):
+        app = chain_graph(length)
+        inputs = {"count": 0}
+        metrics = measure(lambda: app.invoke(inputs), repeat=repeat, number=10)
+        results.append(result("graph", "chain", {"nodes": length}, per_step(metrics, count_steps(app, inputs))))
+
+    # Cost of the telemetry callbacks, aggregated in memory only.
+    app = instrument(chain_graph(10), "bench", Telemetry([PrometheusSink(port=None)]))
+    metrics = measure(lambda: app.invoke({"count": 0}), repeat=repeat, number=10)
+    results.append(result("graph", "chain (instrumented)", {"nodes": 10}, per_step(metrics, 10)))
+
+    sys.path.insert(0, os.path.join(SRC_DIR, "2.0"))
+    learn1 = importlib.import_module("Learn1").get_app()
+    inputs = {"name": "Bench"}
+    metrics = measure(lambda: learn1.invoke(dict(inputs)), repeat=repeat, number=10)
+    results.append(result("graph", "Learn1 greeter", {}, per_step(metrics, count_steps(learn1, dict(inputs)))))
+
+    react = importlib.import_module("ReAct")
+    model = FakeChatModel(responses=REACT_SCRIPT, cycle=True).bind_tools(react.tools)
+    react.get_model = lambda: model
+    react_app = react.get_app()
+    inputs = {"messages": [("user", "whats is 1 + 1, 78 + 87, 96 + 55")]}
+    steps = count_steps(react_app, inputs)
+    metrics = measure(lambda: react_app.invoke(inputs), repeat=repeat, number=5)
+    results.append(result("graph", "ReAct loop", {"tool_calls": 3, "model_latency_ms": 0}, per_step(metrics, steps)))
+    metrics = measure(lambda: asyncio.run(react_app.ainvoke(inputs)), repeat=repeat, number=5)
+    results.append(result("graph", "ReAct loop (ainvoke)", {"tool_calls": 3, "model_latency_ms": 0}, per_step(metrics, steps)))
+    return results
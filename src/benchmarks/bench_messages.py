@@ -0,0 +1,29 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph.message import add_messages
+
+from benchmarks.common import measure, result
+
+
+def history(length: int) -> list:
+    messages = []
+    for i in range(length):
+        cls = HumanMessage if i % 2 == 0 else AIMessage
+        messages.append(cls(content=f"message {i} " + "lorem ipsum " * 20, id=f"m{i}"))
+    return messages
+
+
+def run(quick: bool = False) -> list[dict]:
+    """Cost of one add_messages merge (what every node return pays) as the history grows."""
+    results = []
+    for length in (10, 100, 1000) if quick else (10, 100, 1000, 5000, 20000):
+        existing = history(length)
+        new = [AIMessage(content="reply", id="new")]
+        number = max(1, 20000 // length)
+        metrics = measure(lambda: add_messages(existing, new), repeat=5, number=number)
+        metrics["us_per_existing_message"] = round(metrics["median_ms"] * 1000 / length, 4)
+        results.append(result("add_messages", "append one", {"history": length}, metrics))
+
+        # Nodes that return the whole list again (as several agents here do) re-merge every message.
+        metrics = measure(lambda: add_messages(existing, existing + new), repeat=5, number=max(1, number // 2))
+        results.append(result("add_messages", "return full history", {"history": length}, metrics))
+    return results
@@ -0,0 +1,54 @@
+import importlib
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import result
+
+PAGE_COUNTS = (10, 100, 1000, 5000)
+QUICK_PAGE_COUNTS = (10, 100)
+LINES_PER_PAGE = 40
+
+
+def make_pdf(path: str, pages: int):
+    """Write a text-only PDF with LINES_PER_PAGE distinct lines per page."""
+    import fitz
+
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page()
+        text = "\n".join(f"Page {n + 1} line {i}: the quick brown fox jumps over the lazy dog {n * i}"
+                         for i in range(LINES_PER_PAGE))
+        page.insert_text((50, 50), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def run(quick: bool = False, page_counts: tuple[int, ...] | None = None) -> list[dict]:
+    """extract_text_from_pdf pages/sec, cold (empty page cache) and warm (cached pages)."""
+    pdf_qa = importlib.import_module("pdf_qa")
+    from pdf_cache import cache_dir_for
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for pages in page_counts or (QUICK_PAGE_COUNTS if quick else PAGE_COUNTS):
+            path = os.path.join(folder, f"doc_{pages}.pdf")
+            make_pdf(path, pages)
+            repeat = 3 if pages <= 1000 else 1
+            timings = {"cold": [], "warm": []}
+            for _ in range(repeat):
+                shutil.rmtree(cache_dir_for(path), ignore_errors=True)
+                for mode in ("cold", "warm"):
+                    start = time.perf_counter()
+                    text = pdf_qa.extract_text_from_pdf.invoke({"file_path": path})
+                    timings[mode].append(time.perf_counter() - start)
+            if text.startswith("Error"):
+                raise Exception(f"Failed to extract {path}: {text}")
+            metrics = {"chars": len(text), "samples": repeat}
+            for mode, seconds in timings.items():
+                best = min(seconds)
+                metrics[f"{mode}_seconds"] = round(best, 4)
+                metrics[f"{mode}_pages_per_sec"] = round(pages / best, 1)
+            results.append(result("pdf", "extract_text_from_pdf", {"pages": pages, "file_bytes": os.path.getsize(path)}, metrics))
+    return results
@@ -0,0 +1,88 @@
+import contextlib
+import importlib.metadata
+import io
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF_QA_DIR = os.path.join(SRC_DIR, "PDF_QA")
+
+
+def configure_environment(work_dir: str):
+    """
+    Point every agent at the offline model and at throwaway caches under
+    work_dir. Must run before any agent module is imported, since they read
+    their settings at import time.
+    """
+    for path in (SRC_DIR, PDF_QA_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    os.environ.update({
+        "AGENT_CHAT_MODEL": "fake",
+        "FAKE_LLM_LATENCY": "0",
+        "LLM_CACHE": "0",
+        "GOOGLE_MODEL": os.getenv("GOOGLE_MODEL", "offline"),
+        "PDF_CACHE_DIR": os.path.join(work_dir, "pdf_cache"),
+        "MAIL_STORE_PATH": os.path.join(work_dir, "mail.sqlite3"),
+        "MAIL_SYNC_INTERVAL": "3600",
+        "DRAFTER_SESSION_DIR": os.path.join(work_dir, "drafter_sessions"),
+    })
+
+
+def quiet(fn, *args, **kwargs):
+    """Call fn with its prints (the agents and tools log to stdout) swallowed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def measure(fn, repeat: int = 5, number: int = 1, warmup: int = 1) -> dict:
+    """Run fn number times per sample, repeat samples; report milliseconds per call."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) * 1000 / number)
+    samples.sort()
+    return {
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "samples": repeat,
+        "calls_per_sample": number,
+    }
+
+
+def result(benchmark: str, scenario: str, params: dict, metrics: dict) -> dict:
+    return {"benchmark": benchmark, "scenario": scenario, "params": params, "metrics": metrics}
+
+
+def metadata() -> dict:
+    """Enough context to compare runs across versions and machines."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    versions = {}
+    for package in ("langgraph", "langchain-core", "pymupdf", "numpy"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "packages": versions,
+    }
@@ -0,0 +1,166 @@
+"""
+A plain-text IMAP server good enough for the email tools: LOGIN, SELECT,
+STATUS, NOOP, (UID) SEARCH and the (UID) FETCH items that mail_store and
+imap_fetch ask for. One mailbox, messages held in memory; with condstore=True
+it also reports HIGHESTMODSEQ and honours FETCH (CHANGEDSINCE n).
+"""
+import email
+import re
+import socketserver
+import threading
+
+
+def _seqset(spec: str, values: list[int]) -> list[int]:
+    """Resolve an IMAP sequence set like "1:5,9,12:*" against the existing numbers."""
+    out = set()
+    top = max(values) if values else 0
+    for part in spec.split(","):
+        if ":" in part:
+            a, b = (top if x == "*" else int(x) for x in part.split(":"))
+            lo, hi = min(a, b), max(a, b)
+            matched = [v for v in values if lo <= v <= hi]
+            out.update(matched)
+            if not matched and "*" in part and values:
+                out.add(top)  # n:* always includes the highest number
+        else:
+            out.add(top if part == "*" else int(part))
+    return sorted(v for v in out if v in values)
+
+
+def _bodystructure(part) -> str:
+    if part.is_multipart():
+        return "(" + "".join(_bodystructure(p) for p in part.get_payload()) + f' "{part.get_content_subtype().upper()}")'
+    maintype, subtype = part.get_content_type().upper().split("/")
+    payload = part.get_payload().encode() if isinstance(part.get_payload(), str) else b""
+    params = f'("CHARSET" "{part.get_content_charset() or "us-ascii"}")'
+    encoding = (part.get("Content-Transfer-Encoding") or "7BIT").upper()
+    disposition = f'("ATTACHMENT" ("FILENAME" "{part.get_filename()}"))' if part.get_filename() else "NIL"
+    lines = f" {payload.count(b'\n') + 1}" if maintype == "TEXT" else ""
+    return f'("{maintype}" "{subtype}" {params} NIL NIL "{encoding}" {len(payload)}{lines} NIL {disposition} NIL)'
+
+
+def _section(raw: bytes, section: str) -> bytes:
+    msg = email.message_from_bytes(raw)
+    for n in section.split("."):
+        msg = msg.get_payload()[int(n) - 1] if msg.is_multipart() else msg
+    return msg.get_payload().encode()
+
+
+class Mailbox:
+    def __init__(self, uidvalidity: int = 1, condstore: bool = False):
+        self.uidvalidity = uidvalidity
+        self.condstore = condstore
+        self.messages = []  # {"uid", "flags", "raw", "modseq"}
+        self.modseq = 1
+        self.commands = 0
+        self.logins = 0
+
+    def add(self, raw: bytes, flags: str = "") -> int:
+        uid = (self.messages[-1]["uid"] if self.messages else 0) + 1
+        self.modseq += 1
+        self.messages.append({"uid": uid, "flags": flags, "raw": raw, "modseq": self.modseq})
+        return uid
+
+    def set_flags(self, uid: int, flags: str):
+        message = next(m for m in self.messages if m["uid"] == uid)
+        self.modseq += 1
+        message.update(flags=flags, modseq=self.modseq)
+
+    @property
+    def uids(self) -> list[int]:
+        return [m["uid"] for m in self.messages]
+
+
+class ImapHandler(socketserver.StreamRequestHandler):
+    def write(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode())
+
+    def handle(self):
+        box = self.server.mailbox
+        self.write("* OK IMAP stand-in ready\r\n")
+        while line := self.rfile.readline():
+            tag, command, *rest = line.decode().strip().split(" ", 2)
+            command, rest = command.upper(), rest[0] if rest else ""
+            uid_mode = command == "UID"
+            if uid_mode:
+                command, _, rest = rest.partition(" ")
+                command = command.upper()
+            box.commands += 1
+            if command == "CAPABILITY":
+                self.write(f"* CAPABILITY IMAP4rev1{' CONDSTORE' if box.condstore else ''}\r\n{tag} OK done\r\n")
+            elif command == "LOGIN":
+                box.logins += 1
+                self.write(f"{tag} OK logged in\r\n")
+            elif command in ("SELECT", "EXAMINE"):
+                self.write(f"* {len(box.messages)} EXISTS\r\n* OK [UIDVALIDITY {box.uidvalidity}] ok\r\n"
+                           f"{tag} OK [READ-WRITE] done\r\n")
+            elif command == "STATUS":
+                uidnext = (box.uids[-1] if box.messages else 0) + 1
+                modseq = f" HIGHESTMODSEQ {box.modseq}" if box.condstore else ""
+                self.write(f"* STATUS INBOX (UIDVALIDITY {box.uidvalidity} UIDNEXT {uidnext} "
+                           f"MESSAGES {len(box.messages)}{modseq})\r\n{tag} OK done\r\n")
+            elif command == "NOOP":
+                self.write(f"{tag} OK done\r\n")
+            elif command == "SEARCH":
+                match = re.search(r"UID (\S+)", rest)
+                hits = _seqset(match.group(1), box.uids) if uid_mode and match else (
+                    box.uids if uid_mode else list(range(1, len(box.messages) + 1)))
+                self.write("* SEARCH" + "".join(f" {h}" for h in hits) + f"\r\n{tag} OK done\r\n")
+            elif command == "FETCH":
+                spec, _, items = rest.partition(" ")
+                if uid_mode:
+                    wanted = set(_seqset(spec, box.uids))
+                    seqs = [i + 1 for i, m in enumerate(box.messages) if m["uid"] in wanted]
+                else:
+                    seqs = _seqset(spec, list(range(1, len(box.messages) + 1)))
+                if box.condstore and (changed := re.search(r"CHANGEDSINCE (\d+)", items)):
+                    seqs = [n for n in seqs if box.messages[n - 1]["modseq"] > int(changed.group(1))]
+                out = b"".join(self.fetch(n, box.messages[n - 1], items, uid_mode) for n in seqs)
+                self.write(out + f"{tag} OK done\r\n".encode())
+            elif command == "LOGOUT":
+                self.write(f"* BYE\r\n{tag} OK done\r\n")
+                return
+            else:
+                self.write(f"{tag} BAD unknown command\r\n")
+
+    def fetch(self, n: int, msg: dict, items: str, uid_mode: bool) -> bytes:
+        fields = [b"UID %d" % msg["uid"]] if uid_mode or "UID" in items else []
+        literal = None
+        if "FLAGS" in items:
+            fields.append(f"FLAGS ({msg['flags']})".encode())
+        if "RFC822.SIZE" in items:
+            fields.append(b"RFC822.SIZE %d" % len(msg["raw"]))
+        if "BODY.PEEK[]" in items or "BODY[]" in items or "RFC822)" in items:
+            literal = (b"BODY[]", msg["raw"])
+        if match := re.search(r"BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]", items):
+            wanted = {f.lower() for f in match.group(1).split()}
+            head = msg["raw"].split(b"\r\n\r\n", 1)[0].split(b"\r\n")
+            kept = b"".join(h + b"\r\n" for h in head if h.split(b":", 1)[0].decode().lower() in wanted) + b"\r\n"
+            literal = (b"BODY[HEADER.FIELDS (" + match.group(1).encode() + b")]", kept)
+        if "BODYSTRUCTURE" in items:
+            fields.append(b"BODYSTRUCTURE " + _bodystructure(email.message_from_bytes(msg["raw"])).encode())
+        if match := re.search(r"BODY\.PEEK\[([\d.]+)\](?:<(\d+)\.(\d+)>)?", items):
+            data = _section(msg["raw"], match.group(1))
+            if match.group(2):
+                start, length = int(match.group(2)), int(match.group(3))
+                literal = (b"BODY[%s]<%d>" % (match.group(1).encode(), start), data[start:start + length])
+            else:
+                literal = (b"BODY[%s]" % match.group(1).encode(), data)
+        if match := re.search(r"BODY\.PEEK\[TEXT\]<(\d+)\.(\d+)>", items):
+            body = msg["raw"].split(b"\r\n\r\n", 1)[1] if b"\r\n\r\n" in msg["raw"] else b""
+            start, length = int(match.group(1)), int(match.group(2))
+            literal = (b"BODY[TEXT]<%d>" % start, body[start:start + length])
+        head = b"* %d FETCH (" % n + b" ".join(fields)
+        if literal:
+            name, data = literal
+            return head + (b" " if fields else b"") + name + b" {%d}\r\n" % len(data) + data + b")\r\n"
+        return head + b")\r\n"
+
+
+def serve(mailbox: Mailbox, host: str = "127.0.0.1", port: int = 0) -> socketserver.ThreadingTCPServer:
+    """Start the server on a background thread; server_address holds the bound port."""
+    server = socketserver.ThreadingTCPServer((host, port), ImapHandler)
+    server.daemon_threads = True
+    server.mailbox = mailbox
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,27 @@
+import os
+
+from llm_cache import cached_model
+
+# "" builds the Gemini model; the rest are offline stand-ins from fake_llm:
+# "fake" (echo), "fake:<script.json>", "replay:<transcript.jsonl>", and
+# "record:<transcript.jsonl>" to record the real model's calls for later replay.
+AGENT_CHAT_MODEL = os.getenv("AGENT_CHAT_MODEL", "")
+
+
+def make_chat_model(mode: str | None = None, **kwargs):
+    """
+    Build the chat model for an agent: ChatGoogleGenerativeAI(**kwargs) behind
+    the response cache, or the offline model selected by AGENT_CHAT_MODEL,
+    which needs neither network nor API key.
+    """
+    mode, _, path = (AGENT_CHAT_MODEL if mode is None else mode).partition(":")
+    if mode in ("fake", "replay"):
+        from fake_llm import make_fake_model
+        return make_fake_model(mode, path)
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    model = cached_model(ChatGoogleGenerativeAI(**kwargs))
+    if mode == "record":
+        from fake_llm import TranscriptRecorder
+        model = model.model_copy(update={"callbacks": [TranscriptRecorder(path)]})
+    return model
@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from doc_store import DocumentStore
+
+SNAPSHOT_EVERY = int(os.getenv("DRAFTER_SNAPSHOT_EVERY", "50"))  # journal entries before a full snapshot
+COMPRESSION = os.getenv("DRAFTER_COMPRESSION", "")  # "", "gzip" or "zstd"
+
+SUFFIXES = {"": "", "gzip": ".gz", "zstd": ".zst"}
+
+logger = logging.getLogger("agents.drafter")
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == "zstd":
+        if zstandard is None:
+            raise Exception("zstd compression needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def decompress(data: bytes) -> bytes:
+    """Undo compress(), recognising the format from its magic bytes."""
+    if data.startswith(GZIP_MAGIC):
+        return gzip.decompress(data)
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise Exception("Reading a zstd file needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def write_atomic(path: str, data: bytes):
+    """Write to a temp file, fsync it and rename it over path, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def export(document: DocumentStore, path: str, compression: str = COMPRESSION) -> str:
+    """Write the document to path (plus the compression suffix) with no journal, e.g. for a file the user asked for."""
+    if compression not in SUFFIXES:
+        raise ValueError(f"Unknown compression {compression!r}, use one of {list(SUFFIXES)}")
+    suffix = SUFFIXES[compression]
+    path = path if path.endswith(suffix) else path + suffix
+    write_atomic(path, compress(document.text().encode("utf-8"), compression))
+    return path
+
+
+class DocumentFile:
+    """
+    Crash-safe persistence of a DocumentStore.
+
+    save() writes a full (optionally compressed) snapshot atomically.
+    autosave() only appends the edits made since the last call to
+    <path>.journal, one JSON line per patch, and folds them into a new
+    snapshot once snapshot_every patches have accumulated or the journal
+    outgrows the document. load() reads the snapshot and replays the journal
+    up to its last valid record (a torn line left by a crash, or an edit
+    that does not fit the document), logging and counting what it dropped.
+    The journal header carries the hash of the snapshot it extends, so after
+    a crash between writing a new snapshot and its journal the stale journal
+    is not replayed.
+    """
+
+    def __init__(self, path: str, compression: str = COMPRESSION, snapshot_every: int = SNAPSHOT_EVERY):
+        if compression not in SUFFIXES:
+            raise ValueError(f"Unknown compression {compression!r}, use one of {list(SUFFIXES)}")
+        suffix = SUFFIXES[compression]
+        self.path = path if path.endswith(suffix) else path + suffix
+        self.journal_path = f"{self.path}.journal"
+        self.compression = compression
+        self.snapshot_every = snapshot_every
+        self.saved_patches = 0  # patches of the document already in the snapshot or journal
+        self.journal_entries = 0
+        self.journal_bytes = 0
+        self.dropped_entries = 0  # journal entries the last load() could not replay
+
+    def save(self, document: DocumentStore) -> str:
+        """Write a full snapshot and start an empty journal."""
+        text = document.text()
+        write_atomic(self.path, compress(text.encode("utf-8"), self.compression))
+        header = json.dumps({"base_sha256": digest(text)}) + "\n"
+        write_atomic(self.journal_path, header.encode("utf-8"))
+        self.saved_patches = len(document.patches)
+        self.journal_entries = 0
+        self.journal_bytes = len(header)
+        return self.path
+
+    def autosave(self, document: DocumentStore) -> str:
+        """Append the new edits to the journal, or take a snapshot when the journal has grown too long."""
+        pending = document.patches[self.saved_patches:]
+        if not os.path.exists(self.journal_path) or self.saved_patches > len(document.patches):
+            return self.save(document)
+        if not pending:
+            return self.path
+        lines = "".join(json.dumps(patch) + "\n" for patch in pending)
+        if (self.journal_entries + len(pending) >= self.snapshot_every
+                or self.journal_bytes + len(lines) > max(len(document), 4096)):
+            return self.save(document)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.saved_patches = len(document.patches)
+        self.journal_entries += len(pending)
+        self.journal_bytes += len(lines)
+        return self.path
+
+    def load(self) -> DocumentStore:
+        """Rebuild the document from the snapshot plus any journalled edits."""
+        with open(self.path, "rb") as f:
+            document = DocumentStore(decompress(f.read()).decode("utf-8"))
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            lines = []
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        self.dropped_entries = 0
+        if isinstance(header, dict) and header.get("base_sha256") == digest(document.text()):
+            for n, line in enumerate(lines[1:]):
+                try:
+                    start, end, text = json.loads(line)
+                    document.replace(start, end, text, "journal")
+                except (TypeError, ValueError) as e:
+                    # A torn write at the end, or a record that no longer fits: keep the edits before it.
+                    self.dropped_entries = len(lines) - 1 - n
+                    logger.warning("Stopped replaying %s at entry %d of %d, %d dropped: %s",
+                                   self.journal_path, n + 1, len(lines) - 1, self.dropped_entries, e)
+                    break
+        self.save(document)
+        return document
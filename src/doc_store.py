@@ -0,0 +1,254 @@
+import re
+
+HEADING_RE = re.compile(r"^#{1,6}\s+(.*)$", re.M)
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+WORD_RE = re.compile(r"[a-z0-9]{3,}")
+SECTION_REF_RE = re.compile(r"(?:section|§)\s*(\d+)", re.I)
+
+ORIGINAL = -1  # buffer index of the text the table was created with
+
+
+class PieceTable:
+    """
+    Text stored as a list of pieces pointing into append-only buffers.
+
+    Edits never copy the buffers: an insert appends its text to a new buffer
+    and splits one piece, a delete only trims pieces. Pieces are immutable
+    tuples (buffer, start, length), so a version is just a copy of the list.
+    Finding an offset scans the pieces (linear in their number, not in
+    characters), and neighbours that are contiguous in one buffer are merged
+    again. text() joins the pieces on the first read after an edit and caches
+    the string until the next one.
+    """
+
+    def __init__(self, text: str = ""):
+        self.original = text
+        self.added: list[str] = []
+        self.pieces: list[tuple[int, int, int]] = [(ORIGINAL, 0, len(text))] if text else []
+        self.length = len(text)
+        self._text = text
+
+    def _buffer(self, index: int) -> str:
+        return self.original if index == ORIGINAL else self.added[index]
+
+    def _split(self, pos: int) -> int:
+        """Make pos a piece boundary and return the index of the piece starting there."""
+        offset = 0
+        for i, (buf, start, length) in enumerate(self.pieces):
+            if pos == offset:
+                return i
+            if pos < offset + length:
+                cut = pos - offset
+                self.pieces[i:i + 1] = [(buf, start, cut), (buf, start + cut, length - cut)]
+                return i + 1
+            offset += length
+        return len(self.pieces)
+
+    def _merge(self, i: int):
+        """Join pieces i-1 and i if they are adjacent in the same buffer."""
+        if 0 < i < len(self.pieces):
+            (buf, start, length), (next_buf, next_start, next_length) = self.pieces[i - 1], self.pieces[i]
+            if buf == next_buf and start + length == next_start:
+                self.pieces[i - 1:i + 1] = [(buf, start, length + next_length)]
+
+    def _check(self, start: int, end: int):
+        if not 0 <= start <= end <= self.length:
+            raise ValueError(f"Span {start}-{end} is outside the document (0-{self.length})")
+
+    def replace(self, start: int, end: int, text: str):
+        """Replace characters start:end with text (insert when start == end, delete when text is empty)."""
+        self._check(start, end)
+        if start == end and not text:
+            return
+        first = self._split(start)
+        last = self._split(end)
+        new = []
+        if text:
+            self.added.append(text)
+            new.append((len(self.added) - 1, 0, len(text)))
+        self.pieces[first:last] = new
+        self._merge(first + len(new))
+        self.length += len(text) - (end - start)
+        self._text = None
+
+    def insert(self, pos: int, text: str):
+        self.replace(pos, pos, text)
+
+    def delete(self, start: int, end: int):
+        self.replace(start, end, "")
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._buffer(buf)[start:start + length] for buf, start, length in self.pieces)
+        return self._text
+
+    def snapshot(self) -> tuple:
+        return tuple(self.pieces), self.length
+
+    def restore(self, snapshot: tuple):
+        pieces, self.length = snapshot
+        self.pieces = list(pieces)
+        self._text = None
+
+
+def split_sections(text: str) -> list[dict]:
+    """
+    Split a document into sections: one per markdown heading (with any text
+    before the first heading as its own section), or one per paragraph when
+    the document has no headings.
+
+    Returns:
+        list[dict]: {"number", "title", "start", "end"} with 1-based numbers and character spans.
+    """
+    starts = [m.start() for m in HEADING_RE.finditer(text)]
+    if starts:
+        if starts[0] > 0 and text[:starts[0]].strip():
+            starts.insert(0, 0)
+        elif starts[0] > 0:
+            starts[0] = 0
+    else:
+        starts = [0] + [m.end() for m in PARAGRAPH_RE.finditer(text)]
+    ends = starts[1:] + [len(text)]
+    sections = []
+    for start, end in zip(starts, ends):
+        body = text[start:end]
+        if not body.strip():
+            continue
+        heading = HEADING_RE.match(body.lstrip())
+        title = heading.group(1).strip() if heading else body.strip().splitlines()[0][:60]
+        sections.append({"number": len(sections) + 1, "title": title, "start": start, "end": end})
+    return sections
+
+
+def select_sections(text: str, query: str, budget: int, pinned: tuple[int, ...] = ()) -> list[dict]:
+    """
+    Pick the sections most relevant to an instruction, within a character budget.
+
+    Sections named in the query ("section 3") and pinned sections come first,
+    then sections ranked by how many query words their title (weighted
+    double) and text contain. Returned in document order.
+    """
+    sections = split_sections(text)
+    words = set(WORD_RE.findall(query.lower()))
+    named = {int(n) for n in SECTION_REF_RE.findall(query)} | set(pinned)
+
+    def score(section: dict) -> float:
+        body = set(WORD_RE.findall(text[section["start"]:section["end"]].lower()))
+        title = set(WORD_RE.findall(section["title"].lower()))
+        return len(words & body) + 2 * len(words & title)
+
+    ranked = sorted(sections, key=lambda s: (s["number"] not in named, -score(s), s["number"]))
+    chosen, used = [], 0
+    for section in ranked:
+        size = section["end"] - section["start"]
+        if section["number"] not in named and (score(section) == 0 or used + size > budget):
+            continue
+        chosen.append(section)
+        used += size
+    return sorted(chosen, key=lambda s: s["number"])
+
+
+class DocumentStore:
+    """
+    A draft with version history, edited through ranged patches.
+
+    Every edit records a new version (the piece list after it plus a short
+    description), so edits can be undone or the draft reverted to any
+    earlier version without storing full copies of the text.
+    """
+
+    def __init__(self, text: str = ""):
+        self.table = PieceTable(text)
+        self.versions: list[tuple[tuple, str]] = [(self.table.snapshot(), "created")]
+        self.last_edit: int | None = None  # offset of the latest edit, to keep its section in context
+        self.patches: list[tuple[int, int, str]] = []  # every edit as (start, end, text), for journalling
+        self.on_change = None  # called with the store after every new version
+
+    @property
+    def version(self) -> int:
+        return len(self.versions) - 1
+
+    def text(self) -> str:
+        return self.table.text()
+
+    def __len__(self) -> int:
+        return self.table.length
+
+    def _record(self, description: str) -> int:
+        self.versions.append((self.table.snapshot(), description))
+        if self.on_change is not None:
+            self.on_change(self)
+        return self.version
+
+    def replace(self, start: int, end: int, text: str, description: str | None = None) -> int:
+        """Apply one patch and return the new version number."""
+        self.table.replace(start, end, text)
+        self.patches.append((start, end, text))
+        self.last_edit = start
+        if description is None:
+            description = f"insert {len(text)} chars at {start}" if start == end else \
+                f"replace {start}-{end}" if text else f"delete {start}-{end}"
+        return self._record(description)
+
+    def set_text(self, text: str) -> int:
+        version = self.replace(0, len(self), text, "rewrite document")
+        self.last_edit = None
+        return version
+
+    def sections(self) -> list[dict]:
+        return split_sections(self.text())
+
+    def section(self, number: int) -> dict:
+        sections = self.sections()
+        if not 1 <= number <= len(sections):
+            raise ValueError(f"No section {number}; the document has {len(sections)} sections")
+        return sections[number - 1]
+
+    def section_at(self, pos: int) -> int | None:
+        """Number of the section containing offset pos."""
+        return next((s["number"] for s in self.sections() if s["start"] <= pos < s["end"]), None)
+
+    def replace_section(self, number: int, text: str) -> int:
+        """Replace section `number` (heading included) with text; an empty text deletes it."""
+        section = self.section(number)
+        if text and not text.endswith("\n") and section["end"] < len(self):
+            text += "\n\n"
+        return self.replace(section["start"], section["end"], text, f"{'replace' if text else 'delete'} section {number}")
+
+    def insert_section(self, after: int, text: str) -> int:
+        """Insert text as a new section after section `after` (0 inserts at the top)."""
+        pos = self.section(after)["end"] if after else 0
+        current = self.text()
+        if pos and not current[:pos].endswith("\n\n"):
+            text = ("\n" if current[:pos].endswith("\n") else "\n\n") + text
+        if pos < len(current) and not text.endswith("\n\n"):
+            text = text.rstrip("\n") + "\n\n"
+        return self.replace(pos, pos, text, f"insert section after {after}")
+
+    def replace_text(self, old: str, new: str) -> int:
+        """Replace the single occurrence of `old` with `new`."""
+        current = self.text()
+        count = current.count(old) if old else 0
+        if count != 1:
+            raise ValueError(f"Text to replace must occur exactly once, found {count} occurrences")
+        start = current.index(old)
+        return self.replace(start, start + len(old), new, f"replace text at {start}")
+
+    def revert(self, version: int) -> int:
+        """Make an earlier version current again, recorded as a new version."""
+        if not 0 <= version < len(self.versions):
+            raise ValueError(f"No version {version}")
+        length = len(self)
+        self.table.restore(self.versions[version][0])
+        self.patches.append((0, length, self.text()))
+        return self._record(f"revert to version {version}")
+
+    def history(self) -> list[str]:
+        return [f"v{n}: {description}" for n, (_, description) in enumerate(self.versions)]
+
+    def excerpt(self, start: int, end: int, context: int = 80) -> str:
+        """The text around a span, used to confirm an edit without echoing the whole document."""
+        text = self.text()
+        before = max(0, start - context)
+        after = min(len(text), end + context)
+        return ("..." if before else "") + text[before:after] + ("..." if after < len(text) else "")
@@ -0,0 +1,334 @@
+import asyncio
+import json
+import os
+import pickle
+import re
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from http import HTTPStatus
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph, START, END
+from langgraph.prebuilt import ToolNode, tools_condition
+
+from dotenv import load_dotenv
+if __name__ == "__main__":
+    load_dotenv()  # before Drafter reads its settings
+
+from Drafter import AgentState, build_system_prompt, current_document, current_save_dir, get_llm, tools
+from doc_store import DocumentStore
+from telemetry import instrument
+
+SERVER_HOST = os.getenv("DRAFTER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("DRAFTER_PORT", "8765"))
+SESSION_DIR = os.getenv("DRAFTER_SESSION_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ai_agents", "drafter_sessions"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("DRAFTER_SESSION_IDLE_TIMEOUT", "300"))
+MAX_LIVE_SESSIONS = int(os.getenv("DRAFTER_MAX_LIVE_SESSIONS", "1000"))
+MAX_BODY_BYTES = 1024 * 1024
+
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+ROUTE_RE = re.compile(r"^/sessions(?:/([^/]+))?(/messages)?/?$")
+
+
+def reply_node(state: AgentState) -> AgentState:
+    messages = list(state["messages"])
+    return {"messages": [get_llm().invoke([build_system_prompt(messages)] + messages)]}
+
+
+async def areply_node(state: AgentState) -> AgentState:
+    messages = list(state["messages"])
+    return {"messages": [await get_llm().ainvoke([build_system_prompt(messages)] + messages)]}
+
+
+def build_session_graph(checkpointer):
+    """
+    Drafter without the input() loop: one invocation handles one user message,
+    running tools until the model answers. The checkpointer keeps each
+    session's conversation under its thread_id.
+    """
+    graph = StateGraph(AgentState)
+    graph.add_node("llm", RunnableLambda(reply_node, afunc=areply_node))
+    graph.add_node("tool", ToolNode(tools=tools))
+    graph.add_edge(START, "llm")
+    graph.add_conditional_edges("llm", tools_condition, {"tools": "tool", END: END})
+    graph.add_edge("tool", "llm")
+    return instrument(graph.compile(checkpointer=checkpointer), "drafter_server")
+
+
+class LatestCheckpointSaver(InMemorySaver):
+    """
+    InMemorySaver that keeps only the newest checkpoint of each thread, with
+    the channel values and pending writes it uses, so a session holds one
+    copy of its conversation instead of one per step.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._versions: dict[tuple[str, str], dict] = {}  # (thread, ns) -> {channel: version of its stored value}
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id, checkpoint_ns = saved["configurable"]["thread_id"], saved["configurable"]["checkpoint_ns"]
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [c for c in checkpoints if c != checkpoint["id"]]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        current = self._versions.setdefault((thread_id, checkpoint_ns), {})
+        for channel, version in new_versions.items():
+            old = current.get(channel)
+            if old is not None and old != version:
+                self.blobs.pop((thread_id, checkpoint_ns, channel, old), None)
+            current[channel] = version
+        return saved
+
+    def delete_thread(self, thread_id: str):
+        super().delete_thread(thread_id)
+        for key in [k for k in self._versions if k[0] == thread_id]:
+            del self._versions[key]
+
+
+class Session:
+    __slots__ = ("document", "lock", "last_used", "evicted")
+
+    def __init__(self, document: DocumentStore):
+        self.document = document
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.evicted = False  # set under lock once the session is written out; holders must look it up again
+
+
+class SessionManager:
+    """
+    Live sessions in memory, idle ones on disk.
+
+    Each session has its own DocumentStore and checkpointer thread. Sessions
+    idle for longer than idle_timeout, or the least recently used ones past
+    max_live, are pickled to folder and dropped from memory; the next
+    request for them loads them back. The file is kept while the session is
+    live (it is replaced on the next eviction), so a crash loses at most the
+    changes since the session was last evicted. save_content only writes
+    into folder/<session id>/, which is removed with the session.
+    """
+
+    def __init__(self, folder: str = SESSION_DIR, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 max_live: int = MAX_LIVE_SESSIONS):
+        self.folder = folder
+        self.idle_timeout = idle_timeout
+        self.max_live = max_live
+        self.checkpointer = LatestCheckpointSaver()
+        self.app = build_session_graph(self.checkpointer)
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+        self._load_lock = asyncio.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f"{session_id}.pkl")
+
+    def _files(self, session_id: str) -> str:
+        """The only directory the session's save_content may write to."""
+        return os.path.join(self.folder, session_id)
+
+    @staticmethod
+    def _config(session_id: str) -> dict:
+        return {"configurable": {"thread_id": session_id}}
+
+    async def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = Session(DocumentStore())
+        await self._evict_overflow()
+        return session_id
+
+    async def get(self, session_id: str) -> Session | None:
+        if not SESSION_ID_RE.match(session_id):
+            return None
+        async with self._load_lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = await self._restore(session_id)
+                if session is None:
+                    return None
+            self.sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+        await self._evict_overflow()
+        return session
+
+    def _load(self, session_id: str) -> dict | None:
+        try:
+            with open(self._path(session_id), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _dump(self, session_id: str, saved: dict):
+        tmp_path = f"{self._path(session_id)}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(saved, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(session_id))
+
+    async def _restore(self, session_id: str) -> Session | None:
+        saved = await asyncio.to_thread(self._load, session_id)
+        if saved is None:
+            return None
+        if saved["messages"]:
+            await self.app.aupdate_state(self._config(session_id), {"messages": saved["messages"]}, as_node="llm")
+        session = self.sessions[session_id] = Session(saved["document"])
+        return session
+
+    async def chat(self, session_id: str, text: str) -> dict | None:
+        """Run one user message through the session's graph and return the reply."""
+        while True:
+            session = await self.get(session_id)
+            if session is None:
+                return None
+            async with session.lock:
+                if session.evicted:
+                    continue  # written out while we waited for the lock; load it back
+                token = current_document.set(session.document)
+                dir_token = current_save_dir.set(self._files(session_id))
+                try:
+                    result = await self.app.ainvoke({"messages": [HumanMessage(content=text)]}, self._config(session_id))
+                finally:
+                    current_save_dir.reset(dir_token)
+                    current_document.reset(token)
+                session.last_used = time.monotonic()
+                return {"reply": result["messages"][-1].content, "version": session.document.version}
+
+    async def evict(self, session_id: str) -> bool:
+        """Write a session to disk and free its memory; busy sessions are left alone."""
+        session = self.sessions.get(session_id)
+        if session is None or session.lock.locked():
+            return False
+        async with session.lock:
+            if session.evicted:
+                return False
+            state = await self.app.aget_state(self._config(session_id))
+            saved = {"messages": state.values.get("messages", []), "document": session.document}
+            await asyncio.to_thread(self._dump, session_id, saved)
+            await self.checkpointer.adelete_thread(session_id)
+            session.evicted = True
+            if self.sessions.get(session_id) is session:
+                del self.sessions[session_id]
+        return True
+
+    async def delete(self, session_id: str) -> bool:
+        if not SESSION_ID_RE.match(session_id):
+            return False
+        session = self.sessions.pop(session_id, None)
+        found = session is not None
+        if session is not None:
+            session.evicted = True
+        await self.checkpointer.adelete_thread(session_id)
+        if os.path.exists(self._path(session_id)):
+            os.remove(self._path(session_id))
+            found = True
+        await asyncio.to_thread(shutil.rmtree, self._files(session_id), True)
+        return found
+
+    async def _evict_overflow(self):
+        for session_id in list(self.sessions)[:max(0, len(self.sessions) - self.max_live)]:
+            await self.evict(session_id)
+
+    async def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for session_id, session in list(self.sessions.items()):
+            if session.last_used < cutoff:
+                await self.evict(session_id)
+
+    async def reap(self, interval: float | None = None):
+        """Background task: evict idle sessions every interval seconds."""
+        while True:
+            await asyncio.sleep(interval or max(1.0, self.idle_timeout / 4))
+            await self.evict_idle()
+
+    async def close(self):
+        for session_id in list(self.sessions):
+            await self.evict(session_id)
+
+
+async def route(manager: SessionManager, method: str, path: str, body: bytes) -> tuple[int, dict]:
+    """
+    POST   /sessions                      -> {"session_id"}
+    POST   /sessions/<id>/messages        {"message"} -> {"reply", "version"}
+    GET    /sessions/<id>                 -> {"version", "outline", "text"}
+    DELETE /sessions/<id>                 -> {"deleted"}
+    """
+    match = ROUTE_RE.match(path.split("?", 1)[0])
+    if not match:
+        return 404, {"error": "Not found"}
+    session_id, messages = match.groups()
+
+    if method == "POST" and not session_id:
+        return 201, {"session_id": await manager.create()}
+    if method == "POST" and messages:
+        try:
+            text = json.loads(body or b"{}")["message"]
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'Expected a JSON body like {"message": "..."}'}
+        try:
+            result = await manager.chat(session_id, str(text))
+        except Exception as e:
+            return 502, {"error": f"Failed to run Drafter: {e}"}
+        return (200, result) if result else (404, {"error": f"No session {session_id}"})
+    if method == "GET" and session_id and not messages:
+        session = await manager.get(session_id)
+        if session is None:
+            return 404, {"error": f"No session {session_id}"}
+        document = session.document
+        return 200, {"version": document.version, "outline": document.sections(), "text": document.text()}
+    if method == "DELETE" and session_id and not messages:
+        return 200, {"deleted": await manager.delete(session_id)}
+    return 405, {"error": f"{method} not allowed on {path}"}
+
+
+async def handle_connection(manager: SessionManager, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Minimal HTTP/1.1 with keep-alive: JSON in, JSON out."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", "0"))
+            if length > MAX_BODY_BYTES:
+                status, payload = 413, {"error": "Request body too large"}
+            else:
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await route(manager, method.upper(), path, body)
+            data = json.dumps(payload).encode()
+            writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close" or status == 413:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str = SERVER_HOST, port: int = SERVER_PORT, manager: SessionManager | None = None):
+    manager = manager or SessionManager()
+    server = await asyncio.start_server(lambda r, w: handle_connection(manager, r, w), host, port)
+    reaper = asyncio.create_task(manager.reap())
+    print(f"Drafter server listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        reaper.cancel()
+        await manager.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from llm_cache import cache_key
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Turn a latency spec into a sampler (seconds):
+    "0.2" fixed, "uniform:0.1,0.5", "normal:0.3,0.05" (clamped at 0) or
+    "lognormal:0.3,0.5" (median, sigma).
+    """
+    kind, _, args = spec.partition(":")
+    if not args:
+        delay = float(kind or 0)
+        return lambda rng: delay
+    a, b = (float(x) for x in args.split(","))
+    if kind == "uniform":
+        return lambda rng: rng.uniform(a, b)
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(a, b))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(a), b)
+    raise ValueError(f"Unknown latency distribution {kind!r}")
+
+
+def to_ai_message(response, call_prefix: str = "call") -> AIMessage:
+    """Build an AIMessage from a scripted response: a string, an AIMessage or {"content", "tool_calls"}."""
+    if isinstance(response, AIMessage):
+        return response
+    if isinstance(response, str):
+        return AIMessage(content=response)
+    tool_calls = [{"name": call["name"], "args": call.get("args", {}), "id": call.get("id") or f"{call_prefix}_{i}"}
+                  for i, call in enumerate(response.get("tool_calls", []))]
+    return AIMessage(content=response.get("content", ""), tool_calls=tool_calls)
+
+
+def transcript_key(messages: list[BaseMessage]) -> str:
+    """Key a prompt the way the response cache does, ignoring ids, so replays match recordings."""
+    return cache_key(dumps([m.model_copy(update={"id": None}) for m in messages]), "")
+
+
+def echo_response(messages: list[BaseMessage], tools: list | None) -> AIMessage:
+    """Default reply: answer the latest user message without calling tools."""
+    last = next((m for m in reversed(messages) if isinstance(m, (HumanMessage, ToolMessage))), None)
+    return AIMessage(content=f"(offline) {str(last.content)[:200] if last else ''}")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline stand-in for ChatGoogleGenerativeAI.
+
+    responses is a script consumed in order; each item is a string, an
+    AIMessage, a {"content", "tool_calls": [{"name", "args"}]} dict, or a
+    callable (messages, tools) -> any of those. transcript maps prompt keys
+    (see transcript_key) to recorded replies and wins over the script.
+    When both run out the model echoes the last user message (or cycles
+    the script with cycle=True). latency is a parse_latency spec, sampled
+    with a seeded RNG so runs are repeatable; "replay" uses recorded times.
+    """
+
+    responses: list = []
+    transcript: dict = {}
+    latency: str = "0"
+    seed: int = 0
+    cycle: bool = False
+
+    _index: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _rng: Any = PrivateAttr(default=None)
+    _sampler: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, context: Any):
+        self._rng = random.Random(self.seed)
+        self._sampler = None if self.latency == "replay" else parse_latency(self.latency)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @classmethod
+    def from_transcript(cls, path: str, **kwargs) -> "FakeChatModel":
+        """Replay a JSONL transcript written by TranscriptRecorder."""
+        transcript = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    transcript[entry["key"]] = entry
+        return cls(transcript=transcript, **kwargs)
+
+    def bind_tools(self, tools: list, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _reply(self, messages: list[BaseMessage], tools: list | None) -> tuple[AIMessage, float]:
+        with self._lock:
+            recorded = self.transcript.get(transcript_key(messages)) if self.transcript else None
+            if recorded is not None:
+                message = messages_from_dict([recorded["response"]])[0]
+                delay = recorded.get("latency", 0.0) if self._sampler is None else self._sampler(self._rng)
+                return message, delay
+            n = self._index
+            self._index += 1
+            delay = self._sampler(self._rng) if self._sampler else 0.0
+        if self.responses and (n < len(self.responses) or self.cycle):
+            response = self.responses[n % len(self.responses)]
+            if callable(response):
+                response = response(messages, tools)
+            return to_ai_message(response, f"call_{n}"), delay
+        return echo_response(messages, tools), delay
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message, delay = self._reply(messages, kwargs.get("tools"))
+        if delay:
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message, delay = self._reply(messages, kwargs.get("tools"))
+        if delay:
+            await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class TranscriptRecorder(BaseCallbackHandler):
+    """
+    Callback that appends every chat model call (prompt key, prompt,
+    reply and latency) to a JSONL file that FakeChatModel.from_transcript
+    can replay.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pending: dict = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._pending[run_id] = (messages[0], time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt, started = self._pending.pop(run_id, (None, None))
+        if prompt is None:
+            return
+        entry = {
+            "key": transcript_key(prompt),
+            "messages": [message_to_dict(m) for m in prompt],
+            "response": message_to_dict(response.generations[0][0].message),
+            "latency": round(time.perf_counter() - started, 4),
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._pending.pop(run_id, None)
+
+
+def load_script(path: str) -> list:
+    """Read a JSON list of scripted responses for FakeChatModel."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_fake_model(mode: str, path: str = "", latency: str | None = None) -> FakeChatModel:
+    """
+    Build the stand-in named by AGENT_CHAT_MODEL: "fake" (echo),
+    "fake:<script.json>" (scripted) or "replay:<transcript.jsonl>".
+    """
+    latency = latency if latency is not None else os.getenv("FAKE_LLM_LATENCY", "replay" if mode == "replay" else "0")
+    seed = int(os.getenv("FAKE_LLM_SEED", "0"))
+    if mode == "replay":
+        return FakeChatModel.from_transcript(path, latency=latency, seed=seed)
+    return FakeChatModel(responses=load_script(path) if path else [], latency=latency, seed=seed)
@@ -7,42 +7,54 @@ Original file is located at
     https://colab.research.google.com/drive/1gKfhVI6rA_g_cw8NiMcxtlI-0dEJRgUE
 """
 
+from functools import cache
 from langchain_core.messages import HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, START, END
 from typing import List, TypedDict
 from dotenv import load_dotenv
 import os
 
-load_dotenv()
+if __name__ == "__main__":
+  load_dotenv()
 
-api_key = os.getenv("GOOGLE_API_KEY")
+from chat_model import make_chat_model
+from telemetry import instrument
 
-llm = ChatGoogleGenerativeAI(
+@cache
+def get_llm():
+  return make_chat_model(
     model="gemini-1.5-flash",
     temperature=1,
-    google_api_key= api_key
-)
+    google_api_key=os.getenv("GOOGLE_API_KEY")
+  )
 
 class AgentState(TypedDict):
   messages: List[HumanMessage]
 
 def process_node(state: AgentState) -> AgentState:
-  response = llm.invoke(state["messages"])
+  response = get_llm().invoke(state["messages"])
   print(f"\nAI:", response.content)
   return state
 
-builder = StateGraph(AgentState)
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  builder = StateGraph(AgentState)
 
-builder.add_node("process_node", process_node)
-builder.add_edge(START, "process_node")
-builder.add_edge("process_node", END)
+  builder.add_node("process_node", process_node)
+  builder.add_edge(START, "process_node")
+  builder.add_edge("process_node", END)
 
-app = builder.compile()
+  return instrument(builder.compile(), "first_agent")
 
-userinput = input("Enter: ")
-while userinput != "exit":
-  app.invoke({
-    "messages": [HumanMessage(content=userinput)]
-  })
-  userinput = input("Enter: ")
\ No newline at end of file
+def main():
+  app = get_app()
+  userinput = input("Enter: ")
+  while userinput != "exit":
+    app.invoke({
+      "messages": [HumanMessage(content=userinput)]
+    })
+    userinput = input("Enter: ")
+
+if __name__ == "__main__":
+  main()
@@ -7,8 +7,10 @@ Original file is located at
     https://colab.research.google.com/drive/14nHRbKgjlbToIlEzcHNMOqlO350QUSC1
 """
 
+from functools import cache
 from typing import Dict, TypedDict
 from langgraph.graph import StateGraph
+from telemetry import instrument
 
 class AgentState(TypedDict):
   message : str
@@ -20,17 +22,27 @@ def greeting_node(state:AgentState) -> AgentState:
 
   return state
 
-graph = StateGraph(AgentState)
 
-graph.add_node("greeter", greeting_node)
-graph.set_entry_point("greeter")
-graph.set_finish_point("greeter")
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  graph = StateGraph(AgentState)
 
-app = graph.compile()
+  graph.add_node("greeter", greeting_node)
+  graph.set_entry_point("greeter")
+  graph.set_finish_point("greeter")
 
-from IPython.display import Image, display
-display(Image(app.get_graph().draw_mermaid_png()))
+  return instrument(graph.compile(), "langgraph1")
 
-result = app.invoke({"message":"Manzoor"})
 
-result["message"]
\ No newline at end of file
+def main():
+  app = get_app()
+  print(app.get_graph().draw_mermaid())  # paste into mermaid.live to see the graph
+
+  result = app.invoke({"message":"Manzoor"})
+
+  print(result["message"])
+
+
+if __name__ == "__main__":
+  main()
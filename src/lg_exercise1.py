@@ -8,8 +8,10 @@ Original file is located at
 """
 
 
+from functools import cache
 from typing import Dict, TypedDict
 from langgraph.graph import StateGraph
+from telemetry import instrument
 
 class AgentState(TypedDict):
   message: str
@@ -24,22 +26,32 @@ def person_node(state: AgentState) -> AgentState:
   state["full_description"] = f"Hi, i am {state['name']} my hobbies are {hobbies_str} and my message is {state['message']} for the people living in {state['location']}"
   return state
 
-graph = StateGraph(AgentState)
 
-graph.add_node("person", person_node)
-graph.set_entry_point("person")
-graph.set_finish_point("person")
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  graph = StateGraph(AgentState)
 
-app = graph.compile()
+  graph.add_node("person", person_node)
+  graph.set_entry_point("person")
+  graph.set_finish_point("person")
 
-from IPython.display import display, Image
-display(Image(app.get_graph().draw_mermaid_png()))
+  return instrument(graph.compile(), "lg_exercise1")
 
-result = app.invoke({
-    "name": "Manzoor",
-    "location": "Agrikalan",
-    "hobbies": ["playing", "chess", "cricket"],  # actual list, not string
-    "message": "Excited to connect!"  # include initial message
-})
 
-result["full_description"]
\ No newline at end of file
+def main():
+  app = get_app()
+  print(app.get_graph().draw_mermaid())  # paste into mermaid.live to see the graph
+
+  result = app.invoke({
+      "name": "Manzoor",
+      "location": "Agrikalan",
+      "hobbies": ["playing", "chess", "cricket"],  # actual list, not string
+      "message": "Excited to connect!"  # include initial message
+  })
+
+  print(result["full_description"])
+
+
+if __name__ == "__main__":
+  main()
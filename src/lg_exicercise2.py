@@ -8,8 +8,10 @@ Original file is located at
 """
 
 
+from functools import cache
 from typing import TypedDict, List
 from langgraph.graph import StateGraph
+from telemetry import instrument
 import operator as op
 
 class AgentState(TypedDict):
@@ -48,21 +50,31 @@ def simple_calc(state: AgentState) -> AgentState:
   state['result'] = f"Hey, {state['name']} your result is {answer}"
   return state
 
-graph = StateGraph(AgentState)
 
-graph.add_node("calc",simple_calc)
-graph.set_entry_point('calc')
-graph.set_finish_point('calc')
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  graph = StateGraph(AgentState)
 
-app = graph.compile()
+  graph.add_node("calc",simple_calc)
+  graph.set_entry_point('calc')
+  graph.set_finish_point('calc')
 
-from IPython.display import display, Image
-display(Image(app.get_graph().draw_mermaid_png()))
+  return instrument(graph.compile(), "lg_exicercise2")
 
-output = app.invoke({
-    "name":"Manzoor",
-    "numbers":[18, 2,3,5],
-    "mathoperator":"-"
-})
 
-output['result']
\ No newline at end of file
+def main():
+  app = get_app()
+  print(app.get_graph().draw_mermaid())  # paste into mermaid.live to see the graph
+
+  output = app.invoke({
+      "name":"Manzoor",
+      "numbers":[18, 2,3,5],
+      "mathoperator":"-"
+  })
+
+  print(output['result'])
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+LLM_CACHE = os.getenv("LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "ai_agents", "llm_cache.sqlite3"))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+# Calls made with temperature > 0 go to the model, so sampling still varies; LLM_CACHE_BYPASS_SAMPLED=0 caches them too.
+LLM_CACHE_BYPASS_SAMPLED = os.getenv("LLM_CACHE_BYPASS_SAMPLED", "1") == "1"
+
+TEMPERATURE_RE = re.compile(r"""["']temperature["'](?::|,)\s*([0-9.]+)""")
+# Ids that differ between runs of the same conversation and must not change the key.
+VOLATILE_KEYS = {"id", "tool_call_id", "response_metadata", "usage_metadata"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def _strip(value):
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    return value
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Hash of the normalised messages and the model string (model, parameters
+    and bound tools). Message/tool-call ids and metadata are ignored so a
+    replayed conversation hits the same entry; the text itself, whitespace
+    included, is part of the key.
+    """
+    try:
+        prompt = json.dumps(_strip(json.loads(prompt)), sort_keys=True)
+    except ValueError:
+        pass
+    return hashlib.sha256(f"{prompt}\0{llm_string}".encode("utf-8")).hexdigest()
+
+
+def _mark_cached(value: list) -> list:
+    """Copies of the cached generations flagged as cache hits, so callbacks (telemetry) can tell them apart."""
+    return [g.model_copy(update={"generation_info": {**(g.generation_info or {}), "cached": True}}) for g in value]
+
+
+def is_sampled(llm_string: str) -> bool:
+    """True when the call samples (temperature > 0); a per-call temperature comes last and wins."""
+    temperatures = TEMPERATURE_RE.findall(llm_string)
+    return bool(temperatures) and float(temperatures[-1]) > 0
+
+
+class TieredCache(BaseCache):
+    """
+    LangChain cache with an in-memory LRU in front of a SQLite file.
+
+    Entries older than ttl seconds are treated as misses and removed; when
+    the file holds more than max_bytes of responses the least recently used
+    entries are evicted. stats() reports hits per tier, misses, bypassed
+    calls and evictions.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+                 ttl: float = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 bypass_sampled: bool = LLM_CACHE_BYPASS_SAMPLED):
+        self.memory_items = memory_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bypass_sampled = bypass_sampled
+        self._memory: OrderedDict[str, tuple[float, list]] = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _remember(self, key: str, created: float, value: list):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> list | None:
+        if self.bypass_sampled and is_sampled(llm_string):
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return None
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached and now - cached[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return _mark_cached(cached[1])
+            row = self._conn.execute("SELECT value, size, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[2] >= self.ttl:
+                if row is not None:
+                    self._delete(key, row[1])
+                self._memory.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            value = loads(row[0])
+            self._remember(key, row[2], value)
+            self._stats["disk_hits"] += 1
+            return _mark_cached(value)
+
+    def update(self, prompt: str, llm_string: str, return_val: list):
+        if self.bypass_sampled and is_sampled(llm_string):
+            return
+        key = cache_key(prompt, llm_string)
+        value = dumps(return_val)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, return_val)
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                               (key, value, len(value), now, now))
+            self._disk_bytes += len(value) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, key: str, size: int):
+        self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._conn.commit()
+        self._disk_bytes -= size
+        self._stats["evictions"] += 1
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until the file is back under max_bytes."""
+        if self._disk_bytes <= self.max_bytes:
+            return
+        cutoff = time.time() - self.ttl
+        expired = self._conn.execute("DELETE FROM entries WHERE created < ? RETURNING size", (cutoff,)).fetchall()
+        self._disk_bytes -= sum(size for size, in expired)
+        self._stats["evictions"] += len(expired)
+        target = self.max_bytes * 0.9
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if self._disk_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._disk_bytes -= size
+            self._stats["evictions"] += 1
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            stats["memory_items"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+            return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TieredCache:
+    """Return the process-wide cache at LLM_CACHE_PATH, shared by every agent in the process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TieredCache()
+        return _cache
+
+
+def cached_model(model, cache: BaseCache | None = None):
+    """
+    Return a copy of a chat model that answers repeated calls from the cache.
+    Call it before bind_tools() so bound tools become part of the key.
+    Set LLM_CACHE=0 to leave the model untouched.
+    """
+    if not LLM_CACHE and cache is None:
+        return model
+    return model.model_copy(update={"cache": cache or get_cache()})
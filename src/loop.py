@@ -7,8 +7,10 @@ Original file is located at
     https://colab.research.google.com/drive/1p2u8S-eykbA9NoeoiiV0r9go9YhvEhNk
 """
 
+from functools import cache
 from typing import TypedDict, List
 from langgraph.graph import StateGraph, START, END
+from telemetry import instrument
 import random
 
 class AgentState(TypedDict):
@@ -33,30 +35,39 @@ def check_condition(state: AgentState) -> bool:
   else:
     return "exit"
 
-builder = StateGraph(AgentState)
 
-builder.add_node("greeting", greeting)
-builder.add_node("random_node", random_node)
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  builder = StateGraph(AgentState)
 
-builder.add_edge(START, "greeting")
-builder.add_edge("greeting", "random_node")
+  builder.add_node("greeting", greeting)
+  builder.add_node("random_node", random_node)
 
-builder.add_conditional_edges(
-    "random_node",
-    check_condition,
-    {
-        "continue" : "random_node",
-        "exit" : END
-    }
-)
+  builder.add_edge(START, "greeting")
+  builder.add_edge("greeting", "random_node")
 
+  builder.add_conditional_edges(
+      "random_node",
+      check_condition,
+      {
+          "continue" : "random_node",
+          "exit" : END
+      }
+  )
 
-app = builder.compile()
+  return instrument(builder.compile(), "loop")
 
-from IPython.display import Image, display
-display(Image(app.get_graph().draw_mermaid_png()))
 
-initial_state = AgentState(name="John", number=[], counter=0)
+def main():
+  app = get_app()
+  print(app.get_graph().draw_mermaid())  # paste into mermaid.live to see the graph
 
-result = app.invoke(initial_state)
-print(result)
\ No newline at end of file
+  initial_state = AgentState(name="John", number=[], counter=0)
+
+  result = app.invoke(initial_state)
+  print(result)
+
+
+if __name__ == "__main__":
+  main()
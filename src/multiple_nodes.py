@@ -7,8 +7,10 @@ Original file is located at
     https://colab.research.google.com/drive/11ZwmFBbUJdPnxhZrUjqUFp_O4pePq0qQ
 """
 
+from functools import cache
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
+from telemetry import instrument
 
 class AgentState(TypedDict):
   number1: str
@@ -55,38 +57,47 @@ def decide_operation_node(state: AgentState):
   else:
     return "unknown_operation"
 
-builder = StateGraph(AgentState)
 
-builder.add_node("add_node", adder_node)
-builder.add_node("subtract_node", subtractor_node)
-builder.add_node("multiply_node", multiply_node)
-builder.add_node("divide_node", divide_node)
-builder.add_node("unknown_node", unknown_node)
-builder.add_node("router", lambda state:state)
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  builder = StateGraph(AgentState)
 
-builder.add_edge(START, "router")
+  builder.add_node("add_node", adder_node)
+  builder.add_node("subtract_node", subtractor_node)
+  builder.add_node("multiply_node", multiply_node)
+  builder.add_node("divide_node", divide_node)
+  builder.add_node("unknown_node", unknown_node)
+  builder.add_node("router", lambda state:state)
 
-builder.add_conditional_edges(
-    "router",
-    decide_operation_node,
-    {
-        "add_operation":"add_node",
-        "subtract_operation":"subtract_node",
-        "multiply_operation":"multiply_node",
-        "divide_operation":"divide_node",
-        "unknown_operation":"unknown_node"
-    }
-)
+  builder.add_edge(START, "router")
 
-builder.add_edge("add_node", END)
-builder.add_edge("subtract_node", END)
+  builder.add_conditional_edges(
+      "router",
+      decide_operation_node,
+      {
+          "add_operation":"add_node",
+          "subtract_operation":"subtract_node",
+          "multiply_operation":"multiply_node",
+          "divide_operation":"divide_node",
+          "unknown_operation":"unknown_node"
+      }
+  )
 
+  builder.add_edge("add_node", END)
+  builder.add_edge("subtract_node", END)
 
-app = builder.compile()
+  return instrument(builder.compile(), "multiple_nodes")
 
-from IPython.display import Image, display
-display(Image(app.get_graph().draw_mermaid_png()))
 
-initial_state = AgentState(number1=10, operation="*", number2=5)
-result = app.invoke(initial_state)
-print(result['finalNumber'])
\ No newline at end of file
+def main():
+  app = get_app()
+  print(app.get_graph().draw_mermaid())  # paste into mermaid.live to see the graph
+
+  initial_state = AgentState(number1=10, operation="*", number2=5)
+  result = app.invoke(initial_state)
+  print(result['finalNumber'])
+
+
+if __name__ == "__main__":
+  main()
@@ -7,8 +7,10 @@ Original file is located at
     https://colab.research.google.com/drive/1j05rJ5gRGQqAdCvXQYmtwCj-5YlOS-Gi
 """
 
+from functools import cache
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
+from telemetry import instrument
 
 class AgentState(TypedDict):
   number1: str
@@ -54,45 +56,55 @@ def decide_operation2(state: AgentState) -> AgentState:
   elif state['operation2'] == '-':
     return "subtract_number3_number4"
 
-builder = StateGraph(AgentState)
 
-builder.add_node("add_node1", addNumber)
-builder.add_node("add_node2", addNumber2)
-builder.add_node("subtract_node1", subtractNumber)
-builder.add_node("subtract_node2", subtractNumber2)
-builder.add_node("router", lambda state:state)
-builder.add_node("router2", lambda state:state)
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  builder = StateGraph(AgentState)
 
-builder.add_edge(START, "router")
+  builder.add_node("add_node1", addNumber)
+  builder.add_node("add_node2", addNumber2)
+  builder.add_node("subtract_node1", subtractNumber)
+  builder.add_node("subtract_node2", subtractNumber2)
+  builder.add_node("router", lambda state:state)
+  builder.add_node("router2", lambda state:state)
 
-builder.add_conditional_edges(
-    "router",
-    decide_operation,
-    {
-        "add_number1_number2": "add_node1",
-        "subtract_number1_number2": "subtract_node1"
-    }
-)
+  builder.add_edge(START, "router")
 
-builder.add_edge("add_node1", "router2")
-builder.add_edge("subtract_node1", "router2")
+  builder.add_conditional_edges(
+      "router",
+      decide_operation,
+      {
+          "add_number1_number2": "add_node1",
+          "subtract_number1_number2": "subtract_node1"
+      }
+  )
 
-builder.add_conditional_edges(
-    "router2",
-    decide_operation2,
-    {
-        "add_number3_number4": "add_node2",
-        "subtract_number3_number4": "subtract_node2"
-    }
-)
+  builder.add_edge("add_node1", "router2")
+  builder.add_edge("subtract_node1", "router2")
 
-builder.add_edge("add_node2", END)
-builder.add_edge("subtract_node2", END)
+  builder.add_conditional_edges(
+      "router2",
+      decide_operation2,
+      {
+          "add_number3_number4": "add_node2",
+          "subtract_number3_number4": "subtract_node2"
+      }
+  )
 
-app = builder.compile()
+  builder.add_edge("add_node2", END)
+  builder.add_edge("subtract_node2", END)
 
-from IPython.display import Image, display
-display(Image(app.get_graph().draw_mermaid_png()))
+  return instrument(builder.compile(), "multiple_nodes_exercise")
 
-intial_state = AgentState(number1=10, operation="+", number2=5, number3=100, operation2="-", number4=50)
-app.invoke(intial_state)
\ No newline at end of file
+
+def main():
+  app = get_app()
+  print(app.get_graph().draw_mermaid())  # paste into mermaid.live to see the graph
+
+  intial_state = AgentState(number1=10, operation="+", number2=5, number3=100, operation2="-", number4=50)
+  print(app.invoke(intial_state))
+
+
+if __name__ == "__main__":
+  main()
@@ -7,8 +7,10 @@ Original file is located at
     https://colab.research.google.com/drive/19XQGkG9xKBI4JY5kmxj_n6GUrW4Ok28g
 """
 
+from functools import cache
 from typing import TypedDict
 from langgraph.graph import StateGraph
+from telemetry import instrument
 
 class AgentState(TypedDict):
     name: str
@@ -31,25 +33,35 @@ def third_node(state: AgentState) -> AgentState:
   state["final"] =  f" {state['final']} and you are living in {state['adress']} and you are awesome"
   return state
 
-graph = StateGraph(AgentState)
-graph.add_node("First Node", first_node)
-graph.add_node("Second Node", second_node)
-graph.add_node("Third Node", third_node)
 
-graph.set_entry_point("First Node")
-graph.add_edge("First Node", "Second Node")
-graph.add_edge("Second Node", "Third Node")
-graph.set_finish_point("Third Node")
+@cache
+def get_app():
+  """Build and compile the graph on first use."""
+  graph = StateGraph(AgentState)
+  graph.add_node("First Node", first_node)
+  graph.add_node("Second Node", second_node)
+  graph.add_node("Third Node", third_node)
 
-app = graph.compile()
+  graph.set_entry_point("First Node")
+  graph.add_edge("First Node", "Second Node")
+  graph.add_edge("Second Node", "Third Node")
+  graph.set_finish_point("Third Node")
 
-from IPython.display import Image , display
-display(Image(app.get_graph().draw_mermaid_png()))
+  return instrument(graph.compile(), "multiplenodeslg")
 
-reslut = app.invoke({
-    "name": "John",
-    "age": "30",
-    "adress": "New York"
-})
 
-reslut['final']
\ No newline at end of file
+def main():
+  app = get_app()
+  print(app.get_graph().draw_mermaid())  # paste into mermaid.live to see the graph
+
+  reslut = app.invoke({
+      "name": "John",
+      "age": "30",
+      "adress": "New York"
+  })
+
+  print(reslut['final'])
+
+
+if __name__ == "__main__":
+  main()
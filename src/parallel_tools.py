@@ -0,0 +1,140 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool, tool as as_tool
+
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))
+
+
+class ParallelToolExecutor:
+    """
+    Runs all tool calls of the last AIMessage at once and returns their
+    ToolMessages in the order the calls were made.
+
+    Sync runs use a shared thread pool, async runs use one task per call.
+    limits caps how many calls of a tool run at the same time (e.g.
+    {"send_email": 1}), timeouts sets per-tool time limits in seconds
+    (default `timeout`); a call that fails or times out becomes an error
+    ToolMessage instead of failing the whole step.
+
+    A thread cannot be stopped, so a sync call that timed out keeps its
+    worker (and its per-tool limit slot) until the tool returns by itself;
+    stragglers() counts them. Tools that may hang should have their own
+    I/O timeouts.
+    """
+
+    def __init__(self, tools: list, limits: dict[str, int] | None = None, timeouts: dict[str, float] | None = None,
+                 timeout: float = TOOL_TIMEOUT, workers: int = TOOL_WORKERS):
+        tools = [t if isinstance(t, BaseTool) else as_tool(t) for t in tools]
+        self.tools_by_name = {t.name: t for t in tools}
+        self.limits = limits or {}
+        self.timeouts = timeouts or {}
+        self.timeout = timeout
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stragglers = set()  # futures of timed-out calls still holding a worker
+        self._semaphores = {name: threading.BoundedSemaphore(n) for name, n in self.limits.items()}
+        self._async_semaphores = weakref.WeakKeyDictionary()  # event loop -> {tool name: asyncio.Semaphore}
+
+    def _executor(self) -> ContextThreadPoolExecutor:
+        # Copies the caller's context into each call, so tool runs stay children of the graph run (callbacks, telemetry).
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ContextThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tool")
+            return self._pool
+
+    def _error(self, call: dict, message: str) -> ToolMessage:
+        return ToolMessage(content=f"Error: {message}", name=call["name"], tool_call_id=call["id"], status="error")
+
+    def _run_one(self, call: dict) -> ToolMessage:
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return self._error(call, f"{call['name']} is not a valid tool, try one of {list(self.tools_by_name)}")
+        semaphore = self._semaphores.get(call["name"])
+        try:
+            if semaphore is None:
+                return tool.invoke({**call, "type": "tool_call"})
+            with semaphore:
+                return tool.invoke({**call, "type": "tool_call"})
+        except Exception as e:
+            return self._error(call, f"{call['name']} failed: {e}")
+
+    def _abandon(self, future):
+        if not future.cancel():
+            with self._pool_lock:
+                self._stragglers.add(future)
+            future.add_done_callback(self._release)
+
+    def _release(self, future):
+        with self._pool_lock:
+            self._stragglers.discard(future)
+
+    def stragglers(self) -> int:
+        """Number of timed-out sync calls that are still running on a worker."""
+        with self._pool_lock:
+            return len(self._stragglers)
+
+    def run_calls(self, calls: list[dict]) -> list[ToolMessage]:
+        """Run the given tool calls at once (each under its time limit); the ToolMessages come back in the same order."""
+        start = time.monotonic()
+        futures = [self._executor().submit(self._run_one, call) for call in calls]
+        results = []
+        for call, future in zip(calls, futures):
+            # The limit counts from when the step started, so queueing behind a per-tool limit uses it up too.
+            remaining = start + self.timeouts.get(call["name"], self.timeout) - time.monotonic()
+            try:
+                results.append(future.result(timeout=max(0.0, remaining)))
+            except TimeoutError:
+                self._abandon(future)
+                results.append(self._error(call, f"{call['name']} timed out"))
+        return results
+
+    def run(self, state: dict) -> dict:
+        return {"messages": self.run_calls(state["messages"][-1].tool_calls)}
+
+    def _async_semaphore(self, name: str) -> asyncio.Semaphore | None:
+        if name not in self.limits:
+            return None
+        per_loop = self._async_semaphores.setdefault(asyncio.get_running_loop(), {})
+        if name not in per_loop:
+            per_loop[name] = asyncio.Semaphore(self.limits[name])
+        return per_loop[name]
+
+    async def _arun_one(self, call: dict) -> ToolMessage:
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return self._error(call, f"{call['name']} is not a valid tool, try one of {list(self.tools_by_name)}")
+        semaphore = self._async_semaphore(call["name"])
+        try:
+            async with asyncio.timeout(self.timeouts.get(call["name"], self.timeout)):
+                if semaphore is None:
+                    return await tool.ainvoke({**call, "type": "tool_call"})
+                async with semaphore:
+                    return await tool.ainvoke({**call, "type": "tool_call"})
+        except TimeoutError:
+            return self._error(call, f"{call['name']} timed out")
+        except Exception as e:
+            return self._error(call, f"{call['name']} failed: {e}")
+
+    async def arun_calls(self, calls: list[dict]) -> list[ToolMessage]:
+        return list(await asyncio.gather(*(self._arun_one(call) for call in calls)))
+
+    async def arun(self, state: dict) -> dict:
+        return {"messages": await self.arun_calls(state["messages"][-1].tool_calls)}
+
+    def node(self) -> RunnableLambda:
+        """A graph node (drop-in for ToolNode) running the last AIMessage's tool calls."""
+        return RunnableLambda(self.run, afunc=self.arun, name="tools")
+
+
+def parallel_tool_node(tools: list, **kwargs) -> RunnableLambda:
+    """A graph node (drop-in for ToolNode) backed by a ParallelToolExecutor; kwargs go to the executor."""
+    return ParallelToolExecutor(tools, **kwargs).node()
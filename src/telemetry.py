@@ -0,0 +1,447 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import ToolMessage
+
+# Comma-separated sinks: "log", "prometheus" and/or "otlp". Empty leaves the graphs uninstrumented.
+AGENT_TELEMETRY = os.getenv("AGENT_TELEMETRY", "")
+TELEMETRY_PROMETHEUS_HOST = os.getenv("TELEMETRY_PROMETHEUS_HOST", "127.0.0.1")
+TELEMETRY_PROMETHEUS_PORT = int(os.getenv("TELEMETRY_PROMETHEUS_PORT", "9464"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://127.0.0.1:4318")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ai-agents")
+OTLP_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_OTLP_FLUSH_INTERVAL", "5"))
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+logger = logging.getLogger("agents.telemetry")
+
+
+class Span:
+    """One timed unit of work: a graph run, a node, an LLM call or a tool call."""
+
+    __slots__ = ("kind", "name", "agent", "run_id", "parent_id", "trace_id", "start_ns", "end_ns",
+                 "status", "error", "attributes")
+
+    def __init__(self, kind: str, name: str, agent: str, run_id: UUID, parent_id: UUID | None, trace_id: UUID):
+        self.kind = kind
+        self.name = name
+        self.agent = agent
+        self.run_id = run_id
+        self.parent_id = parent_id
+        self.trace_id = trace_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.error = None
+        self.attributes = {}
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind, "name": self.name, "agent": self.agent, "status": self.status,
+            "duration_ms": round(self.duration * 1000, 3), "error": self.error, **self.attributes,
+            "trace_id": self.trace_id.hex, "span_id": self.run_id.hex,
+            "parent_id": self.parent_id.hex if self.parent_id else None,
+        }
+
+
+def _is_cached(generation) -> bool:
+    """A generation replayed from an LLM cache (llm_cache marks them; LangChain zeroes their cost)."""
+    if (generation.generation_info or {}).get("cached"):
+        return True
+    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+    return usage.get("total_cost") == 0
+
+
+def _model_name(serialized: dict | None, metadata: dict | None, kwargs: dict) -> str:
+    return (metadata or {}).get("ls_model_name") or kwargs.get("name") or (serialized or {}).get("name") or "llm"
+
+
+class Telemetry(BaseCallbackHandler):
+    """
+    Callback handler that turns LangGraph/LangChain run events into Spans
+    and hands the finished ones to its sinks.
+
+    It records wall time of every graph node, LLM call and tool call,
+    prompt/completion tokens reported by the model (answers replayed from
+    an LLM cache are marked cached=True), the size of tool
+    results, and retries (LangGraph RetryPolicy re-runs of a node and
+    LangChain with_retry attempts). Runs inside nodes that are neither LLM
+    nor tool calls are not reported; their children attach to the enclosing
+    span.
+    """
+
+    run_inline = True  # keep span bookkeeping in event order, even for async graphs
+
+    def __init__(self, sinks: list):
+        self.sinks = sinks
+        self._spans: dict[UUID, Span] = {}
+        self._runs: dict[UUID, tuple[UUID, UUID | None, str]] = {}  # run -> (trace, nearest span, agent)
+        self._attempts: dict[tuple[UUID, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _start(self, kind: str, name: str, run_id: UUID, parent_run_id: UUID | None, metadata: dict | None) -> Span:
+        with self._lock:
+            trace_id, parent_span, agent = self._runs.get(parent_run_id, (run_id, None, ""))
+            agent = (metadata or {}).get("agent", agent)
+            span = Span(kind, name, agent, run_id, parent_span, trace_id)
+            self._spans[run_id] = span
+            self._runs[run_id] = (trace_id, run_id, agent)
+            return span
+
+    def _track(self, run_id: UUID, parent_run_id: UUID | None, metadata: dict | None):
+        """Remember an unreported run so its children find their trace and enclosing span."""
+        with self._lock:
+            trace_id, parent_span, agent = self._runs.get(parent_run_id, (run_id, None, ""))
+            self._runs[run_id] = (trace_id, parent_span, (metadata or {}).get("agent", agent))
+
+    def _end(self, run_id: UUID, error: BaseException | None = None, failed: bool = False, **attributes) -> Span | None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+            span = self._spans.pop(run_id, None)
+            if span is None:
+                return None
+            if span.parent_id is None:
+                for key in [k for k in self._attempts if k[0] == span.trace_id]:
+                    del self._attempts[key]
+        span.end_ns = time.time_ns()
+        span.attributes.update(attributes)
+        if error is not None or failed:
+            span.status = "error"
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"[:500]
+        for sink in self.sinks:
+            try:
+                sink.emit(span)
+            except Exception:
+                logger.exception("Failed to emit span to %s", type(sink).__name__)
+        return span
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            self._start("graph", (metadata or {}).get("agent", name), run_id, None, metadata)
+        elif node == name and any(tag.startswith("graph:step:") for tag in tags or []):
+            span = self._start("node", name, run_id, parent_run_id, metadata)
+            key = (span.trace_id, metadata.get("langgraph_checkpoint_ns", name))
+            with self._lock:
+                self._attempts[key] += 1
+                span.attributes["retries"] = self._attempts[key] - 1
+        else:
+            self._track(run_id, parent_run_id, metadata)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        span = self._start("llm", _model_name(serialized, metadata, kwargs), run_id, parent_run_id, metadata)
+        span.attributes["prompt_messages"] = sum(len(batch) for batch in messages)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start("llm", _model_name(serialized, metadata, kwargs), run_id, parent_run_id, metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = {}
+        generations = [generation for batch in response.generations for generation in batch]
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + metadata.get("input_tokens", 0)
+            usage["completion_tokens"] = usage.get("completion_tokens", 0) + metadata.get("output_tokens", 0)
+        if generations and all(map(_is_cached, generations)):
+            usage["cached"] = True
+        self._end(run_id, **usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        span = self._start("tool", kwargs.get("name") or (serialized or {}).get("name") or "tool",
+                           run_id, parent_run_id, metadata)
+        span.attributes["input_bytes"] = len(str(input_str).encode("utf-8"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = output.content if isinstance(output, ToolMessage) else output
+        self._end(run_id, failed=isinstance(output, ToolMessage) and output.status == "error",
+                  payload_bytes=len(str(content).encode("utf-8")))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_retry(self, retry_state, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            span = self._spans.get(run_id) or self._spans.get(self._runs.get(run_id, (None, None, ""))[1])
+            if span is not None:
+                span.attributes["retries"] = span.attributes.get("retries", 0) + 1
+
+
+class LogSink:
+    """Logs every finished span as one JSON line on the agents.telemetry logger."""
+
+    def __init__(self, log: logging.Logger = logger, level: int = logging.INFO):
+        self.log = log
+        self.level = level
+
+    def emit(self, span: Span):
+        if self.log.isEnabledFor(self.level):
+            self.log.log(self.level, json.dumps(span.to_dict(), default=str))
+
+    def close(self):
+        pass
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+class PrometheusSink:
+    """
+    Aggregates spans into Prometheus metrics and serves them in the text
+    exposition format on http://host:port/metrics (port=None, or a port
+    that cannot be bound: no server, read them with render()).
+
+    agent_span_duration_seconds   histogram by agent, kind, name, status
+    agent_llm_tokens_total        counter by agent, model, type (prompt/completion; cached_prompt/
+                                  cached_completion for cache hits, which are not billed)
+    agent_tool_payload_bytes_total counter by agent, tool
+    agent_retries_total           counter by agent, kind, name
+    """
+
+    def __init__(self, host: str = TELEMETRY_PROMETHEUS_HOST, port: int | None = TELEMETRY_PROMETHEUS_PORT):
+        self._durations: dict[tuple, list] = {}  # labels -> [bucket counts..., count, sum]
+        self._tokens: dict[tuple, int] = defaultdict(int)
+        self._payload: dict[tuple, int] = defaultdict(int)
+        self._retries: dict[tuple, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.server = None
+        if port is not None:
+            try:
+                self.server = ThreadingHTTPServer((host, port), self._handler())
+            except OSError as e:
+                # e.g. a second agent process on the same port: keep aggregating, serve nothing
+                logger.warning("Cannot serve metrics on %s:%s (%s); use render() instead", host, port, e)
+                return
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+
+    def emit(self, span: Span):
+        labels = (span.agent, span.kind, span.name, span.status)
+        with self._lock:
+            series = self._durations.setdefault(labels, [0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += span.duration
+            if span.kind == "llm":
+                prefix = "cached_" if span.attributes.get("cached") else ""
+                self._tokens[(span.agent, span.name, prefix + "prompt")] += span.attributes.get("prompt_tokens", 0)
+                self._tokens[(span.agent, span.name, prefix + "completion")] += span.attributes.get("completion_tokens", 0)
+            if span.kind == "tool":
+                self._payload[(span.agent, span.name)] += span.attributes.get("payload_bytes", 0)
+            if span.attributes.get("retries"):
+                self._retries[(span.agent, span.kind, span.name)] += span.attributes["retries"]
+
+    def render(self) -> str:
+        lines = ["# HELP agent_span_duration_seconds Wall time of graph runs, nodes, LLM calls and tool calls.",
+                 "# TYPE agent_span_duration_seconds histogram"]
+        with self._lock:
+            for (agent, kind, name, status), series in sorted(self._durations.items()):
+                labels = _labels(agent=agent, kind=kind, name=name, status=status)
+                for bound, count in zip(DURATION_BUCKETS, series):
+                    lines.append(f'agent_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'agent_span_duration_seconds_bucket{{{labels},le="+Inf"}} {series[-2]}')
+                lines.append(f"agent_span_duration_seconds_count{{{labels}}} {series[-2]}")
+                lines.append(f"agent_span_duration_seconds_sum{{{labels}}} {series[-1]:.6f}")
+            for metric, help_text, names, values in (
+                ("agent_llm_tokens_total", "Tokens sent to and generated by chat models (cached_*: answered from the cache).", ("agent", "model", "type"), self._tokens),
+                ("agent_tool_payload_bytes_total", "Bytes of tool results returned to the model.", ("agent", "tool"), self._payload),
+                ("agent_retries_total", "Retried node and LLM/tool attempts.", ("agent", "kind", "name"), self._retries),
+            ):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                lines += [f"{metric}{{{_labels(**dict(zip(names, key)))}}} {value}" for key, value in sorted(values.items())]
+        return "\n".join(lines) + "\n"
+
+    def _handler(self):
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _span_id(run_id: UUID) -> str:
+    # Run ids are time-ordered UUIDs; the low half is the random part.
+    return run_id.hex[16:]
+
+
+class OtlpSink:
+    """
+    Exports spans as OTLP/HTTP JSON to an OpenTelemetry collector
+    ({endpoint}/v1/traces), batched on a background thread. A run's spans
+    share the trace id of the graph run, so a trace shows graph -> node ->
+    LLM/tool. Export failures are logged and the batch dropped; they never
+    reach the agent.
+    """
+
+    def __init__(self, endpoint: str = OTLP_ENDPOINT, service_name: str = OTEL_SERVICE_NAME,
+                 interval: float = OTLP_FLUSH_INTERVAL, max_batch: int = 512, max_queue: int = 10000):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="otlp-export", daemon=True)
+        self._thread.start()
+
+    def emit(self, span: Span):
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            if len(self._queue) >= self.max_batch:
+                self._wake.set()
+
+    def _encode(self, span: Span) -> dict:
+        attributes = {"agent.name": span.agent, "agent.kind": span.kind, **span.attributes}
+        encoded = {
+            "traceId": span.trace_id.hex,
+            "spanId": _span_id(span.run_id),
+            "name": f"{span.kind} {span.name}",
+            "kind": 3 if span.kind in ("llm", "tool") else 1,  # CLIENT for outgoing calls, INTERNAL otherwise
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [_attribute(k, v) for k, v in attributes.items() if v is not None],
+            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = _span_id(span.parent_id)
+        return encoded
+
+    def flush(self):
+        while True:
+            with self._lock:
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            if not batch:
+                return
+            payload = {"resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "agents.telemetry"}, "spans": [self._encode(s) for s in batch]}],
+            }]}
+            request = urllib.request.Request(self.url, data=json.dumps(payload).encode("utf-8"),
+                                             headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    response.read()
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning("Failed to export %d spans to %s: %s", len(batch), self.url, e)
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+        self._thread.join(timeout=15)
+        self.flush()
+
+
+SINKS = {"log": LogSink, "prometheus": PrometheusSink, "otlp": OtlpSink}
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry | None:
+    """Return the process-wide handler with the sinks named in AGENT_TELEMETRY, or None when it is empty."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            names = [name.strip() for name in AGENT_TELEMETRY.split(",") if name.strip()]
+            if not names:
+                return None
+            unknown = [name for name in names if name not in SINKS]
+            if unknown:
+                raise ValueError(f"Unknown telemetry sink(s) {unknown}, use some of {list(SINKS)}")
+            if "log" in names and not logger.handlers and not logging.getLogger().handlers:
+                logger.addHandler(logging.StreamHandler())
+                logger.setLevel(logging.INFO)
+            _telemetry = Telemetry([SINKS[name]() for name in names])
+            atexit.register(close)
+        return _telemetry
+
+
+def close():
+    """Flush and stop every sink (the OTLP exporter sends what it still holds)."""
+    if _telemetry is not None:
+        for sink in _telemetry.sinks:
+            sink.close()
+
+
+def instrument(app, name: str, telemetry: Telemetry | None = None):
+    """
+    Attach telemetry to a compiled graph and tag its spans with the agent
+    name. Returns the graph unchanged when telemetry is off, so wrapping
+    graph.compile() costs nothing by default.
+    """
+    telemetry = telemetry or get_telemetry()
+    if telemetry is None:
+        return app
+    return app.with_config({"callbacks": [telemetry], "metadata": {"agent": name}})
@@ -0,0 +1,8 @@
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+for path in (SRC_DIR, os.path.join(SRC_DIR, "PDF_QA")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
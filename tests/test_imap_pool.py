@@ -0,0 +1,148 @@
+import imaplib
+
+import pytest
+
+from imap_pool import ImapPool
+
+
+class FakeImap:
+    """Stands in for imaplib.IMAP4: records the commands a pool sends it."""
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.logins = []
+        self.selects = []
+        self.healthy = True
+        self.logged_out = False
+
+    def login(self, user, password):
+        self.logins.append(user)
+        return ("OK", [b"LOGIN completed"]) if password == "secret" else ("NO", [b"bad credentials"])
+
+    def select(self, mailbox):
+        self.selects.append(mailbox)
+        return "OK", [b"1"]
+
+    def noop(self):
+        if not self.healthy:
+            raise imaplib.IMAP4.abort("socket error: EOF")
+        return "OK", [b"NOOP completed"]
+
+    def logout(self):
+        self.logged_out = True
+        return "BYE", [b"logging out"]
+
+
+class Factory:
+    def __init__(self):
+        self.created = []
+
+    def __call__(self, host, port):
+        imap = FakeImap(host, port)
+        self.created.append(imap)
+        return imap
+
+
+@pytest.fixture
+def factory():
+    return Factory()
+
+
+@pytest.fixture
+def make_pool(factory):
+    pools = []
+
+    def make(**kwargs):
+        kwargs.setdefault("password", "secret")
+        pool = ImapPool("user", host="imap.test", port=143, factory=factory, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_reuses_logged_in_connection(make_pool, factory):
+    pool = make_pool()
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(factory.created) == 1
+    assert first.logins == ["user"]
+    assert first.address == ("imap.test", 143)
+
+
+def test_selects_mailbox_only_when_it_changes(make_pool):
+    pool = make_pool()
+    with pool.connection("INBOX") as imap:
+        pass
+    with pool.connection("INBOX"):
+        pass
+    with pool.connection("Sent"):
+        pass
+    assert imap.selects == ["INBOX", "Sent"]
+
+
+def test_concurrent_borrowers_get_separate_connections(make_pool, factory):
+    pool = make_pool(size=2)
+    with pool.connection() as first, pool.connection() as second:
+        assert first is not second
+    with pool.connection():
+        pass
+    assert len(factory.created) == 2
+
+
+def test_aborted_connection_is_dropped_and_replaced(make_pool, factory):
+    pool = make_pool()
+    with pytest.raises(imaplib.IMAP4.abort):
+        with pool.connection("INBOX") as broken:
+            raise imaplib.IMAP4.abort("socket error: EOF")
+    assert broken.logged_out
+    with pool.connection("INBOX") as imap:
+        pass
+    assert imap is not broken
+    assert imap.logins == ["user"] and imap.selects == ["INBOX"]
+    assert len(factory.created) == 2
+
+
+def test_reconnects_when_idle_connection_fails_noop(make_pool, factory):
+    pool = make_pool(keepalive=0)
+    with pool.connection() as stale:
+        pass
+    stale.healthy = False
+    with pool.connection() as imap:
+        pass
+    assert imap is not stale
+    assert stale.logged_out
+    assert len(factory.created) == 2
+
+
+def test_logs_out_connection_idle_past_timeout(make_pool, factory):
+    pool = make_pool(idle_timeout=0)
+    with pool.connection() as old:
+        pass
+    with pool.connection() as imap:
+        pass
+    assert imap is not old
+    assert old.logged_out
+
+
+def test_failed_login_raises(make_pool):
+    pool = make_pool(password="wrong")
+    with pytest.raises(Exception, match="Failed to authenticate"):
+        with pool.connection():
+            pass
+
+
+def test_close_logs_out_idle_connections(make_pool):
+    pool = make_pool()
+    with pool.connection() as imap:
+        pass
+    pool.close()
+    assert imap.logged_out
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            pass
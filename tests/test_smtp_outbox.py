@@ -0,0 +1,122 @@
+import asyncio
+import socket
+import threading
+from email.message import EmailMessage
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from smtp_outbox import Outbox, SmtpSession
+
+
+class Recorder:
+    """aiosmtpd handler that answers each DATA with the next scripted reply and records accepted mail."""
+
+    def __init__(self, replies=()):
+        self.replies = list(replies)
+        self.received = []
+        self.sessions = set()
+        self.attempts = 0
+        self.gate = None  # threading.Event the handler waits on before answering
+
+    async def handle_DATA(self, server, session, envelope):
+        self.attempts += 1
+        self.sessions.add(id(session))
+        if self.gate is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.gate.wait)
+        reply = self.replies.pop(0) if self.replies else "250 OK"
+        if reply.startswith("250"):
+            self.received.append(envelope.rcpt_tos)
+        return reply
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = Recorder()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller.hostname, controller.port
+    controller.stop()
+
+
+def message(to: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "agent@example.com"
+    msg["To"] = to
+    msg["Subject"] = "test"
+    msg.set_content("hello")
+    return msg
+
+
+def outbox(host: str, port: int, **kwargs) -> Outbox:
+    return Outbox(SmtpSession(None, None, host=host, port=port, starttls=False, timeout=5), backoff=0.01, **kwargs)
+
+
+def test_sends_queued_messages_over_one_session(smtp_server):
+    handler, host, port = smtp_server
+    box = outbox(host, port)
+    futures = box.send_many([message(f"user{i}@example.com") for i in range(3)])
+    assert [f.result(5) for f in futures] == [f"user{i}@example.com" for i in range(3)]
+    box.close()
+    assert handler.received == [[f"user{i}@example.com"] for i in range(3)]
+    assert len(handler.sessions) == 1
+
+
+def test_retries_transient_reply(smtp_server):
+    handler, host, port = smtp_server
+    handler.replies = ["451 4.3.0 Try again later", "451 4.3.0 Try again later"]
+    box = outbox(host, port, max_retries=3)
+    assert box.submit(message("a@example.com")).result(5) == "a@example.com"
+    box.close()
+    assert handler.attempts == 3
+    assert handler.received == [["a@example.com"]]
+
+
+def test_gives_up_after_max_retries(smtp_server):
+    handler, host, port = smtp_server
+    handler.replies = ["451 4.3.0 Try again later"] * 5
+    box = outbox(host, port, max_retries=2)
+    with pytest.raises(Exception) as error:
+        box.submit(message("a@example.com")).result(5)
+    box.close()
+    assert getattr(error.value, "smtp_code", None) == 451
+    assert handler.attempts == 3
+    assert handler.received == []
+
+
+def test_does_not_retry_permanent_reply(smtp_server):
+    handler, host, port = smtp_server
+    handler.replies = ["550 5.7.1 Rejected"]
+    box = outbox(host, port, max_retries=3)
+    with pytest.raises(Exception) as error:
+        box.submit(message("a@example.com")).result(5)
+    assert getattr(error.value, "smtp_code", None) == 550
+    assert box.submit(message("b@example.com")).result(5) == "b@example.com"
+    box.close()
+    assert handler.attempts == 2
+    assert handler.received == [["b@example.com"]]
+
+
+def test_withdraw_only_while_queued(smtp_server):
+    handler, host, port = smtp_server
+    handler.gate = threading.Event()
+    box = outbox(host, port)
+    first = box.submit(message("first@example.com"))
+    while not handler.attempts:  # the worker is now blocked inside DATA for the first message
+        threading.Event().wait(0.01)
+    second = box.submit(message("second@example.com"))
+    assert not Outbox.withdraw(first)
+    assert Outbox.withdraw(second)
+    handler.gate.set()
+    assert first.result(5) == "first@example.com"
+    assert second.cancelled()
+    box.close()
+    assert handler.received == [["first@example.com"]]
@@ -0,0 +1,92 @@
+import functools
+
+import fitz
+import numpy as np
+import pytest
+
+import vector_index
+from vector_index import build_vector_index, hashing_embedder, load_vector_index, search_vectors
+
+TOPICS = [
+    "quarterly invoice total due to the supplier",
+    "cats and dogs sleeping in the garden",
+    "rocket engine thrust and fuel consumption",
+    "sourdough bread needs flour water and salt",
+    "the football match ended in a penalty shootout",
+]
+
+
+def make_chunks(copies: int = 1) -> list[dict]:
+    return [{"page": i % len(TOPICS) + 1, "text": f"{TOPICS[i % len(TOPICS)]} note {i}"}
+            for i in range(len(TOPICS) * copies)]
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    doc = fitz.open()
+    for text in TOPICS:
+        doc.new_page().insert_text((50, 72), text)
+    path = tmp_path / "topics.pdf"
+    doc.save(path)
+    return str(path)
+
+
+def test_hashing_embedder_is_deterministic_and_normalised():
+    first = hashing_embedder(TOPICS + [""], dim=64)
+    second = hashing_embedder(TOPICS + [""], dim=64)
+    assert first.shape == (len(TOPICS) + 1, 64) and first.dtype == np.float32
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first[:-1], axis=1), 1.0)
+    assert not first[-1].any()
+
+
+def test_exact_search_ranks_matching_chunk_first(tmp_path):
+    index = build_vector_index(str(tmp_path), make_chunks(), ivf=False)
+    index["vectors"] = np.load(tmp_path / "vectors.npy", mmap_mode="r")
+    results = search_vectors(index, ["invoice total", "bread flour"], k=3)
+    assert [hits[0]["page"] for hits in results] == [1, 4]
+    for hits in results:
+        assert len(hits) == 3
+        assert [hit["score"] for hit in hits] == sorted((hit["score"] for hit in hits), reverse=True)
+
+
+def test_ivf_search_probing_every_partition_matches_exact(tmp_path):
+    chunks = make_chunks(copies=20)
+    exact = build_vector_index(str(tmp_path), chunks, ivf=False, prefix="exact")
+    exact["vectors"] = np.load(tmp_path / "exact.npy")
+    ivf = build_vector_index(str(tmp_path), chunks, ivf=True, prefix="ivf")
+    ivf["vectors"] = np.load(tmp_path / "ivf.npy")
+    ivf["centroids"] = np.load(tmp_path / "ivf.centroids.npy")
+    assert ivf["ivf"] and ivf["offsets"][-1] == len(chunks)
+
+    queries = ["rocket fuel", "penalty shootout", "sleeping cats"]
+    want = search_vectors(exact, queries, k=5)
+    got = search_vectors(ivf, queries, k=5, nprobe=len(ivf["centroids"]))
+    for w, g in zip(want, got):
+        assert [hit["score"] for hit in g] == pytest.approx([hit["score"] for hit in w])
+    assert [hits[0]["page"] for hits in got] == [3, 5, 2]
+
+
+def test_load_builds_once_and_reuses_saved_index(pdf, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    index = load_vector_index(pdf, cache_dir=cache_dir)
+    assert search_vectors(index, ["sourdough bread"])[0][0]["page"] == 4
+    assert load_vector_index(pdf, cache_dir=cache_dir) is index
+
+    vector_index._loaded.clear()
+    monkeypatch.setattr(vector_index, "build_vector_index", lambda *args: pytest.fail("index was rebuilt"))
+    reloaded = load_vector_index(pdf, cache_dir=cache_dir)
+    assert isinstance(reloaded["vectors"], np.memmap)
+    assert reloaded["chunks"] == index["chunks"]
+
+
+def test_other_embedder_gets_its_own_index_and_mismatches_are_refused(pdf, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    default = load_vector_index(pdf, cache_dir=cache_dir)
+    small = functools.partial(hashing_embedder, dim=32)
+    index = load_vector_index(pdf, embed=small, cache_dir=cache_dir)
+    assert index["vectors"].shape[1] == 32
+    assert index["embedder"] != default["embedder"]
+    assert search_vectors(index, ["football match"], embed=small)[0][0]["page"] == 5
+    with pytest.raises(ValueError):
+        search_vectors(index, ["football match"])